@@ -17,6 +17,9 @@ def create_app(config_name):
     app.config.from_object(config[config_name])
     config[config_name].init_app(app)
 
+    from .encoders import get_encoder
+    app.json_encoder = get_encoder(app.config)
+
     template_loader = jinja2.ChoiceLoader([
         app.jinja_loader,
         jinja2.FileSystemLoader('./static/dist'),
@@ -27,6 +30,30 @@ def create_app(config_name):
 
     db.init_app(app)
 
+    from .identity import identities
+    identities.init_app(app)
+
+    from .tokens import api_tokens
+    api_tokens.init_app(app)
+
+    from .rules import rules
+    rules.init_app(app)
+
+    from .anomaly import anomalies
+    anomalies.init_app(app)
+
+    from .profiler import profiler
+    profiler.init_app(app)
+
+    from .telemetry import telemetry
+    telemetry.init_app(app)
+
+    from .tracing import tracer
+    tracer.init_app(app)
+
+    from .timing import server_timing
+    server_timing.init_app(app)
+
     if app.config['SSL_REDIRECT']:
         from flask_sslify import SSLify
         sslify = SSLify(app)
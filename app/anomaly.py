@@ -0,0 +1,171 @@
+"""Online anomaly detection on ingested readings.
+
+Every magnitude has a small running state: an exponentially weighted mean
+and variance (exact Welford updates for the first ``ANOMALY_WINDOW``
+readings), its last value and timestamp and two counters. Each reading
+updates it in constant time, so no history is ever read back. A reading is
+
+- a ``spike`` when it lies more than ``ANOMALY_SPIKE_SIGMA`` deviations from
+  the mean (spikes do not move the mean),
+- an ``offset`` when ``ANOMALY_OFFSET_COUNT`` spikes come in a row; the
+  state then restarts from the new level,
+- a ``flatline`` from the ``ANOMALY_FLATLINE_COUNT``-th identical value on.
+
+Readings not newer than the last one of their magnitude are not checked.
+
+States live in memory per process and are upserted into
+``magnitude_stats`` at most every ``ANOMALY_PERSIST_INTERVAL`` seconds, in
+the ingest transaction; a process loads the stored state of a magnitude it
+has not seen yet. When that transaction rolls back, the states it changed
+are dropped, to be loaded again from the table, and the states it wrote
+are marked for the next write again.
+"""
+import math
+import time
+from collections import defaultdict
+from threading import RLock
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from . import db
+from .models import Alert, Magnitude, MagnitudeStats
+from .upsert import upsert
+
+_FIELDS = ('count', 'mean', 'variance', 'last_value', 'last_timestamp', 'flat', 'outliers')
+
+
+class _States:
+    def __init__(self):
+        self.states = {}
+        self.dirty = set()
+        self.persisted_at = time.monotonic()
+        self.lock = RLock()
+
+    def load(self, magnitude_ids):
+        missing = [m for m in magnitude_ids if m not in self.states]
+        if not missing:
+            return
+        for row in db.session.query(MagnitudeStats.magnitude_id,
+                                    *(getattr(MagnitudeStats, f) for f in _FIELDS)) \
+                .filter(MagnitudeStats.magnitude_id.in_(missing)):
+            self.states[row[0]] = list(row[1:])
+        for magnitude_id in missing:
+            self.states.setdefault(magnitude_id, [0, 0.0, 0.0, None, None, 0, 0])
+
+    def persist(self):
+        if self.dirty:
+            ids = list(self.dirty)
+            upsert(MagnitudeStats.__table__, ['magnitude_id'],
+                   [dict(zip(_FIELDS, self.states[m]), magnitude_id=m) for m in ids])
+            _pending(self)[1].update(ids)
+            self.dirty.clear()
+        self.persisted_at = time.monotonic()
+
+    def rolled_back(self, changed, written):
+        with self.lock:
+            for magnitude_id in changed:
+                self.states.pop(magnitude_id, None)
+                self.dirty.discard(magnitude_id)
+            self.dirty.update(written - changed)
+
+
+def _pending(states):
+    """Return the ``(changed, written)`` magnitude ids of the current transaction."""
+    return db.session.info.setdefault('anomaly_states', {}).setdefault(states, (set(), set()))
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    session.info.pop('anomaly_states', None)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    for states, (changed, written) in session.info.pop('anomaly_states', {}).items():
+        states.rolled_back(changed, written)
+
+
+def check(state, timestamp, value, config):
+    """Update ``state`` with one reading and return its anomaly, if any."""
+    count, mean, variance, last_value, last_timestamp, flat, outliers = state
+    if last_timestamp is not None and timestamp <= last_timestamp:
+        return None
+    anomaly = None
+    flat = flat + 1 if value == last_value else 0
+    if flat + 1 >= config['ANOMALY_FLATLINE_COUNT']:
+        anomaly = 'flatline'
+
+    delta = value - mean
+    deviation = max(math.sqrt(variance), config['ANOMALY_MIN_STD'])
+    if count >= config['ANOMALY_MIN_SAMPLES'] and \
+            abs(delta) > config['ANOMALY_SPIKE_SIGMA'] * deviation:
+        outliers += 1
+        if outliers >= config['ANOMALY_OFFSET_COUNT']:
+            anomaly = 'offset'
+            count, mean, variance, outliers = 1, value, 0.0, 0
+        else:
+            anomaly = 'spike'
+    else:
+        outliers = 0
+        count += 1
+        alpha = 1.0 / min(count, config['ANOMALY_WINDOW'])
+        mean += alpha * delta
+        variance = (1 - alpha) * (variance + alpha * delta * delta)
+    state[:] = count, mean, variance, value, timestamp, flat, outliers
+    return anomaly
+
+
+class AnomalyDetector:
+    def init_app(self, app):
+        app.extensions['anomaly'] = _States()
+
+    def update(self, rows):
+        """Feed ``(magnitude_id, timestamp, value)`` rows and return their anomalies.
+
+        The returned list is aligned with ``rows``; readings not newer than
+        the last one seen for their magnitude are not checked.
+        """
+        config = current_app.config
+        states = current_app.extensions['anomaly']
+        order = sorted(range(len(rows)), key=lambda i: (rows[i][0], rows[i][1]))
+        anomalies = [None] * len(rows)
+        with states.lock:
+            states.load({row[0] for row in rows})
+            _pending(states)[0].update(row[0] for row in rows)
+            for i in order:
+                magnitude_id, timestamp, value = rows[i]
+                anomalies[i] = check(states.states[magnitude_id], timestamp, value, config)
+                states.dirty.add(magnitude_id)
+            if time.monotonic() - states.persisted_at >= config['ANOMALY_PERSIST_INTERVAL']:
+                states.persist()
+        return anomalies
+
+    def flush(self):
+        """Write every pending state now; the caller commits."""
+        states = current_app.extensions['anomaly']
+        with states.lock:
+            states.persist()
+
+    def raise_alerts(self, rows, anomalies):
+        found = defaultdict(dict)
+        for (magnitude_id, timestamp, value), anomaly in zip(rows, anomalies):
+            if anomaly is not None:
+                found[magnitude_id].setdefault(anomaly, (timestamp, value))
+        if not found:
+            return []
+        owners = dict(db.session.query(Magnitude.id, Magnitude.user_id)
+                      .filter(Magnitude.id.in_(list(found)), Magnitude.deleted_at == None))
+        alerts = []
+        for magnitude_id, kinds in found.items():
+            if owners.get(magnitude_id) is None:
+                # deleted since, or never had an owner
+                continue
+            for anomaly, (timestamp, value) in kinds.items():
+                alerts.append(Alert.raise_alert(
+                    'Magnitude %d %s (%s at %s)' % (magnitude_id, anomaly, value, timestamp),
+                    owners[magnitude_id], 'Warning', origin='anomaly:%s' % anomaly,
+                    group_key='magnitude:%d' % magnitude_id))
+        return alerts
+
+
+anomalies = AnomalyDetector()
@@ -2,4 +2,4 @@ from flask import Blueprint
 
 api = Blueprint('api', __name__)
 
-from . import authentication, users, errors, vineyards, sensors, magnitudes, metrics, alerts, api_tokens
+from . import authentication, users, errors, vineyards, sensors, magnitudes, metrics, alerts, alert_rules, api_tokens, jobs, exports, profiler, telemetry, queries
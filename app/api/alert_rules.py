@@ -0,0 +1,68 @@
+from flask import jsonify, g, request,  url_for, current_app
+from .. import db
+from ..models import AlertRule, AlertRuleState, Magnitude, Permission
+from . import api
+from .decorators import permission_required
+from .errors import forbidden
+
+
+@api.route('/alert-rules/')
+def get_alert_rules():
+    page = request.args.get('page', 1, type=int)
+    pagination = AlertRule.query.filter(AlertRule.user_id==g.current_user.id).paginate(
+        page, per_page=current_app.config['ITEMS_PER_PAGE'],
+        error_out=False)
+    alert_rules = pagination.items
+    prev = None
+    if pagination.has_prev:
+        prev = url_for('api.get_alert_rules', page=page-1)
+    next = None
+    if pagination.has_next:
+        next = url_for('api.get_alert_rules', page=page+1)
+    return jsonify({
+        'alert_rules': [alert_rule.to_json() for alert_rule in alert_rules],
+        'prev': prev,
+        'next': next,
+        'count': pagination.total
+    })
+
+
+@api.route('/alert-rules/<int:id>')
+def get_alert_rule(id):
+    alert_rule = AlertRule.query.filter_by(id=id, user_id=g.current_user.id).first_or_404()
+    return jsonify(alert_rule.to_json())
+
+
+@api.route('/alert-rules/', methods=['POST'])
+@permission_required(Permission.WRITE)
+def new_alert_rule():
+    alert_rule = AlertRule.from_json({**request.json, 'user_id': g.current_user.id})
+    if alert_rule.magnitude_id is not None:
+        magnitude = Magnitude.alive().filter_by(id=alert_rule.magnitude_id).first_or_404()
+        if magnitude.user_id != g.current_user.id:
+            return forbidden('Insufficient permissions')
+    db.session.add(alert_rule)
+    db.session.commit()
+    return jsonify(alert_rule.to_json()), 201, \
+        {'Location': url_for('api.get_alert_rule', id=alert_rule.id)}
+
+
+@api.route('/alert-rules/<int:id>', methods=['PUT'])
+@permission_required(Permission.WRITE)
+def edit_alert_rule(id):
+    alert_rule = AlertRule.query.filter_by(id=id, user_id=g.current_user.id).first_or_404()
+    alert_rule.edit(request.json)
+    db.session.add(alert_rule)
+    db.session.commit()
+    return jsonify(alert_rule.to_json())
+
+
+@api.route('/alert-rules/<int:id>', methods=['DELETE'])
+@permission_required(Permission.WRITE)
+def delete_alert_rule(id):
+    alert_rule = AlertRule.query.filter_by(id=id, user_id=g.current_user.id).first_or_404()
+    json_alert_rule = alert_rule.to_json()
+    AlertRuleState.query.filter_by(rule_id=alert_rule.id).delete(synchronize_session=False)
+    db.session.delete(alert_rule)
+    db.session.commit()
+    return jsonify(json_alert_rule)
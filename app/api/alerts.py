@@ -32,8 +32,11 @@ def new_alert():
     fields = request.json
     fields['user_id'] = g.current_user.id
     alert = Alert.from_json(fields)
-    db.session.add(alert)
+    alert = Alert.raise_alert(alert.content, alert.user_id, alert.priority,
+                              origin=alert.origin, group_key=alert.group_key)
     db.session.commit()
+    if alert.occurrences > 1:
+        return jsonify(alert.to_json())
     return jsonify(alert.to_json()), 201, \
             {'Location': url_for('api.get_alerts', id=alert.id)}
 
@@ -46,3 +46,14 @@ def new_api_token():
     token = g.current_user.generate_api_token(description)
     return jsonify(token.to_json()), 201, \
         {'Location': url_for('api.get_api_token', id=token.id)}
+
+
+@api.route('/api-tokens/<int:id>', methods=['PUT'])
+@permission_required(Permission.ADMIN)
+def edit_api_token(id):
+    api_token = ApiToken.query.filter_by(id=id, user_id=g.current_user.id).first_or_404()
+    api_token.description = request.json.get('description', api_token.description)
+    api_token.enabled = request.json.get('enabled', api_token.enabled)
+    db.session.add(api_token)
+    db.session.commit()
+    return jsonify(api_token.to_json())
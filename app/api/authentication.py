@@ -2,7 +2,10 @@ from flask import g, jsonify, request
 from flask_jwt_extended import create_access_token, create_refresh_token, \
     get_jwt_identity, get_jwt_claims, jwt_refresh_token_required, \
     verify_jwt_in_request
+from ..identity import identities
 from ..models import User
+from ..timing import phase
+from ..tokens import api_tokens
 from . import api
 from .errors import unauthorized
 
@@ -15,11 +18,15 @@ def before_request():
         return
     token = request.args.get('token', None, type=str)
     if token:
-        user = User.verify_api_token(token)
+        with phase('auth'):
+            user_id, _ = api_tokens.verify(token)
+        with phase('user'):
+            user = identities.by_id(user_id) if user_id is not None else None
     else:
-        verify_jwt_in_request()
-        identity = get_jwt_identity()
-        user = User.query.filter_by(email=identity).first()
+        with phase('auth'):
+            verify_jwt_in_request()
+        with phase('user'):
+            user = identities.by_email(get_jwt_identity())
     if not user:
         return unauthorized('Invalid credentials')
     g.current_user = user
@@ -0,0 +1,81 @@
+from flask import jsonify, g, request,  url_for, current_app, send_file
+from .. import db, exports
+from ..models import Export, Vineyard
+from . import api
+from .errors import forbidden
+
+
+def _get_export(id):
+    export = Export.query.get_or_404(id)
+    if not (g.current_user.is_administrator() or g.current_user.id == export.user_id):
+        return None
+    return export
+
+
+@api.route('/exports/')
+def get_exports():
+    page = request.args.get('page', 1, type=int)
+    pagination = Export.query.filter(Export.user_id==g.current_user.id) \
+        .order_by(Export.id.desc()).paginate(
+        page, per_page=current_app.config['ITEMS_PER_PAGE'],
+        error_out=False)
+    prev = None
+    if pagination.has_prev:
+        prev = url_for('api.get_exports', page=page-1)
+    next = None
+    if pagination.has_next:
+        next = url_for('api.get_exports', page=page+1)
+    return jsonify({
+        'exports': [export.to_json() for export in pagination.items],
+        'prev': prev,
+        'next': next,
+        'count': pagination.total
+    })
+
+
+@api.route('/exports/<int:id>')
+def get_export(id):
+    export = _get_export(id)
+    if export is None:
+        return forbidden('Insufficient permissions')
+    return jsonify(export.to_json())
+
+
+@api.route('/exports/', methods=['POST'])
+def new_export():
+    fields = request.json or {}
+    vineyard_id = fields.get('vineyard_id')
+    if vineyard_id is not None:
+        vineyard = Vineyard.alive().filter_by(id=vineyard_id).first_or_404()
+        if g.current_user.id != vineyard.user_id:
+            return forbidden('Insufficient permissions')
+    export = exports.request_export(g.current_user.id, vineyard_id,
+                                    fields.get('format', 'csv.gz'))
+    db.session.commit()
+    return jsonify(export.to_json()), 202, \
+        {'Location': url_for('api.get_export', id=export.id)}
+
+
+@api.route('/exports/<int:id>/download')
+def download_export(id):
+    export = _get_export(id)
+    if export is None:
+        return forbidden('Insufficient permissions')
+    if export.status != 'ready':
+        response = jsonify({'error': 'not available', 'message': 'export is %s' % export.status})
+        response.status_code = 410 if export.status == 'expired' else 409
+        return response
+    mimetype = 'application/gzip' if export.format == 'csv.gz' else 'application/octet-stream'
+    name = 'export-%d.%s' % (export.id, export.format)
+    return send_file(exports.path(export), mimetype=mimetype, as_attachment=True,
+                     attachment_filename=name, conditional=True)
+
+
+@api.route('/exports/<int:id>', methods=['DELETE'])
+def delete_export(id):
+    export = _get_export(id)
+    if export is None:
+        return forbidden('Insufficient permissions')
+    exports.remove(export)
+    db.session.commit()
+    return jsonify(export.to_json())
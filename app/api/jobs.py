@@ -0,0 +1,51 @@
+from flask import jsonify, g, request,  url_for, current_app
+from .. import db, jobs
+from ..models import Job, Permission
+from . import api
+from .decorators import permission_required
+from .errors import bad_request, forbidden
+
+
+@api.route('/jobs/')
+def get_jobs():
+    page = request.args.get('page', 1, type=int)
+    query = Job.query
+    if not g.current_user.is_administrator():
+        query = query.filter(Job.user_id==g.current_user.id)
+    pagination = query.order_by(Job.id.desc()).paginate(
+        page, per_page=current_app.config['ITEMS_PER_PAGE'],
+        error_out=False)
+    prev = None
+    if pagination.has_prev:
+        prev = url_for('api.get_jobs', page=page-1)
+    next = None
+    if pagination.has_next:
+        next = url_for('api.get_jobs', page=page+1)
+    return jsonify({
+        'jobs': [job.to_json() for job in pagination.items],
+        'prev': prev,
+        'next': next,
+        'count': pagination.total
+    })
+
+
+@api.route('/jobs/<int:id>')
+def get_job(id):
+    job = Job.query.get_or_404(id)
+    if not (g.current_user.is_administrator() or g.current_user.id == job.user_id):
+        return forbidden('Insufficient permissions')
+    return jsonify(job.to_json())
+
+
+@api.route('/jobs/', methods=['POST'])
+@permission_required(Permission.ADMIN)
+def new_job():
+    fields = request.json or {}
+    try:
+        job = jobs.enqueue(fields.get('type'), fields.get('args'),
+                           priority=fields.get('priority', 0), user_id=g.current_user.id)
+    except ValueError as e:
+        return bad_request(e.args[0])
+    db.session.commit()
+    return jsonify(job.to_json()), 202, \
+        {'Location': url_for('api.get_job', id=job.id)}
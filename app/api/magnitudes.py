@@ -1,5 +1,7 @@
 from flask import jsonify, g, request,  url_for, current_app
 from .. import db
+from .. import jobs, serializers, timeseries
+from ..encoders import stream_json
 from ..models import Vineyard, Permission, Sensor, Magnitude, Metric
 from . import api
 from .decorators import permission_required
@@ -9,7 +11,8 @@ from .errors import forbidden
 @api.route('/magnitudes/')
 def get_magnitudes():
     page = request.args.get('page', 1, type=int)
-    pagination = Magnitude.query.filter(Magnitude.user_id==g.current_user.id).paginate(
+    pagination = Magnitude.alive().with_entities(*serializers.MAGNITUDE_COLUMNS) \
+        .filter(Magnitude.user_id==g.current_user.id).paginate(
         page, per_page=current_app.config['ITEMS_PER_PAGE'],
         error_out=False)
     magnitudes = pagination.items
@@ -20,7 +23,7 @@ def get_magnitudes():
     if pagination.has_next:
         next = url_for('api.get_magnitudes', page=page+1)
     return jsonify({
-        'magnitudes': [magnitude.to_json() for magnitude in magnitudes],
+        'magnitudes': serializers.magnitudes(magnitudes),
         'prev': prev,
         'next': next,
         'count': pagination.total
@@ -29,7 +32,7 @@ def get_magnitudes():
 
 @api.route('/magnitudes/<int:id>')
 def get_magnitude(id):
-    magnitude = Magnitude.query.get_or_404(id)
+    magnitude = Magnitude.alive().filter_by(id=id).first_or_404()
     if not (g.current_user.is_administrator() or g.current_user.id == magnitude.user_id):
         return forbidden('Insufficient permissions')
     return jsonify(magnitude.to_json())
@@ -48,7 +51,7 @@ def new_magnitude():
 @api.route('/magnitudes/<int:id>', methods=['PUT'])
 @permission_required(Permission.WRITE)
 def edit_magnitude(id):
-    magnitude = Magnitude.query.get_or_404(id)
+    magnitude = Magnitude.alive().filter_by(id=id).first_or_404()
     magnitude.type = request.json.get('type', magnitude.type)
     magnitude.layer = request.json.get('layer', magnitude.layer)
     magnitude.sensor_id = request.json.get('sensor_id', magnitude.sensor_id)
@@ -59,31 +62,49 @@ def edit_magnitude(id):
 @api.route('/magnitudes/<int:id>', methods=['DELETE'])
 @permission_required(Permission.WRITE)
 def delete_magnitude(id):
-    magnitude = Magnitude.query.get_or_404(id)
+    magnitude = Magnitude.alive().filter_by(id=id).first_or_404()
     if not (g.current_user.is_administrator() or g.current_user.id == magnitude.user_id):
         return forbidden('Insufficient permissions')
-    Magnitude.query.filter_by(id=id).delete()
+    magnitude.soft_delete()
+    jobs.enqueue('purge', unique=True)
     db.session.commit()
     return jsonify(magnitude.to_json())
 
 
 @api.route('/magnitudes/<int:id>/metrics/')
 def get_magnitude_metrics(id):
-    magnitude = Magnitude.query.get_or_404(id)
+    magnitude = Magnitude.alive().filter_by(id=id).first_or_404()
+    if 'interval' in request.args:
+        return get_magnitude_series(magnitude)
     page = request.args.get('page', 1, type=int)
-    pagination = magnitude.metrics.order_by(Metric.timestamp.desc()).paginate(
-        page, per_page=current_app.config['ITEMS_PER_PAGE'],
+    per_page = min(request.args.get('per_page', current_app.config['ITEMS_PER_PAGE'], type=int),
+                   current_app.config['MAX_ITEMS_PER_PAGE'])
+    pagination = magnitude.metrics.with_entities(*serializers.METRIC_COLUMNS) \
+        .order_by(Metric.timestamp.desc()).paginate(
+        page, per_page=per_page,
         error_out=False)
     metrics = pagination.items
     prev = None
     if pagination.has_prev:
-        prev = url_for('api.get_magnitude_metrics', id=id, page=page-1)
+        prev = url_for('api.get_magnitude_metrics', id=id, page=page-1, per_page=per_page)
     next = None
     if pagination.has_next:
-        next = url_for('api.get_magnitude_metrics', id=id, page=page+1)
-    return jsonify({
-        'metrics': [metric.to_json() for metric in metrics],
+        next = url_for('api.get_magnitude_metrics', id=id, page=page+1, per_page=per_page)
+    return stream_json(current_app._get_current_object(), {
         'prev': prev,
         'next': next,
         'count': pagination.total
-    })
+    }, 'metrics', serializers.metrics(metrics))
+
+
+def get_magnitude_series(magnitude):
+    args = timeseries.parse_args(request.args)
+    points = timeseries.resample(magnitude.id, **args)
+    return stream_json(current_app._get_current_object(), {
+        'start': args['start'],
+        'end': args['end'],
+        'interval': args['interval'],
+        'agg': args['aggregate'],
+        'fill': args['strategy'],
+        'magnitude_url': url_for('api.get_magnitude', id=magnitude.id)
+    }, 'points', [{'timestamp': timestamp, 'value': value} for timestamp, value in points])
@@ -1,5 +1,9 @@
 from flask import jsonify, request,  url_for, current_app
 from .. import db
+from .. import serializers
+from ..anomaly import anomalies
+from ..encoders import stream_json
+from ..ingest import ingest, parse_batch, process
 from ..models import Vineyard, Permission, Sensor, Magnitude, Metric
 from . import api
 from .decorators import permission_required
@@ -9,35 +13,48 @@ from .errors import forbidden
 @api.route('/metrics/')
 def get_metrics():
     page = request.args.get('page', 1, type=int)
-    pagination = Metric.query.paginate(
-        page, per_page=current_app.config['ITEMS_PER_PAGE'],
+    per_page = min(request.args.get('per_page', current_app.config['ITEMS_PER_PAGE'], type=int),
+                   current_app.config['MAX_ITEMS_PER_PAGE'])
+    pagination = Metric.query.with_entities(*serializers.METRIC_COLUMNS).join(Magnitude) \
+        .filter(Magnitude.deleted_at == None).paginate(
+        page, per_page=per_page,
         error_out=False)
     metrics = pagination.items
     prev = None
     if pagination.has_prev:
-        prev = url_for('api.get_metrics', page=page-1)
+        prev = url_for('api.get_metrics', page=page-1, per_page=per_page)
     next = None
     if pagination.has_next:
-        next = url_for('api.get_metrics', page=page+1)
-    return jsonify({
-        'metrics': [metric.to_json() for metric in metrics],
+        next = url_for('api.get_metrics', page=page+1, per_page=per_page)
+    return stream_json(current_app._get_current_object(), {
         'prev': prev,
         'next': next,
         'count': pagination.total
-    })
+    }, 'metrics', serializers.metrics(metrics))
 
 
 @api.route('/metrics/<int:id>')
 def get_metric(id):
-    metric = Metric.query.get_or_404(id)
+    metric = Metric.query.join(Magnitude).filter(Metric.id == id, Magnitude.deleted_at == None) \
+        .first_or_404()
     return jsonify(metric.to_json())
 
 
 @api.route('/metrics/', methods=['POST'])
 @permission_required(Permission.WRITE)
 def new_metric():
-    metric = Metric.from_json(request.json)
+    if isinstance(request.json, list):
+        count = ingest(parse_batch(request.json))
+        db.session.commit()
+        return jsonify({'count': count}), 201
+    rows = parse_batch([request.json])
+    flags = anomalies.update(rows)
+    (magnitude_id, timestamp, value), = rows
+    metric = Metric(timestamp=timestamp, value=value, magnitude_id=magnitude_id,
+                    anomaly=flags[0])
     db.session.add(metric)
+    db.session.flush()
+    process(rows, flags)
     db.session.commit()
     return jsonify(metric.to_json()), 201, \
         {'Location': url_for('api.get_metric', id=metric.id)}
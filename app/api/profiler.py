@@ -0,0 +1,51 @@
+from flask import jsonify, request, current_app, send_from_directory, abort
+from ..models import Permission
+from ..profiler import profiler
+from . import api
+from .decorators import permission_required
+from .errors import bad_request
+
+
+@api.route('/profiler')
+@permission_required(Permission.ADMIN)
+def get_profiler():
+    session = profiler.session
+    return jsonify({
+        'session': session.to_json() if session is not None else None,
+        'profiles': profiler.profiles(current_app.config['PROFILER_DIR'])
+    })
+
+
+@api.route('/profiler', methods=['POST'])
+@permission_required(Permission.ADMIN)
+def start_profiler():
+    fields = request.json or {}
+    duration = fields.get('duration', current_app.config['PROFILER_DURATION'])
+    if not isinstance(duration, (int, float)) or \
+            not 0 < duration <= current_app.config['PROFILER_MAX_DURATION']:
+        return bad_request('duration must be between 0 and %d seconds'
+                           % current_app.config['PROFILER_MAX_DURATION'])
+    endpoint = fields.get('endpoint')
+    if endpoint is not None and endpoint not in current_app.view_functions:
+        return bad_request('unknown endpoint %s' % endpoint)
+    session = profiler.start(current_app.config['PROFILER_DIR'], duration,
+                             current_app.config['PROFILER_INTERVAL'], endpoint)
+    return jsonify(session.to_json()), 202
+
+
+@api.route('/profiler', methods=['DELETE'])
+@permission_required(Permission.ADMIN)
+def stop_profiler():
+    session = profiler.stop()
+    if session is None:
+        abort(404)
+    return jsonify(session.to_json())
+
+
+@api.route('/profiler/<name>')
+@permission_required(Permission.ADMIN)
+def get_profile(name):
+    if name not in profiler.profiles(current_app.config['PROFILER_DIR']):
+        abort(404)
+    return send_from_directory(current_app.config['PROFILER_DIR'], name,
+                               mimetype='text/plain')
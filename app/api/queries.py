@@ -0,0 +1,22 @@
+from flask import jsonify, request
+from ..models import Permission
+from ..tracing import tracer
+from . import api
+from .decorators import permission_required
+from .errors import bad_request
+
+
+@api.route('/queries')
+@permission_required(Permission.ADMIN)
+def get_queries():
+    sort = request.args.get('sort', 'total')
+    if sort not in ('total', 'count', 'mean', 'p95', 'max'):
+        return bad_request('sort must be one of total, count, mean, p95 or max')
+    return jsonify(tracer.report(sort, request.args.get('limit', 50, type=int)))
+
+
+@api.route('/queries', methods=['DELETE'])
+@permission_required(Permission.ADMIN)
+def reset_queries():
+    tracer.reset()
+    return jsonify(tracer.report())
@@ -1,26 +1,37 @@
+from datetime import datetime
 from flask import jsonify, g, request,  url_for, current_app
 from .. import db
+from .. import fleet, jobs, serializers, soil, timeseries, viticulture
 from ..models import Vineyard, Permission, Sensor, Magnitude
 from . import api
 from .decorators import permission_required
-from .errors import forbidden
+from .errors import bad_request, forbidden
 
 
 @api.route('/sensors/')
 def get_sensors():
     page = request.args.get('page', 1, type=int)
-    pagination = Sensor.query.filter(Sensor.user_id==g.current_user.id).paginate(
+    status = request.args.get('status')
+    query = Sensor.alive().with_entities(*serializers.SENSOR_COLUMNS) \
+        .filter(Sensor.user_id==g.current_user.id)
+    if status == 'stale':
+        query = query.filter(fleet.is_stale(datetime.utcnow()))
+    elif status == 'low-battery':
+        query = query.filter(fleet.is_low_battery())
+    elif status is not None:
+        return bad_request('status must be stale or low-battery')
+    pagination = query.paginate(
         page, per_page=current_app.config['ITEMS_PER_PAGE'],
         error_out=False)
     sensors = pagination.items
     prev = None
     if pagination.has_prev:
-        prev = url_for('api.get_sensors', page=page-1)
+        prev = url_for('api.get_sensors', page=page-1, status=status)
     next = None
     if pagination.has_next:
-        next = url_for('api.get_sensors', page=page+1)
+        next = url_for('api.get_sensors', page=page+1, status=status)
     return jsonify({
-        'sensors': [sensor.to_json() for sensor in sensors],
+        'sensors': serializers.sensors(sensors),
         'prev': prev,
         'next': next,
         'count': pagination.total
@@ -29,12 +40,41 @@ def get_sensors():
 
 @api.route('/sensors/<int:id>')
 def get_sensor(id):
-    sensor = Sensor.query.get_or_404(id)
+    sensor = Sensor.alive().filter_by(id=id).first_or_404()
     if not (g.current_user.is_administrator() or g.current_user.id == sensor.user_id):
         return forbidden('Insufficient permissions')
     return jsonify(sensor.to_json())
 
 
+@api.route('/sensors/<int:id>/gdd')
+def get_sensor_gdd(id):
+    sensor = Sensor.alive().filter_by(id=id).first_or_404()
+    if not (g.current_user.is_administrator() or g.current_user.id == sensor.user_id):
+        return forbidden('Insufficient permissions')
+    summary = viticulture.heat_summary([sensor.id], sensor.latitude,
+                                       **viticulture.parse_args(request.args))
+    summary['sensor_url'] = url_for('api.get_sensor', id=id)
+    return jsonify(summary)
+
+
+@api.route('/sensors/<int:id>/soil-profile')
+def get_sensor_soil_profile(id):
+    sensor = Sensor.alive().filter_by(id=id).first_or_404()
+    if not (g.current_user.is_administrator() or g.current_user.id == sensor.user_id):
+        return forbidden('Insufficient permissions')
+    args = timeseries.parse_args(request.args)
+    type = request.args.get('type', 'Humidity')
+    return jsonify({
+        'type': type,
+        'start': args['start'],
+        'end': args['end'],
+        'interval': args['interval'],
+        'layers': list(soil.LAYERS),
+        'points': soil.profile(id, type, args['start'], args['end'], args['interval']),
+        'sensor_url': url_for('api.get_sensor', id=id)
+    })
+
+
 @api.route('/sensors/', methods=['POST'])
 @permission_required(Permission.WRITE)
 def new_sensor():
@@ -48,7 +88,7 @@ def new_sensor():
 @api.route('/sensors/<int:id>', methods=['PUT'])
 @permission_required(Permission.WRITE)
 def edit_sensor(id):
-    sensor = Sensor.query.filter_by(id=id, user_id=g.current_user.id).first_or_404()
+    sensor = Sensor.alive().filter_by(id=id, user_id=g.current_user.id).first_or_404()
     sensor.description = request.json.get('description', sensor.description)
     sensor.latitude = request.json.get('latitude', sensor.latitude)
     sensor.longitude = request.json.get('longitude', sensor.longitude)
@@ -56,6 +96,8 @@ def edit_sensor(id):
     sensor.vineyard_id = request.json.get('vineyard_id', sensor.vineyard_id)
     sensor.user_id = request.json.get('user_id', sensor.user_id)
     sensor.power_perc = request.json.get('power_perc', sensor.power_perc)
+    sensor.expected_interval = request.json.get('expected_interval', sensor.expected_interval)
+    sensor.update_stale_at()
     db.session.add(sensor)
     db.session.commit()
     return jsonify(sensor.to_json())
@@ -63,18 +105,20 @@ def edit_sensor(id):
 @api.route('/sensors/<int:id>', methods=['DELETE'])
 @permission_required(Permission.WRITE)
 def delete_sensor(id):
-    sensor = Sensor.query.get_or_404(id)
+    sensor = Sensor.alive().filter_by(id=id).first_or_404()
     if not (g.current_user.is_administrator() or g.current_user.id == sensor.user_id):
         return forbidden('Insufficient permissions')
-    Sensor.query.filter_by(id=id).delete()
+    sensor.soft_delete()
+    jobs.enqueue('purge', unique=True)
     db.session.commit()
     return jsonify(sensor.to_json())
 
 @api.route('/sensors/<int:id>/magnitudes/')
 def get_sensor_magnitudes(id):
-    sensor = Sensor.query.filter_by(id=id, user_id=g.current_user.id).first_or_404()
+    sensor = Sensor.alive().filter_by(id=id, user_id=g.current_user.id).first_or_404()
     page = request.args.get('page', 1, type=int)
-    pagination = sensor.magnitudes.order_by(Magnitude.created_at.desc()).paginate(
+    pagination = sensor.magnitudes.with_entities(*serializers.MAGNITUDE_COLUMNS) \
+        .filter(Magnitude.deleted_at == None).order_by(Magnitude.created_at.desc()).paginate(
         page, per_page=current_app.config['ITEMS_PER_PAGE'],
         error_out=False)
     magnitudes = pagination.items
@@ -85,7 +129,7 @@ def get_sensor_magnitudes(id):
     if pagination.has_next:
         next = url_for('api.get_sensor_magnitudes', id=id, page=page+1)
     return jsonify({
-        'magnitudes': [magnitude.to_json() for magnitude in magnitudes],
+        'magnitudes': serializers.magnitudes(magnitudes),
         'prev': prev,
         'next': next,
         'count': pagination.total
@@ -93,5 +137,5 @@ def get_sensor_magnitudes(id):
 
 @api.route('/sensors/<int:id>/last-metrics/')
 def get_sensor_last_metrics(id):
-    sensor = Sensor.query.filter_by(id=id, user_id=g.current_user.id).first_or_404()
+    sensor = Sensor.alive().filter_by(id=id, user_id=g.current_user.id).first_or_404()
     return jsonify(sensor.last_metrics())
@@ -0,0 +1,11 @@
+from flask import Response
+from ..models import Permission
+from ..telemetry import telemetry
+from . import api
+from .decorators import permission_required
+
+
+@api.route('/telemetry')
+@permission_required(Permission.ADMIN)
+def get_telemetry():
+    return Response(telemetry.exposition(), mimetype='text/plain; version=0.0.4')
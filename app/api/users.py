@@ -1,6 +1,7 @@
 from flask import jsonify, g, request, current_app, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from . import api
+from .. import serializers
 from .errors import forbidden
 from ..models import User, Vineyard
 
@@ -22,7 +23,8 @@ def get_user_vineyards(id):
         return forbidden('Insufficient permissions')
     user = User.query.get_or_404(id)
     page = request.args.get('page', 1, type=int)
-    pagination = user.vineyards.order_by(Vineyard.created_at.desc()).paginate(
+    pagination = user.vineyards.with_entities(*serializers.VINEYARD_COLUMNS) \
+        .filter(Vineyard.deleted_at == None).order_by(Vineyard.created_at.desc()).paginate(
         page, per_page=current_app.config['ITEMS_PER_PAGE'],
         error_out=False)
     vineyards = pagination.items
@@ -33,7 +35,7 @@ def get_user_vineyards(id):
     if pagination.has_next:
         next = url_for('api.get_user_vineyards', id=id, page=page+1)
     return jsonify({
-        'vineyards': [vineyard.to_json() for vineyard in vineyards],
+        'vineyards': serializers.vineyards(vineyards),
         'prev': prev,
         'next': next,
         'count': pagination.total
@@ -1,6 +1,9 @@
+from datetime import timedelta
 from flask import jsonify, g, request,  url_for, current_app
 from .. import db
-from ..models import Vineyard, Permission, Sensor
+from .. import jobs, risk, serializers, timeseries, viticulture
+from ..ingest import parse_timestamp
+from ..models import Vineyard, Permission, Sensor, RiskHour
 from . import api
 from .decorators import permission_required
 from .errors import forbidden
@@ -9,7 +12,8 @@ from .errors import forbidden
 @api.route('/vineyards/')
 def get_vineyards():
     page = request.args.get('page', 1, type=int)
-    pagination = Vineyard.query.filter(Vineyard.user_id==g.current_user.id).paginate(
+    pagination = Vineyard.alive().with_entities(*serializers.VINEYARD_COLUMNS) \
+        .filter(Vineyard.user_id==g.current_user.id).paginate(
         page, per_page=current_app.config['ITEMS_PER_PAGE'],
         error_out=False)
     vineyards = pagination.items
@@ -20,7 +24,7 @@ def get_vineyards():
     if pagination.has_next:
         next = url_for('api.get_vineyards', page=page+1)
     return jsonify({
-        'vineyards': [vineyard.to_json() for vineyard in vineyards],
+        'vineyards': serializers.vineyards(vineyards),
         'prev': prev,
         'next': next,
         'count': pagination.total
@@ -29,10 +33,11 @@ def get_vineyards():
 
 @api.route('/vineyards/<int:id>')
 def get_vineyard(id):
-    vineyard = Vineyard.query.get_or_404(id)
+    vineyard = Vineyard.alive().filter_by(id=id).first_or_404()
     if not (g.current_user.is_administrator() or g.current_user.id == vineyard.user_id):
         return forbidden('Insufficient permissions')
-    return jsonify(vineyard.to_json())
+    return jsonify(serializers.vineyards([(vineyard.id, vineyard.name, vineyard.user_id,
+                                           vineyard.created_at)])[0])
 
 
 @api.route('/vineyards/', methods=['POST'])
@@ -48,7 +53,7 @@ def new_vineyard():
 @api.route('/vineyards/<int:id>', methods=['PUT'])
 @permission_required(Permission.WRITE)
 def edit_vineyard(id):
-    vineyard = Vineyard.query.get_or_404(id)
+    vineyard = Vineyard.alive().filter_by(id=id).first_or_404()
     vineyard.name = request.json.get('name', vineyard.name)
     db.session.add(vineyard)
     db.session.commit()
@@ -58,18 +63,75 @@ def edit_vineyard(id):
 @api.route('/vineyards/<int:id>', methods=['DELETE'])
 @permission_required(Permission.WRITE)
 def delete_vineyard(id):
-    vineyard = Vineyard.query.get_or_404(id)
+    vineyard = Vineyard.alive().filter_by(id=id).first_or_404()
     if not (g.current_user.is_administrator() or g.current_user.id == vineyard.user_id):
         return forbidden('Insufficient permissions')
-    Vineyard.query.filter_by(id=id).delete()
+    vineyard.soft_delete()
+    jobs.enqueue('purge', unique=True)
     db.session.commit()
     return jsonify(vineyard.to_json())
 
+@api.route('/vineyards/<int:id>/gdd')
+def get_vineyard_gdd(id):
+    vineyard = Vineyard.alive().filter_by(id=id).first_or_404()
+    if not (g.current_user.is_administrator() or g.current_user.id == vineyard.user_id):
+        return forbidden('Insufficient permissions')
+    sensors = db.session.query(Sensor.id, Sensor.latitude) \
+        .filter(Sensor.vineyard_id == id, Sensor.deleted_at == None).all()
+    latitudes = [latitude for _, latitude in sensors if latitude is not None]
+    latitude = sum(latitudes) / len(latitudes) if latitudes else None
+    summary = viticulture.heat_summary([sensor_id for sensor_id, _ in sensors], latitude,
+                                       **viticulture.parse_args(request.args))
+    summary['vineyard_url'] = url_for('api.get_vineyard', id=id)
+    return jsonify(summary)
+
+
+@api.route('/vineyards/<int:id>/risk')
+def get_vineyard_risk(id):
+    vineyard = Vineyard.alive().filter_by(id=id).first_or_404()
+    if not (g.current_user.is_administrator() or g.current_user.id == vineyard.user_id):
+        return forbidden('Insufficient permissions')
+    end = parse_timestamp(request.args.get('end'))
+    start = parse_timestamp(request.args['start']) if request.args.get('start') \
+        else end - timedelta(days=7)
+    risk.refresh(id)
+    hours = RiskHour.query.filter(RiskHour.vineyard_id == id, RiskHour.hour >= start,
+                                  RiskHour.hour <= end).order_by(RiskHour.hour)
+    return jsonify({
+        'start': start,
+        'end': end,
+        'hours': [hour.to_json() for hour in hours],
+        'vineyard_url': url_for('api.get_vineyard', id=id)
+    })
+
+
+@api.route('/vineyards/<int:id>/aggregate')
+def get_vineyard_aggregate(id):
+    vineyard = Vineyard.alive().filter_by(id=id).first_or_404()
+    if not (g.current_user.is_administrator() or g.current_user.id == vineyard.user_id):
+        return forbidden('Insufficient permissions')
+    args = timeseries.parse_args(request.args)
+    layer, type = request.args.get('layer', 'Surface'), request.args.get('type')
+    buckets = timeseries.spatial(vineyard.user_id, id, layer, type, args['start'], args['end'],
+                                 args['interval'], args['strategy'])
+    return jsonify({
+        'layer': layer,
+        'type': type,
+        'start': args['start'],
+        'end': args['end'],
+        'interval': args['interval'],
+        'fill': args['strategy'],
+        'buckets': [dict(values, timestamp=timestamp) for timestamp, values in buckets],
+        'vineyard_url': url_for('api.get_vineyard', id=id)
+    })
+
+
 @api.route('/vineyards/<int:id>/sensors/')
 def get_vineyard_sensors(id):
-    vineyard = Vineyard.query.filter_by(id=id, user_id=g.current_user.id).first_or_404()
+    vineyard = Vineyard.alive().filter_by(id=id, user_id=g.current_user.id).first_or_404()
     page = request.args.get('page', 1, type=int)
-    pagination = vineyard.sensors.order_by(Sensor.created_at.desc()).paginate(
+    pagination = vineyard.sensors.with_entities(*serializers.SENSOR_COLUMNS) \
+        .filter(Sensor.deleted_at == None).order_by(Sensor.created_at.desc()).paginate(
         page, per_page=current_app.config['ITEMS_PER_PAGE'],
         error_out=False)
     sensors = pagination.items
@@ -80,7 +142,7 @@ def get_vineyard_sensors(id):
     if pagination.has_next:
         next = url_for('api.get_vineyard_sensors', id=id, page=page+1)
     return jsonify({
-        'sensors': [sensor.to_json() for sensor in sensors],
+        'sensors': serializers.sensors(sensors),
         'prev': prev,
         'next': next,
         'count': pagination.total
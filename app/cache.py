@@ -0,0 +1,124 @@
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from threading import Lock
+from flask import has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_commit_hooks = {}
+
+
+class TTLCache:
+    """Thread safe LRU mapping whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=60, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires <= self.timer():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, self.timer() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[0] if item is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class Channel:
+    """Invalidation channel shared by the processes of one host.
+
+    Publishing atomically replaces a small file; subscribers notice the new
+    inode or mtime with a single ``stat`` call. A channel without a path
+    never fires, which keeps processes isolated (e.g. in tests).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._seen = self._version()
+
+    def _version(self):
+        if self.path is None:
+            return None
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def publish(self):
+        if self.path is None:
+            return
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            f.write('%d:%f' % (os.getpid(), time.time()))
+        os.replace(tmp, self.path)
+        self._seen = self._version()
+
+    def changed(self):
+        version = self._version()
+        if version == self._seen:
+            return False
+        self._seen = version
+        return True
+
+
+def channel(app, topic):
+    directory = app.config['CACHE_CHANNEL_DIR']
+    return Channel(os.path.join(directory, topic) if directory else None)
+
+
+def on_commit(topic):
+    """Register the function run after a commit that made ``topic`` stale."""
+    def decorator(f):
+        _commit_hooks[topic] = f
+        return f
+    return decorator
+
+
+def mark_stale(target, topic):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('stale_caches', set()).add(topic)
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    topics = session.info.pop('stale_caches', ())
+    if topics and has_app_context():
+        for topic in topics:
+            _commit_hooks[topic]()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('stale_caches', None)
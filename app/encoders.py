@@ -0,0 +1,109 @@
+"""Response JSON encoders.
+
+``JSON_BACKEND`` selects the encoder installed as ``app.json_encoder``:
+``'orjson'`` requires the optional orjson package, ``'stdlib'`` uses the
+standard library and ``'auto'`` picks orjson when it can be imported.
+``JSON_DATETIME_FORMAT`` is applied the same way by every backend.
+"""
+import calendar
+import time
+import uuid
+from datetime import date, datetime, timezone
+from flask import Response
+from flask.json import JSONEncoder as BaseJSONEncoder
+from werkzeug.http import http_date
+from . import timing
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def format_datetime(dt, fmt):
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    if fmt == 'iso':
+        return dt.isoformat()
+    if fmt == 'epoch':
+        return calendar.timegm(dt.utctimetuple()) + dt.microsecond / 1e6
+    return http_date(dt.utctimetuple())
+
+
+class JSONEncoder(BaseJSONEncoder):
+    datetime_format = 'http'
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return format_datetime(o, self.datetime_format)
+        if isinstance(o, date):
+            return o.isoformat()
+        return super().default(o)
+
+
+class OrjsonEncoder(JSONEncoder):
+    def _option(self):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if self.indent:
+            option |= orjson.OPT_INDENT_2
+        if self.datetime_format == 'iso':
+            option |= orjson.OPT_NAIVE_UTC
+        else:
+            option |= orjson.OPT_PASSTHROUGH_DATETIME
+        return option
+
+    def encode(self, o):
+        return orjson.dumps(o, default=self.default, option=self._option()).decode('utf-8')
+
+    def iterencode(self, o, _one_shot=False):
+        yield self.encode(o)
+
+
+def get_encoder(config):
+    backend = config['JSON_BACKEND']
+    if backend == 'auto':
+        backend = 'orjson' if orjson is not None else 'stdlib'
+    if backend == 'orjson':
+        if orjson is None:
+            raise RuntimeError('JSON_BACKEND is orjson but orjson is not installed')
+        base = OrjsonEncoder
+    elif backend == 'stdlib':
+        base = JSONEncoder
+    else:
+        raise ValueError('unknown JSON_BACKEND %r' % backend)
+
+    def encode(self, o):
+        started = time.perf_counter()
+        try:
+            return base.encode(self, o)
+        finally:
+            timing.add('encode', time.perf_counter() - started)
+
+    return type(base.__name__, (base,), {'datetime_format': config['JSON_DATETIME_FORMAT'],
+                                         'encode': encode})
+
+
+def stream_json(app, fields, key, items, chunk_size=1000):
+    """Stream ``dict(fields, key=items)`` without building the whole document.
+
+    ``items`` is encoded ``chunk_size`` elements at a time, so memory and
+    time to first byte stay flat however long the array is. The fields come
+    in the order the encoder puts them, as ``jsonify`` would.
+    """
+    encoder = app.json_encoder(separators=(',', ':'), sort_keys=app.config['JSON_SORT_KEYS'],
+                               ensure_ascii=app.config['JSON_AS_ASCII'])
+
+    def generate():
+        # the array is spliced in where the encoder placed its key
+        placeholder = uuid.uuid4().hex
+        head, tail = encoder.encode(dict(fields, **{key: placeholder})) \
+            .split(encoder.encode(placeholder), 1)
+        yield head + '['
+        for start in range(0, len(items), chunk_size):
+            chunk = encoder.encode(items[start:start + chunk_size])[1:-1]
+            yield (',' if start else '') + chunk
+        yield ']' + tail + '\n'
+
+    return Response(generate(), mimetype=app.config['JSONIFY_MIMETYPE'])
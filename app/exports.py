@@ -0,0 +1,143 @@
+"""Metric exports built by the job worker into ``EXPORT_DIR``.
+
+An export holds every live metric of an account, or of one vineyard, as
+gzipped CSV or, when pyarrow is installed, as Parquet. Rows are read with
+a server side cursor and written ``EXPORT_CHUNK_SIZE`` at a time, so the
+size of an export never shows up in the worker's memory. Finished files
+are served with ``send_file`` and expire after ``EXPORT_TTL`` seconds.
+"""
+import csv
+import gzip
+import os
+import secrets
+from datetime import datetime, timedelta
+from flask import current_app
+from . import db, jobs
+from .encoders import format_datetime
+from .exceptions import ValidationError
+from .models import Export, Magnitude, Metric, Sensor
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+COLUMNS = ('timestamp', 'value', 'magnitude_id', 'type', 'layer', 'sensor_id', 'vineyard_id')
+
+
+def formats():
+    return ('csv.gz', 'parquet') if pyarrow is not None else ('csv.gz',)
+
+
+def request_export(user_id, vineyard_id=None, format='csv.gz'):
+    """Add an export and the job that builds it to the session; the caller commits."""
+    if format not in formats():
+        raise ValidationError('export format must be one of %s' % ', '.join(formats()))
+    export = Export(format=format, user_id=user_id, vineyard_id=vineyard_id)
+    db.session.add(export)
+    db.session.flush()
+    export.job = jobs.enqueue('export', {'export_id': export.id}, user_id=user_id)
+    return export
+
+
+def path(export):
+    return os.path.join(current_app.config['EXPORT_DIR'], export.filename)
+
+
+def _query(export):
+    metrics, magnitudes, sensors = Metric.__table__, Magnitude.__table__, Sensor.__table__
+    query = db.select([metrics.c.timestamp, metrics.c.value, metrics.c.magnitude_id,
+                       magnitudes.c.type, magnitudes.c.layer, sensors.c.id,
+                       sensors.c.vineyard_id]) \
+        .select_from(metrics.join(magnitudes).join(sensors)) \
+        .where(db.and_(sensors.c.user_id == export.user_id, sensors.c.deleted_at == None,
+                       magnitudes.c.deleted_at == None)) \
+        .order_by(metrics.c.magnitude_id, metrics.c.timestamp)
+    if export.vineyard_id is not None:
+        query = query.where(sensors.c.vineyard_id == export.vineyard_id)
+    return query
+
+
+def _chunks(query, chunk_size):
+    with db.engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(query)
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+
+
+def _write_csv(filename, chunks):
+    with gzip.open(filename, 'wt', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for rows in chunks:
+            writer.writerows((format_datetime(row[0], 'iso'),) + tuple(row[1:]) for row in rows)
+            yield len(rows)
+
+
+def _write_parquet(filename, chunks):
+    schema = pyarrow.schema([
+        ('timestamp', pyarrow.timestamp('us', tz='UTC')), ('value', pyarrow.float64()),
+        ('magnitude_id', pyarrow.int64()), ('type', pyarrow.string()),
+        ('layer', pyarrow.string()), ('sensor_id', pyarrow.int64()),
+        ('vineyard_id', pyarrow.int64())])
+    with pyarrow.parquet.ParquetWriter(filename, schema, compression='snappy') as writer:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(column, type=field.type)
+                 for column, field in zip(columns, schema)], schema=schema))
+            yield len(rows)
+
+
+_WRITERS = {'csv.gz': _write_csv, 'parquet': _write_parquet}
+
+
+def build(export_id, progress):
+    export = Export.query.get(export_id)
+    if export is None or export.status != 'pending':
+        return None
+    query = _query(export)
+    total = db.session.execute(db.select([db.func.count()]).select_from(
+        query.order_by(None).alias())).scalar()
+    directory = current_app.config['EXPORT_DIR']
+    os.makedirs(directory, exist_ok=True)
+    filename = '%d-%s.%s' % (export.id, secrets.token_hex(8), export.format)
+    partial = os.path.join(directory, filename + '.part')
+    done = 0
+    progress('rows', done, total)
+    try:
+        for written in _WRITERS[export.format](
+                partial, _chunks(query, current_app.config['EXPORT_CHUNK_SIZE'])):
+            done += written
+            progress('rows', done, total)
+        os.replace(partial, os.path.join(directory, filename))
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    export.filename = filename
+    export.rows = done
+    export.size = os.path.getsize(os.path.join(directory, filename))
+    export.status = 'ready'
+    export.expires_at = datetime.utcnow() + timedelta(seconds=current_app.config['EXPORT_TTL'])
+    db.session.commit()
+    return {'rows': export.rows, 'size': export.size}
+
+
+def remove(export):
+    if export.filename is not None and os.path.exists(path(export)):
+        os.remove(path(export))
+    export.status = 'expired'
+
+
+def expire(now=None):
+    """Remove the files of the exports past their expiry date."""
+    now = now or datetime.utcnow()
+    expired = Export.query.filter(Export.status == 'ready', Export.expires_at <= now).all()
+    for export in expired:
+        remove(export)
+    db.session.commit()
+    return {'expired': len(expired)}
@@ -1,7 +1,10 @@
+import calendar
+from datetime import datetime
+import numpy as np
 from sqlalchemy.exc import IntegrityError
 from faker import Faker
 from . import db
-from .models import User, Vineyard, Sensor, Magnitude, Metric
+from .models import Role, User, Vineyard, Sensor, Magnitude, Metric
 
 def setup(email='admin@example.com', count=100):
     fake = Faker()
@@ -73,3 +76,133 @@ def generateFakeMetricsForMagnitude(magnitude_id, count=100):
         i += 1
 
 
+# (layer, type) of the magnitudes of every seeded sensor
+SEED_MAGNITUDES = (('Surface', 'Temperature'), ('Surface', 'Humidity'), ('Surface', 'Dew'),
+                   ('Surface', 'Light'), ('Depth 1', 'Temperature'), ('Depth 1', 'Humidity'),
+                   ('Depth 2', 'Temperature'), ('Depth 2', 'Humidity'))
+
+# hours the soil lags behind the surface and the share of the daily swing it keeps
+SOIL_DAMPING = {'Surface': (0, 1.0), 'Depth 1': (3, 0.35), 'Depth 2': (8, 0.1)}
+
+
+def _readings(rng, timestamps, interval, latitude):
+    """Return ``{(layer, type): values}`` of one sensor at ``timestamps`` (epoch seconds)."""
+    count = len(timestamps)
+    hours = timestamps / 3600.0
+    days = hours / 24
+    # coldest around mid January in the north, mid July in the south
+    season = -np.cos(2 * np.pi * (days % 365.25 - 15) / 365.25) * (1 if latitude >= 0 else -1)
+    offset = rng.normal(0, 1)
+    # rain events, about one every six days, wet the soil and dry out in a day or two
+    amounts = np.where(rng.rand(count) < interval / (86400 * 6.0),
+                       rng.uniform(10, 30, count), 0.0)
+    decay = np.exp(-interval / (36 * 3600.0))
+    rain = np.zeros(count)
+    for i in range(count):
+        rain[i] = (rain[i - 1] * decay if i else 0.0) + amounts[i]
+    positions = np.arange(count)
+
+    readings = {}
+    for layer, (lag, damping) in SOIL_DAMPING.items():
+        phase = 2 * np.pi * (hours - 9 - lag) / 24
+        noise = rng.normal(0, 0.4 * damping + 0.05, count)
+        temperature = 15 + offset + 9 * season + 6 * damping * np.sin(phase) + noise
+        wetness = np.interp(positions - lag * 3600.0 / interval, positions, rain) \
+            if count else rain
+        humidity = 55 + 8 * season - 15 * damping * np.sin(phase) + wetness * (1.5 - damping) \
+            + rng.normal(0, 1.5 * damping + 0.2, count)
+        readings[(layer, 'Temperature')] = temperature
+        readings[(layer, 'Humidity')] = np.clip(humidity, 0, 100)
+    surface_temperature = readings[('Surface', 'Temperature')]
+    readings[('Surface', 'Dew')] = surface_temperature - \
+        (100 - readings[('Surface', 'Humidity')]) / 5
+    daylight = np.maximum(0, np.sin(np.pi * (hours % 24 - 6) / 12)) * (60000 + 30000 * season)
+    readings[('Surface', 'Light')] = daylight * rng.uniform(0.3, 1.0, count)
+    return readings
+
+
+def seed(users=1, vineyards=2, sensors=5, days=90, interval=600, end=None, seed=0,
+         chunk_size=50000, progress=None):
+    """Add users with vineyards, sensors and months of plausible readings.
+
+    Readings follow daily and seasonal cycles with noise, rain that soaks
+    into the soil and damped, delayed swings at depth. They are a pure
+    function of ``seed`` and the other arguments, so two databases seeded
+    alike with the same ``end`` hold the same data. Users seeded before are
+    skipped with all their data, so seeding again only adds what is
+    missing. Metrics are written with Core executemany inserts of
+    ``chunk_size`` rows.
+    """
+    rng = np.random.RandomState(seed)
+    end = end or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    first = calendar.timegm(end.utctimetuple()) - days * 86400
+    timestamps = np.arange(first, first + days * 86400, interval, dtype=np.int64)
+
+    writer = Role.query.filter_by(name='Writer').first()
+    emails = ['seed%d-%d@example.com' % (seed, u) for u in range(users)]
+    existing = {e for e, in db.session.query(User.email).filter(User.email.in_(emails))}
+    password_hash = None
+    magnitudes = []
+    for u, email in enumerate(emails):
+        # the random draws of skipped users are made all the same
+        skip = email in existing
+        if not skip:
+            user = User(email=email, confirmed=True, name='Seed User %d' % u, role=writer)
+            if password_hash is None:
+                user.password = 'password'
+                password_hash = user.password_hash
+            user.password_hash = password_hash
+            db.session.add(user)
+            db.session.flush()
+        for v in range(vineyards):
+            if not skip:
+                vineyard = Vineyard(name='Vineyard %d-%d' % (u, v), user_id=user.id)
+                db.session.add(vineyard)
+                db.session.flush()
+            latitude, longitude = rng.uniform(36, 48), rng.uniform(-8, 16)
+            for s in range(sensors):
+                fields = dict(latitude=round(latitude + rng.normal(0, 0.01), 6),
+                              longitude=round(longitude + rng.normal(0, 0.01), 6),
+                              power_perc=rng.randint(20, 101))
+                if skip:
+                    magnitudes.append((None, latitude))
+                    continue
+                sensor = Sensor(description='Seed sensor %d-%d-%d' % (u, v, s),
+                                gateway='gw-%d-%d' % (u, v), expected_interval=interval,
+                                vineyard_id=vineyard.id, user_id=user.id, **fields)
+                if len(timestamps):
+                    sensor.last_seen_at = datetime.utcfromtimestamp(int(timestamps[-1]))
+                    sensor.update_stale_at()
+                db.session.add(sensor)
+                db.session.flush()
+                ids = {}
+                for layer, type in SEED_MAGNITUDES:
+                    magnitude = Magnitude(layer=layer, type=type, sensor_id=sensor.id,
+                                          user_id=user.id)
+                    db.session.add(magnitude)
+                    db.session.flush()
+                    ids[(layer, type)] = magnitude.id
+                magnitudes.append((ids, latitude))
+    db.session.commit()
+
+    seeded = [ids for ids, _ in magnitudes if ids is not None]
+    total = len(seeded) * len(SEED_MAGNITUDES) * len(timestamps)
+    table = Metric.__table__
+    done = 0
+    for ids, latitude in magnitudes:
+        readings = _readings(rng, timestamps.astype(float), interval, latitude)
+        jitter = rng.randint(0, min(interval, 30), len(timestamps))
+        if ids is None:
+            continue
+        times = [datetime.utcfromtimestamp(t) for t in (timestamps + jitter).tolist()]
+        for key, magnitude_id in ids.items():
+            values = np.round(readings[key], 3).tolist()
+            for i in range(0, len(times), chunk_size):
+                db.session.execute(table.insert(), [
+                    {'timestamp': t, 'value': value, 'magnitude_id': magnitude_id}
+                    for t, value in zip(times[i:i + chunk_size], values[i:i + chunk_size])])
+                db.session.commit()
+                done += len(values[i:i + chunk_size])
+        if progress is not None:
+            progress('metrics', done, total)
+    return {'users': users - len(existing), 'sensors': len(seeded), 'metrics': done}
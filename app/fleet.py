@@ -0,0 +1,68 @@
+"""Fleet health: sensors with a low battery or that stopped reporting."""
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import case, func
+from . import db
+from .models import Alert, Sensor, Vineyard
+
+
+def is_stale(now):
+    return Sensor.stale_at < now
+
+
+def is_low_battery():
+    return Sensor.power_perc < current_app.config['LOW_BATTERY_THRESHOLD']
+
+
+def scan_tenant(user_id, now):
+    """Return ``[(vineyard_id, stale, low_battery)]`` counts for one user."""
+    stale, low_battery = is_stale(now), is_low_battery()
+    return db.session.query(
+        Sensor.vineyard_id,
+        func.sum(case([(stale, 1)], else_=0)),
+        func.sum(case([(low_battery, 1)], else_=0))) \
+        .filter(Sensor.user_id == user_id, Sensor.deleted_at == None,
+                db.or_(stale, low_battery)) \
+        .group_by(Sensor.vineyard_id).all()
+
+
+def mark_unseen(now):
+    """Give the sensors without a stale mark one from their creation.
+
+    Sensors get it when they are added, only older ones never reported.
+    """
+    unseen = Sensor.query.filter(Sensor.stale_at == None, Sensor.deleted_at == None).all()
+    for sensor in unseen:
+        sensor.stale_at = (sensor.last_seen_at or sensor.created_at or now) + \
+            Sensor.stale_after(sensor.expected_interval)
+    db.session.commit()
+    return len(unseen)
+
+
+def scan(now=None):
+    """Raise coalesced alerts for every vineyard with stale or low battery sensors."""
+    now = now or datetime.utcnow()
+    mark_unseen(now)
+    counts = {'stale': 0, 'low-battery': 0}
+    tenants = [u for u, in db.session.query(Sensor.user_id).filter(Sensor.deleted_at == None)
+               .distinct()]
+    for user_id in tenants:
+        rows = scan_tenant(user_id, now)
+        if not rows:
+            continue
+        names = dict(db.session.query(Vineyard.id, Vineyard.name)
+                     .filter(Vineyard.id.in_([row[0] for row in rows])))
+        for vineyard_id, stale, low_battery in rows:
+            group_key = 'vineyard:%d' % vineyard_id
+            if stale:
+                Alert.raise_alert('%d sensors in %s stopped reporting'
+                                  % (stale, names.get(vineyard_id)),
+                                  user_id, 'Warning', origin='fleet:stale', group_key=group_key)
+                counts['stale'] += stale
+            if low_battery:
+                Alert.raise_alert('%d sensors in %s have a low battery'
+                                  % (low_battery, names.get(vineyard_id)),
+                                  user_id, 'Info', origin='fleet:low-battery', group_key=group_key)
+                counts['low-battery'] += low_battery
+        db.session.commit()
+    return counts
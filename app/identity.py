@@ -0,0 +1,109 @@
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import event, inspect
+from . import db
+from .cache import TTLCache, channel, mark_stale, on_commit
+from .models import User, Role, Permission
+
+IdentityRecord = namedtuple('IdentityRecord', ['id', 'email', 'permissions', 'confirmed'])
+
+
+class Identity:
+    """Request-scoped stand-in for ``User`` built from a cached record.
+
+    Permission checks are answered from the record; any other attribute
+    loads the ``User`` row on first use and is delegated to it.
+    """
+    __slots__ = ('id', 'email', 'permissions', 'confirmed', '_user')
+
+    is_anonymous = False
+    is_authenticated = True
+
+    def __init__(self, record):
+        self.id, self.email, self.permissions, self.confirmed = record
+        self._user = None
+
+    def can(self, perm):
+        return self.permissions is not None and self.permissions & perm == perm
+
+    def is_administrator(self):
+        return self.can(Permission.ADMIN)
+
+    @property
+    def user(self):
+        if self._user is None:
+            self._user = User.query.get(self.id)
+        return self._user
+
+    def __getattr__(self, name):
+        return getattr(self.user, name)
+
+    def __repr__(self):
+        return '<Identity %r>' % self.email
+
+
+class IdentityCache:
+    def init_app(self, app):
+        app.extensions['identity_cache'] = (
+            TTLCache(app.config['IDENTITY_CACHE_SIZE'], app.config['IDENTITY_CACHE_TTL']),
+            channel(app, 'identity'))
+
+    @property
+    def _state(self):
+        cache, events = current_app.extensions['identity_cache']
+        if events.changed():
+            cache.clear()
+        return cache, events
+
+    def _load(self, cache, criterion):
+        row = db.session.query(User.id, User.email, Role.permissions, User.confirmed) \
+            .outerjoin(Role, User.role_id == Role.id).filter(criterion).first()
+        if row is None:
+            return None
+        record = IdentityRecord(*row)
+        cache.set(('email', record.email), record)
+        cache.set(('id', record.id), record)
+        return record
+
+    def by_email(self, email):
+        cache, _ = self._state
+        record = cache.get(('email', email)) or self._load(cache, User.email == email)
+        return Identity(record) if record is not None else None
+
+    def by_id(self, user_id):
+        cache, _ = self._state
+        record = cache.get(('id', user_id)) or self._load(cache, User.id == user_id)
+        return Identity(record) if record is not None else None
+
+    def invalidate(self):
+        cache, events = current_app.extensions['identity_cache']
+        cache.clear()
+        events.publish()
+
+
+identities = IdentityCache()
+
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[attr].history.has_changes()
+           for attr in ('email', 'role_id', 'role', 'confirmed')):
+        mark_stale(target, 'identity')
+
+
+@event.listens_for(Role, 'after_update')
+def _role_updated(mapper, connection, target):
+    if inspect(target).attrs.permissions.history.has_changes():
+        mark_stale(target, 'identity')
+
+
+@event.listens_for(User, 'after_delete')
+@event.listens_for(Role, 'after_delete')
+def _identity_deleted(mapper, connection, target):
+    mark_stale(target, 'identity')
+
+
+@on_commit('identity')
+def _identities_changed():
+    identities.invalidate()
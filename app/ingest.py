@@ -0,0 +1,111 @@
+from collections import defaultdict
+from datetime import datetime
+from dateutil import parser as dateparser, tz
+from flask import current_app
+from . import db
+from .anomaly import anomalies
+from .cache import TTLCache
+from .exceptions import ValidationError
+from .models import Magnitude, Metric, Sensor
+from .rules import rules
+from .telemetry import telemetry
+
+
+def parse_timestamp(timestamp):
+    if timestamp is None:
+        return datetime.utcnow()
+    if isinstance(timestamp, (int, float)):
+        return datetime.utcfromtimestamp(timestamp)
+    try:
+        parsed = dateparser.parse(timestamp)
+    except (ValueError, OverflowError, TypeError):
+        raise ValidationError('metric has an invalid timestamp')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(tz.tzutc()).replace(tzinfo=None)
+    return parsed
+
+
+def parse_batch(json_metrics):
+    """Validate a list of metric documents into ``(magnitude_id, timestamp, value)`` rows."""
+    if not isinstance(json_metrics, list):
+        raise ValidationError('metrics batch must be a list')
+    rows = []
+    for json_metric in json_metrics:
+        if not isinstance(json_metric, dict):
+            raise ValidationError('metric must be an object')
+        value = json_metric.get('value')
+        if value is None:
+            raise ValidationError('metric does not have a value')
+        magnitude_id = json_metric.get('magnitude_id')
+        if magnitude_id is None:
+            raise ValidationError('metric does not have a magnitude_id')
+        try:
+            rows.append((int(magnitude_id), parse_timestamp(json_metric.get('timestamp')),
+                         float(value)))
+        except (TypeError, ValueError):
+            raise ValidationError('metric has an invalid value or magnitude_id')
+    return rows
+
+
+def _sensors_of(magnitude_ids):
+    cache = current_app.extensions.setdefault('ingest_sensors', TTLCache(maxsize=100000, ttl=300))
+    missing = [m for m in magnitude_ids if cache.get(m) is None]
+    if missing:
+        for magnitude_id, sensor_id, expected_interval in db.session.query(
+                Magnitude.id, Sensor.id, Sensor.expected_interval) \
+                .join(Sensor, Magnitude.sensor_id == Sensor.id) \
+                .filter(Magnitude.id.in_(missing)):
+            cache.set(magnitude_id, (sensor_id, expected_interval))
+    return {m: cache.get(m) for m in magnitude_ids}
+
+
+def touch_sensors(rows):
+    """Move the sensors' last seen and stale marks forward to their newest reading."""
+    latest = defaultdict(lambda: datetime.min)
+    for magnitude_id, timestamp, _ in rows:
+        if timestamp > latest[magnitude_id]:
+            latest[magnitude_id] = timestamp
+    sensors = {}
+    for magnitude_id, sensor in _sensors_of(list(latest)).items():
+        if sensor is not None:
+            sensor_id, expected_interval = sensor
+            timestamp = max(latest[magnitude_id], sensors.get(sensor_id, (datetime.min,))[0])
+            sensors[sensor_id] = (timestamp, timestamp + Sensor.stale_after(expected_interval))
+    if not sensors:
+        return
+    table = Sensor.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.id == db.bindparam('sensor_id'))
+        .where(db.or_(table.c.last_seen_at == None,
+                      table.c.last_seen_at < db.bindparam('last_seen')))
+        .values(last_seen_at=db.bindparam('last_seen'), stale_at=db.bindparam('stale')),
+        [{'sensor_id': sensor_id, 'last_seen': last_seen, 'stale': stale}
+         for sensor_id, (last_seen, stale) in sensors.items()])
+
+
+def process(rows, flags):
+    """Run everything that reacts to freshly stored rows, in the caller's transaction.
+
+    ``flags`` are the rows' anomalies, as returned by ``anomalies.update``.
+    """
+    touch_sensors(rows)
+    rules.evaluate(rows)
+    anomalies.raise_alerts(rows, flags)
+    telemetry.ingested(rows)
+
+
+def ingest(rows):
+    """Store a batch of ``(magnitude_id, timestamp, value)`` rows and process it.
+
+    The rows are inserted with a single executemany. The caller commits.
+    """
+    if not rows:
+        return 0
+    flags = anomalies.update(rows)
+    db.session.execute(Metric.__table__.insert(), [
+        {'magnitude_id': magnitude_id, 'timestamp': timestamp, 'value': value,
+         'anomaly': anomaly}
+        for (magnitude_id, timestamp, value), anomaly in zip(rows, flags)])
+    process(rows, flags)
+    return len(rows)
@@ -0,0 +1,308 @@
+"""Asyncio HTTP server for gateway ingest, run apart from the web API.
+
+Gateways post batches of readings to ``/api/v1/metrics/?token=<api token>``
+and wait for a count, over keep-alive connections that are idle most of
+the time. This server keeps all of them on one event loop, so thousands of
+gateways cost sockets, not workers. Tokens, permissions and batches are
+checked exactly as the API does, with ``api_tokens``, ``identities`` and
+``parse_batch``.
+
+Accepted batches are queued and written by ``INGEST_POOL_SIZE``
+committers. Each one takes everything queued, up to ``INGEST_MAX_BATCH``
+rows, and stores it with one ``ingest`` call and one commit in a thread of
+its own, so the commits of a burst are shared by many requests. A gateway
+gets its ``201`` once its rows are committed. When a group fails, its
+batches are retried one by one so that a bad batch only fails itself.
+Past ``INGEST_MAX_PENDING`` queued rows, new batches are refused with a
+``503`` for the gateway to retry later.
+
+Run it with ``python vifi_ingest.py``, several processes can share a port
+with ``--reuse-port``.
+"""
+import asyncio
+import json
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+from . import db
+from .exceptions import ValidationError
+from .identity import identities
+from .ingest import ingest, parse_batch
+from .models import Permission
+from .telemetry import LATENCY_BUCKETS
+from .tokens import api_tokens
+
+INGEST_PATH = '/api/v1/metrics/'
+
+ENDPOINT = 'ingest.new_metrics'
+
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 401: 'Unauthorized',
+           403: 'Forbidden', 404: 'Not Found', 405: 'Method Not Allowed',
+           411: 'Length Required', 413: 'Payload Too Large', 500: 'Internal Server Error',
+           503: 'Service Unavailable'}
+
+MAX_HEADERS = 100
+
+
+class HTTPError(Exception):
+    def __init__(self, status, error, message=None):
+        super().__init__(message)
+        self.status = status
+        self.body = {'error': error}
+        if message is not None:
+            self.body['message'] = message
+
+
+class IngestServer:
+    def __init__(self, app):
+        self.app = app
+        config = app.config
+        self.pool_size = config['INGEST_POOL_SIZE']
+        self.max_batch = config['INGEST_MAX_BATCH']
+        self.max_pending = config['INGEST_MAX_PENDING']
+        self.max_body = config['INGEST_MAX_BODY']
+        self.commit_delay = config['INGEST_COMMIT_DELAY']
+        self.keepalive = config['INGEST_KEEPALIVE_TIMEOUT']
+        self.executor = ThreadPoolExecutor(self.pool_size)
+        self.auth_executor = ThreadPoolExecutor(2)
+        self.server = None
+        self.queue = None
+        self.committers = []
+        self.idle = set()
+        self.connections = 0
+        self.pending = 0
+        self.groups = 0
+        self.closing = False
+
+    async def start(self, host, port, reuse_port=False):
+        self.queue = asyncio.Queue()
+        self.committers = [asyncio.ensure_future(self._commit_loop())
+                           for _ in range(self.pool_size)]
+        self.server = await asyncio.start_server(self._serve, host, port,
+                                                 reuse_port=reuse_port or None, backlog=1024)
+        return self.server
+
+    async def close(self, timeout=30):
+        """Stop accepting, answer the requests in flight and commit what is queued."""
+        self.closing = True
+        self.server.close()
+        for writer in list(self.idle):
+            writer.close()
+        deadline = time.monotonic() + timeout
+        while self.connections and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        await self.server.wait_closed()
+        for _ in self.committers:
+            self.queue.put_nowait(None)
+        await asyncio.gather(*self.committers)
+        self.executor.shutdown(wait=True)
+        self.auth_executor.shutdown(wait=True)
+
+    def run(self, host, port, reuse_port=False):
+        loop = asyncio.get_event_loop()
+        server = loop.run_until_complete(self.start(host, port, reuse_port))
+        stopping = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stopping.set)
+        self.app.logger.info('Ingesting on %s', ', '.join(
+            '%s:%d' % s.getsockname()[:2] for s in server.sockets))
+        try:
+            loop.run_until_complete(stopping.wait())
+        finally:
+            loop.run_until_complete(self.close())
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        try:
+            while not self.closing:
+                self.idle.add(writer)
+                try:
+                    line = await asyncio.wait_for(reader.readline(), self.keepalive)
+                except (asyncio.TimeoutError, ConnectionError, ValueError):
+                    break
+                finally:
+                    self.idle.discard(writer)
+                if not line:
+                    break
+                started = time.perf_counter()
+                try:
+                    method, target, headers, keep_alive = await asyncio.wait_for(
+                        self._read_head(line, reader), self.keepalive)
+                    body = await asyncio.wait_for(self._read_body(headers, reader),
+                                                  self.keepalive)
+                    status, response = await self._handle(method, target, body)
+                except HTTPError as e:
+                    status, response, keep_alive = e.status, e.body, False
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError,
+                        ValueError):
+                    break
+                keep_alive = keep_alive and not self.closing
+                self._write(writer, status, response, keep_alive)
+                await writer.drain()
+                self._count(status, time.perf_counter() - started)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            self.connections -= 1
+
+    async def _read_head(self, line, reader):
+        try:
+            method, target, version = line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(400, 'bad request', 'malformed request line')
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HTTPError(400, 'bad request', 'too many headers')
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else \
+            connection == 'keep-alive'
+        return method, target, headers, keep_alive
+
+    async def _read_body(self, headers, reader):
+        if 'transfer-encoding' in headers:
+            raise HTTPError(411, 'length required', 'send the body with a Content-Length')
+        try:
+            length = int(headers.get('content-length', '0'))
+        except ValueError:
+            raise HTTPError(400, 'bad request', 'invalid Content-Length')
+        if length > self.max_body:
+            raise HTTPError(413, 'payload too large',
+                            'batches are limited to %d bytes' % self.max_body)
+        return await reader.readexactly(length) if length > 0 else b''
+
+    def _write(self, writer, status, body, keep_alive):
+        content = json.dumps(body, separators=(',', ':')).encode('utf-8')
+        writer.write(('HTTP/1.1 %d %s\r\nContent-Type: application/json\r\n'
+                      'Content-Length: %d\r\nConnection: %s\r\n\r\n' % (
+                          status, REASONS[status], len(content),
+                          'keep-alive' if keep_alive else 'close')).encode('latin-1') + content)
+
+    def _count(self, status, elapsed):
+        registry = self.app.extensions['telemetry']
+        registry.inc('vifi_http_requests_total', {'endpoint': ENDPOINT, 'method': 'POST',
+                                                  'status': status})
+        registry.observe('vifi_http_request_duration_seconds', {'endpoint': ENDPOINT},
+                         (elapsed,), LATENCY_BUCKETS)
+
+    async def _handle(self, method, target, body):
+        url = urlsplit(target)
+        if url.path != INGEST_PATH:
+            return 404, {'error': 'not_found', 'message': 'only %s is served here' % INGEST_PATH}
+        if method != 'POST':
+            return 405, {'error': 'method not allowed'}
+        token = parse_qs(url.query).get('token', [None])[0]
+        if not token:
+            return 401, {'error': 'unauthorized', 'message': 'Invalid credentials'}
+        loop = asyncio.get_event_loop()
+        status = await loop.run_in_executor(self.auth_executor, self._authenticate, token)
+        if status == 401:
+            return 401, {'error': 'unauthorized', 'message': 'Invalid credentials'}
+        if status == 403:
+            return 403, {'error': 'forbidden', 'message': 'Insufficient permissions'}
+        try:
+            json_metrics = json.loads(body.decode('utf-8'))
+            rows = parse_batch(json_metrics if isinstance(json_metrics, list)
+                               else [json_metrics])
+        except ValidationError as e:
+            return 400, {'error': 'bad request', 'message': e.args[0]}
+        except ValueError:
+            return 400, {'error': 'bad request', 'message': 'invalid JSON'}
+        if not rows:
+            return 201, {'count': 0}
+        if self.pending + len(rows) > self.max_pending:
+            return 503, {'error': 'service unavailable', 'message': 'ingest queue is full'}
+        future = loop.create_future()
+        self.pending += len(rows)
+        self.queue.put_nowait((rows, future))
+        try:
+            count = await future
+        except Exception:
+            return 500, {'error': 'internal server error'}
+        return 201, {'count': count}
+
+    def _authenticate(self, token):
+        with self.app.app_context():
+            user_id, _ = api_tokens.verify(token)
+            user = identities.by_id(user_id) if user_id is not None else None
+            if not user:
+                return 401
+            if not user.can(Permission.WRITE):
+                return 403
+            return 200
+
+    async def _commit_loop(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            if self.commit_delay and self.queue.empty():
+                # a moment for the rest of a burst to join the group
+                await asyncio.sleep(self.commit_delay)
+            group, rows, stop = [item], len(item[0]), False
+            while rows < self.max_batch and not self.queue.empty():
+                item = self.queue.get_nowait()
+                if item is None:
+                    stop = True
+                    break
+                group.append(item)
+                rows += len(item[0])
+            self.groups += 1
+            try:
+                results = await loop.run_in_executor(self.executor, self._commit,
+                                                     [batch for batch, _ in group])
+            except Exception as e:
+                results = [e] * len(group)
+            self.pending -= rows
+            for (_, future), result in zip(group, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            if stop:
+                return
+
+    def _commit(self, batches):
+        with self.app.app_context():
+            results = self._store(batches)
+            self._flush_telemetry()
+            return results
+
+    def _store(self, batches):
+        """Store ``batches`` in one transaction, or one by one if that fails."""
+        try:
+            ingest([row for batch in batches for row in batch])
+            db.session.commit()
+            return [len(batch) for batch in batches]
+        except Exception as e:
+            db.session.rollback()
+            if len(batches) == 1:
+                self.app.logger.exception('Ingest of %d rows failed', len(batches[0]))
+                return [e]
+        results = []
+        for batch in batches:
+            try:
+                results.append(ingest(batch))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.exception('Ingest of %d rows failed', len(batch))
+                results.append(e)
+        return results
+
+    def _flush_telemetry(self):
+        registry = self.app.extensions['telemetry']
+        if time.monotonic() - registry.flushed_at >= self.app.config['TELEMETRY_FLUSH_INTERVAL']:
+            registry.flush(self.app.config['TELEMETRY_DIR'])
@@ -0,0 +1,290 @@
+"""Background jobs stored in the ``jobs`` table.
+
+Handlers are registered with :func:`job` and queued with :func:`enqueue`.
+``flask worker`` claims due jobs in priority order and runs them in a
+process pool, never running more than ``JOB_CONCURRENCY[type]`` jobs of
+one type at a time across all workers: claims of one type lock that
+type's jobs, so workers claim them one after the other. A handler that
+raises is retried with exponential backoff until it has used
+``max_attempts``. Claims are leases renewed by the worker while the job
+runs, so the jobs of a worker that dies are picked up again once
+``JOB_LEASE`` seconds have passed, or marked failed if that lease was
+their last attempt.
+"""
+import json
+import signal
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from . import db
+from .models import Job
+
+Handler = namedtuple('Handler', ['func', 'concurrency', 'max_attempts'])
+
+handlers = {}
+
+
+def job(type, concurrency=1, max_attempts=3):
+    """Register ``func(progress, **args)`` as the handler of ``type`` jobs.
+
+    ``progress(stage, done, total)`` may be called any number of times;
+    the return value must be JSON serializable and is stored as the result.
+    """
+    def decorator(f):
+        handlers[type] = Handler(f, concurrency, max_attempts)
+        return f
+    return decorator
+
+
+def enqueue(type, args=None, priority=0, user_id=None, run_at=None, unique=False):
+    """Add a job to the session; the caller commits.
+
+    With ``unique`` an already queued job of the same type and arguments
+    is returned instead of adding another one.
+    """
+    if type not in handlers:
+        raise ValueError('unknown job type %r' % type)
+    args = json.dumps(args or {}, sort_keys=True)
+    if unique:
+        queued = Job.query.filter_by(type=type, args=args, status='queued').first()
+        if queued is not None:
+            return queued
+    new_job = Job(type=type, args=args, priority=priority, user_id=user_id,
+                  max_attempts=handlers[type].max_attempts,
+                  run_at=run_at or datetime.utcnow())
+    db.session.add(new_job)
+    return new_job
+
+
+def _update(job_id, **values):
+    # outside the session: handlers commit and roll back on their own
+    with db.engine.begin() as connection:
+        connection.execute(Job.__table__.update().where(Job.__table__.c.id == job_id)
+                           .values(**values))
+
+
+class _Progress:
+    def __init__(self, job_id, interval=1.0):
+        self.job_id = job_id
+        self.interval = interval
+        self.reported_at = 0
+
+    def __call__(self, stage, done, total):
+        now = time.monotonic()
+        if done == total or now - self.reported_at >= self.interval:
+            _update(self.job_id, stage=stage, done=done, total=total)
+            self.reported_at = now
+
+
+def fail(job_id, error):
+    """Record a failed attempt, queueing the job again if it has attempts left."""
+    attempts, max_attempts = db.session.query(Job.attempts, Job.max_attempts) \
+        .filter(Job.id == job_id).one()
+    now = datetime.utcnow()
+    if attempts < max_attempts:
+        delay = current_app.config['JOB_RETRY_DELAY'] * 2 ** (attempts - 1)
+        _update(job_id, status='queued', error=error, locked_until=None,
+                run_at=now + timedelta(seconds=delay))
+    else:
+        _update(job_id, status='failed', error=error, locked_until=None, finished_at=now)
+
+
+def execute(job_id):
+    """Run a claimed job in the current app context and record the outcome."""
+    claimed = Job.query.get(job_id)
+    handler = handlers.get(claimed.type)
+    args = json.loads(claimed.args or '{}')
+    db.session.commit()
+    try:
+        if handler is None:
+            raise LookupError('no handler for %r jobs' % claimed.type)
+        result = handler.func(_Progress(job_id), **args)
+    except Exception:
+        db.session.rollback()
+        fail(job_id, traceback.format_exc())
+        return False
+    _update(job_id, status='done', result=json.dumps(result), error=None, locked_until=None,
+            finished_at=datetime.utcnow())
+    return True
+
+
+_app = None
+
+
+def _init_process(config_name):
+    global _app
+    from . import create_app
+    # the parent decides when to stop, after the running jobs finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _app = create_app(config_name)
+
+
+def _run(job_id):
+    with _app.app_context():
+        return execute(job_id)
+
+
+class Worker:
+    def __init__(self, config_name, workers=None, executor=None):
+        self.config_name = config_name
+        self.workers = workers or current_app.config['JOB_WORKERS']
+        self.executor = executor or self._make_executor()
+        self.running = {}
+        self.stopping = False
+
+    def _make_executor(self):
+        return ProcessPoolExecutor(self.workers, initializer=_init_process,
+                                   initargs=(self.config_name,))
+
+    def _due(self, now):
+        return db.or_(db.and_(Job.status == 'queued', Job.run_at <= now),
+                      db.and_(Job.status == 'running', Job.locked_until < now,
+                              Job.attempts < Job.max_attempts))
+
+    def _busy(self, now):
+        return dict(db.session.query(Job.type, func.count(Job.id))
+                    .filter(Job.status == 'running', Job.locked_until >= now)
+                    .group_by(Job.type))
+
+    def _running(self, type, now):
+        """Count the running jobs of ``type``, holding their claims until the commit.
+
+        Locking every queued and running job of the type makes the claims of
+        one type wait for each other across workers, so the count stays true
+        until the claim is committed.
+        """
+        jobs = db.session.query(Job.status, Job.locked_until) \
+            .filter(Job.type == type, Job.status.in_(('queued', 'running'))) \
+            .with_for_update().all()
+        return sum(1 for status, locked_until in jobs
+                   if status == 'running' and locked_until >= now)
+
+    def expire(self, now):
+        """Fail the jobs whose lease expired on their last attempt."""
+        Job.query.filter(Job.status == 'running', Job.locked_until < now,
+                         Job.attempts >= Job.max_attempts) \
+            .update({'status': 'failed', 'error': 'lease expired on the last attempt',
+                     'locked_until': None, 'finished_at': now}, synchronize_session=False)
+        db.session.commit()
+
+    def schedule(self, now):
+        """Queue the periodic jobs of ``JOB_SCHEDULE`` that are due."""
+        schedule = current_app.config['JOB_SCHEDULE']
+        if not schedule:
+            return
+        latest = dict(db.session.query(Job.type, func.max(Job.created_at))
+                      .filter(Job.type.in_(list(schedule))).group_by(Job.type))
+        for type, interval in schedule.items():
+            if latest.get(type) is None or latest[type] <= now - timedelta(seconds=interval):
+                enqueue(type, unique=True)
+        db.session.commit()
+
+    def renew(self, now):
+        if self.running:
+            lease = timedelta(seconds=current_app.config['JOB_LEASE'])
+            Job.query.filter(Job.id.in_(list(self.running))) \
+                .update({'locked_until': now + lease}, synchronize_session=False)
+            db.session.commit()
+
+    def reap(self):
+        broken = False
+        for job_id, (future, _) in list(self.running.items()):
+            if not future.done():
+                continue
+            del self.running[job_id]
+            error = future.exception()
+            if error is not None:
+                broken = broken or isinstance(error, BrokenProcessPool)
+                fail(job_id, repr(error))
+        if broken:
+            self.executor = self._make_executor()
+
+    def dispatch(self, now):
+        """Claim due jobs for the free worker slots and submit them."""
+        free = self.workers - len(self.running)
+        if free <= 0:
+            return []
+        limits = current_app.config['JOB_CONCURRENCY']
+        busy = self._busy(now)
+        lease = timedelta(seconds=current_app.config['JOB_LEASE'])
+        claimed = []
+        for job_id, type in db.session.query(Job.id, Job.type).filter(self._due(now)) \
+                .order_by(Job.priority.desc(), Job.run_at, Job.id).limit(free * 10):
+            handler = handlers.get(type)
+            limit = limits.get(type, handler.concurrency if handler else 1)
+            if busy.get(type, 0) >= limit:
+                continue
+            busy[type] = self._running(type, now)
+            if busy[type] >= limit or \
+                    not Job.query.filter(Job.id == job_id, self._due(now)) \
+                    .update({'status': 'running', 'attempts': Job.attempts + 1,
+                             'locked_until': now + lease, 'started_at': now},
+                            synchronize_session=False):
+                db.session.commit()
+                continue
+            db.session.commit()
+            busy[type] += 1
+            self.running[job_id] = (self.executor.submit(_run, job_id), type)
+            claimed.append(job_id)
+            if len(claimed) == free:
+                break
+        db.session.commit()
+        return claimed
+
+    def run_once(self):
+        now = datetime.utcnow()
+        self.reap()
+        self.renew(now)
+        self.expire(now)
+        self.schedule(now)
+        return self.dispatch(now)
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def run(self):
+        poll = current_app.config['JOB_POLL_INTERVAL']
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        try:
+            while not self.stopping:
+                if not self.run_once():
+                    time.sleep(poll)
+        finally:
+            self.executor.shutdown(wait=True)
+            self.reap()
+
+
+@job('purge')
+def _purge(progress, chunk_size=None):
+    from .purge import purge_deleted
+    return purge_deleted(chunk_size, progress)
+
+
+@job('fleet_scan')
+def _fleet_scan(progress):
+    from .fleet import scan
+    return scan()
+
+
+@job('export', concurrency=2)
+def _export(progress, export_id):
+    from .exports import build
+    return build(export_id, progress)
+
+
+@job('export_expiry')
+def _export_expiry(progress):
+    from .exports import expire
+    return expire()
+
+
+@job('risk_update')
+def _risk_update(progress):
+    from .risk import refresh_all
+    return refresh_all(progress)
@@ -1,7 +1,6 @@
 from flask import render_template, redirect, url_for, abort, flash, request,\
     current_app, make_response, send_from_directory
 from flask_login import login_required, current_user
-from flask_sqlalchemy import get_debug_queries
 from . import main
 from .. import db
 from ..models import Permission, Role, User
@@ -9,17 +8,6 @@ from ..decorators import admin_required, permission_required
 import os
 
 
-@main.after_app_request
-def after_request(response):
-    for query in get_debug_queries():
-        if query.duration >= current_app.config['SLOW_DB_QUERY_TIME']:
-            current_app.logger.warning(
-                'Slow query: %s\nParameters: %s\nDuration: %fs\nContext: %s\n'
-                % (query.statement, query.parameters, query.duration,
-                   query.context))
-    return response
-
-
 @main.route('/shutdown')
 def server_shutdown():
     if not current_app.testing:
@@ -1,10 +1,12 @@
-from datetime import datetime
+import json
+from datetime import datetime, timedelta
+from functools import lru_cache
 from werkzeug.security import generate_password_hash, check_password_hash
 from itsdangerous import JSONWebSignatureSerializer, TimedJSONWebSignatureSerializer as Serializer
 from flask import current_app, url_for
 from flask_login import UserMixin, AnonymousUserMixin
 from app.exceptions import ValidationError
-from sqlalchemy import Index, desc
+from sqlalchemy import Index, desc, event
 from . import db
 
 
@@ -13,6 +15,15 @@ class Permission:
     WRITE = 2
     ADMIN = 4 
 
+
+class SoftDeleteMixin:
+    deleted_at = db.Column(db.DateTime, index=True)
+
+    @classmethod
+    def alive(cls):
+        return cls.query.filter(cls.deleted_at == None)
+
+
 class Alert(db.Model):
     __tablename__ = 'alerts'
     id = db.Column(db.Integer, primary_key=True)
@@ -20,10 +31,39 @@ class Alert(db.Model):
     acknowledged = db.Column(db.Boolean, nullable=False)
     priority = db.Column(db.Enum('Info', 'Warning', 'Danger'))
     origin = db.Column(db.Text)
+    group_key = db.Column(db.String(128))
+    occurrences = db.Column(db.Integer, nullable=False, default=1)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow(), onupdate=datetime.utcnow())
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
 
+    Index('idx_alert_coalesce', user_id, origin, priority, group_key, updated_at)
+
+    @staticmethod
+    def raise_alert(content, user_id, priority, origin=None, group_key=None, window=None):
+        """Add an alert, or fold it into the matching open alert of the last ``window`` seconds.
+
+        Alerts match on user, origin, priority and group key; the folded
+        alert keeps its content and gets its occurrence counter bumped.
+        """
+        if window is None:
+            window = current_app.config['ALERT_COALESCE_WINDOW']
+        now = datetime.utcnow()
+        if window:
+            alert = Alert.query.filter_by(user_id=user_id, origin=origin, priority=priority,
+                                          group_key=group_key, acknowledged=False) \
+                .filter(Alert.updated_at >= now - timedelta(seconds=window)) \
+                .order_by(Alert.updated_at.desc()).first()
+            if alert is not None:
+                alert.occurrences = Alert.occurrences + 1
+                alert.updated_at = now
+                db.session.add(alert)
+                return alert
+        alert = Alert(content=content, user_id=user_id, priority=priority, origin=origin,
+                      group_key=group_key, acknowledged=False, created_at=now, updated_at=now)
+        db.session.add(alert)
+        return alert
+
     def to_json(self):
         json_alert = {
             'id': self.id,
@@ -31,6 +71,8 @@ class Alert(db.Model):
             'content': self.content,
             'priority': self.priority,
             'origin': self.origin,
+            'group': self.group_key,
+            'occurrences': self.occurrences,
             'created_at': self.created_at,
             'updated_at': self.updated_at,
             'user_id': self.user_id,
@@ -49,25 +91,120 @@ class Alert(db.Model):
         if priority is None:
             raise ValidationError('alert does not have a priority')
         origin = json_alert.get('origin', None)
+        group_key = json_alert.get('group', None)
         return Alert(content=content, user_id=user_id, priority=priority, origin=origin,
-                acknowledged=False)
+                group_key=group_key, acknowledged=False)
 
     def __repr__(self):
         return '<Alert (%r)>' % self.content
 
 
+class AlertRule(db.Model):
+    __tablename__ = 'alert_rules'
+    EDITABLE = ('value', 'duration', 'priority', 'content', 'enabled', 'layer', 'type')
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.Enum('threshold', 'rate', 'duration', name='alert_rule_kind'),
+                     nullable=False)
+    comparison = db.Column(db.Enum('above', 'below', name='alert_rule_comparison'),
+                           nullable=False)
+    value = db.Column(db.Float, nullable=False)
+    duration = db.Column(db.Integer)
+    priority = db.Column(db.Enum('Info', 'Warning', 'Danger', name='alert_priority'),
+                         nullable=False)
+    content = db.Column(db.Text)
+    enabled = db.Column(db.Boolean, nullable=False, default=True)
+    magnitude_id = db.Column(db.Integer, db.ForeignKey('magnitudes.id'), index=True)
+    # scope of the account wide rules, those without a magnitude
+    layer = db.Column(db.String(16))
+    type = db.Column(db.String(16))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_json(self):
+        json_alert_rule = {
+            'id': self.id,
+            'kind': self.kind,
+            'comparison': self.comparison,
+            'value': self.value,
+            'duration': self.duration,
+            'priority': self.priority,
+            'content': self.content,
+            'enabled': self.enabled,
+            'magnitude_id': self.magnitude_id,
+            'layer': self.layer,
+            'type': self.type,
+            'url': url_for('api.get_alert_rule', id=self.id),
+            'created_at': self.created_at,
+        }
+        return json_alert_rule
+
+    @staticmethod
+    def from_json(json_alert_rule):
+        kind = json_alert_rule.get('kind')
+        if kind not in ('threshold', 'rate', 'duration'):
+            raise ValidationError('alert rule kind must be threshold, rate or duration')
+        comparison = json_alert_rule.get('comparison')
+        if comparison not in ('above', 'below'):
+            raise ValidationError('alert rule comparison must be above or below')
+        value = json_alert_rule.get('value')
+        if value is None:
+            raise ValidationError('alert rule does not have a value')
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValidationError('alert rule value must be a number')
+        duration = json_alert_rule.get('duration')
+        if kind == 'duration' and duration is None:
+            raise ValidationError('duration alert rule does not have a duration')
+        priority = json_alert_rule.get('priority', 'Warning')
+        if priority not in ('Info', 'Warning', 'Danger'):
+            raise ValidationError('alert rule priority must be Info, Warning or Danger')
+        enabled = json_alert_rule.get('enabled', True)
+        if not isinstance(enabled, bool):
+            raise ValidationError('alert rule enabled must be true or false')
+        magnitude_id = json_alert_rule.get('magnitude_id')
+        layer, type = json_alert_rule.get('layer'), json_alert_rule.get('type')
+        if magnitude_id is not None:
+            layer = type = None
+        elif type not in Magnitude.type.type.enums:
+            raise ValidationError('alert rule without a magnitude_id must have a magnitude type')
+        elif layer is not None and layer not in Magnitude.layer.type.enums:
+            raise ValidationError('alert rule layer must be a magnitude layer')
+        user_id = json_alert_rule.get('user_id')
+        if user_id is None:
+            raise ValidationError('alert rule does not have a user_id')
+        return AlertRule(kind=kind, comparison=comparison, value=value, duration=duration,
+                         priority=priority, content=json_alert_rule.get('content'),
+                         magnitude_id=magnitude_id, layer=layer, type=type, user_id=user_id,
+                         enabled=enabled)
+
+    def edit(self, json_alert_rule):
+        """Apply the editable fields of ``json_alert_rule``, validated as on creation."""
+        fields = {name: getattr(self, name) for name in (
+            'kind', 'comparison', 'value', 'duration', 'priority', 'content', 'enabled',
+            'magnitude_id', 'layer', 'type', 'user_id')}
+        fields.update((name, json_alert_rule[name]) for name in self.EDITABLE
+                      if name in json_alert_rule)
+        edited = AlertRule.from_json(fields)
+        for name in self.EDITABLE:
+            setattr(self, name, getattr(edited, name))
+
+    def __repr__(self):
+        return '<AlertRule (%r %r %r)>' % (self.kind, self.comparison, self.value)
+
+
 class Metric(db.Model):
     __tablename__ = 'metrics'
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     value = db.Column(db.Float, nullable=False)
     magnitude_id = db.Column(db.Integer, db.ForeignKey('magnitudes.id'), nullable=False, index=True)
+    anomaly = db.Column(db.String(16))
 
     def to_json(self):
         json_metric = {
             'id': self.id,
             'timestamp': self.timestamp,
             'value': str(self.value),
+            'anomaly': self.anomaly,
             'magnitude_url': url_for('api.get_magnitude', id=self.magnitude_id)
         }
         return json_metric
@@ -87,7 +224,37 @@ class Metric(db.Model):
         return '<Metric (%r, %r)>' % (self.timestamp, self.value)
 
 
-class Magnitude(db.Model):
+class AlertRuleState(db.Model):
+    __tablename__ = 'alert_rule_states'
+    rule_id = db.Column(db.Integer, db.ForeignKey('alert_rules.id'), primary_key=True)
+    magnitude_id = db.Column(db.Integer, db.ForeignKey('magnitudes.id'), primary_key=True)
+    # the rule definition the state was computed for
+    signature = db.Column(db.String(128), nullable=False)
+    last_timestamp = db.Column(db.DateTime, nullable=False)
+    last_value = db.Column(db.Float, nullable=False)
+    since = db.Column(db.DateTime)
+    notified = db.Column(db.Boolean, nullable=False)
+
+    def __repr__(self):
+        return '<AlertRuleState %r %r>' % (self.rule_id, self.magnitude_id)
+
+
+class MagnitudeStats(db.Model):
+    __tablename__ = 'magnitude_stats'
+    magnitude_id = db.Column(db.Integer, db.ForeignKey('magnitudes.id'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+    mean = db.Column(db.Float, nullable=False)
+    variance = db.Column(db.Float, nullable=False)
+    last_value = db.Column(db.Float)
+    last_timestamp = db.Column(db.DateTime)
+    flat = db.Column(db.Integer, nullable=False)
+    outliers = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return '<MagnitudeStats %r>' % self.magnitude_id
+
+
+class Magnitude(SoftDeleteMixin, db.Model):
     __tablename__ = 'magnitudes'
     id = db.Column(db.Integer, primary_key=True)
     layer = db.Column(db.Enum('Surface', 'Depth 1', 'Depth 2'), nullable=False, index=True)
@@ -99,6 +266,10 @@ class Magnitude(db.Model):
 
     Index('idx_user_layer_type', user_id, layer, type)
 
+    def soft_delete(self):
+        self.deleted_at = datetime.utcnow()
+        db.session.add(self)
+
     def to_json(self):
         json_magnitude = {
             'id': self.id,
@@ -133,7 +304,7 @@ class Magnitude(db.Model):
         return '<Magnitude (%r - %r)>' % (self.layer, self.type)
 
 
-class Sensor(db.Model):
+class Sensor(SoftDeleteMixin, db.Model):
     __tablename__ = 'sensors'
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String)
@@ -141,24 +312,57 @@ class Sensor(db.Model):
     longitude = db.Column(db.Float)
     gateway = db.Column(db.String(256))
     power_perc = db.Column(db.Float)
+    expected_interval = db.Column(db.Integer)
+    last_seen_at = db.Column(db.DateTime)
+    stale_at = db.Column(db.DateTime)
     magnitudes = db.relationship('Magnitude', backref='sensor', lazy='dynamic')
     vineyard_id = db.Column(db.Integer, db.ForeignKey('vineyards.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    Index('idx_sensor_user_stale', user_id, stale_at)
+
+    @staticmethod
+    def stale_after(expected_interval):
+        interval = expected_interval or current_app.config['SENSOR_EXPECTED_INTERVAL']
+        return timedelta(seconds=interval * current_app.config['SENSOR_STALE_FACTOR'])
+
+    def update_stale_at(self):
+        # a sensor that never reported is stale once its first interval has passed
+        seen = self.last_seen_at or self.created_at or datetime.utcnow()
+        self.stale_at = seen + Sensor.stale_after(self.expected_interval)
+
+    def soft_delete(self):
+        self.deleted_at = datetime.utcnow()
+        db.session.add(self)
+        Magnitude.query.filter(Magnitude.sensor_id == self.id, Magnitude.deleted_at == None) \
+            .update({'deleted_at': self.deleted_at}, synchronize_session=False)
+
     def last_metrics(self):
+        latest = db.session.query(Metric.magnitude_id,
+                                  db.func.max(Metric.timestamp).label('timestamp')) \
+            .join(Magnitude, Magnitude.id == Metric.magnitude_id) \
+            .filter(Magnitude.sensor_id == self.id, Magnitude.deleted_at == None) \
+            .group_by(Metric.magnitude_id).subquery()
+        rows = db.session.query(Magnitude.id, Metric.timestamp, Metric.value) \
+            .outerjoin(latest, latest.c.magnitude_id == Magnitude.id) \
+            .outerjoin(Metric, db.and_(Metric.magnitude_id == Magnitude.id,
+                                       Metric.timestamp == latest.c.timestamp)) \
+            .filter(Magnitude.sensor_id == self.id, Magnitude.deleted_at == None) \
+            .order_by(Magnitude.id, desc(Metric.id))
         ret = []
-        for magnitude in self.magnitudes:
-            last_metric = magnitude.metrics.order_by(desc(Metric.timestamp)).limit(1).first()
-            ret.append({
-                'magnitude_id': magnitude.id,
-                'timestamp': last_metric.timestamp,
-                'value': last_metric.value
-            })
+        for magnitude_id, timestamp, value in rows:
+            # metrics sharing the latest timestamp: keep the last inserted
+            if not ret or ret[-1]['magnitude_id'] != magnitude_id:
+                ret.append({
+                    'magnitude_id': magnitude_id,
+                    'timestamp': timestamp,
+                    'value': value
+                })
         return ret
 
     def to_json(self):
-        magnitudes_json = [m.to_json() for m in self.magnitudes.all()]
+        magnitudes_json = [m.to_json() for m in self.magnitudes.filter(Magnitude.deleted_at == None)]
         json_sensor = {
             'id': self.id,
             'description': self.description,
@@ -198,16 +402,26 @@ class Sensor(db.Model):
         user_id = json_sensor.get('user_id')
         if user_id is None:
             raise ValidationError('sensor does not have a user_id')
+        expected_interval = json_sensor.get('expected_interval')
         return Sensor(description=description,
                       latitude=latitude,
                       longitude=longitude,
                       gateway=gateway,
                       power_perc=power_perc,
+                      expected_interval=expected_interval,
                       vineyard_id=vineyard_id,
                       user_id=user_id)
 
 
-class Vineyard(db.Model):
+@event.listens_for(Sensor, 'before_insert')
+def _sensor_inserted(mapper, connection, target):
+    if target.created_at is None:
+        target.created_at = datetime.utcnow()
+    if target.stale_at is None:
+        target.update_stale_at()
+
+
+class Vineyard(SoftDeleteMixin, db.Model):
     __tablename__ = 'vineyards'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -215,11 +429,20 @@ class Vineyard(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    def soft_delete(self):
+        self.deleted_at = datetime.utcnow()
+        db.session.add(self)
+        sensor_ids = db.session.query(Sensor.id).filter(Sensor.vineyard_id == self.id)
+        Magnitude.query.filter(Magnitude.sensor_id.in_(sensor_ids), Magnitude.deleted_at == None) \
+            .update({'deleted_at': self.deleted_at}, synchronize_session=False)
+        Sensor.query.filter(Sensor.vineyard_id == self.id, Sensor.deleted_at == None) \
+            .update({'deleted_at': self.deleted_at}, synchronize_session=False)
+
     def to_json(self):
         json_vineyard = {
             'id': self.id,
             'name': self.name,
-            'sensors': [s.to_json() for s in self.sensors.all()],
+            'sensors': [s.to_json() for s in self.sensors.filter(Sensor.deleted_at == None)],
             'url': url_for('api.get_vineyard', id=self.id),
             'user_url': url_for('api.get_user', id=self.user_id),
             'sensors_url': url_for('api.get_vineyard_sensors', id=self.id),
@@ -238,6 +461,134 @@ class Vineyard(db.Model):
         return Vineyard(name=name, user_id=user_id)
 
 
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.String(64), nullable=False)
+    args = db.Column(db.Text)
+    priority = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.Enum('queued', 'running', 'done', 'failed', name='job_status'),
+                       nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=1)
+    stage = db.Column(db.String(64))
+    done = db.Column(db.Integer)
+    total = db.Column(db.Integer)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = db.Column(db.DateTime)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    Index('idx_job_queue', status, run_at)
+    Index('idx_job_type_created', type, created_at)
+
+    def to_json(self):
+        json_job = {
+            'id': self.id,
+            'type': self.type,
+            'args': json.loads(self.args) if self.args else {},
+            'priority': self.priority,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'progress': {'stage': self.stage, 'done': self.done, 'total': self.total},
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'url': url_for('api.get_job', id=self.id),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+        return json_job
+
+    def __repr__(self):
+        return '<Job %r %r>' % (self.type, self.status)
+
+
+class Export(db.Model):
+    __tablename__ = 'exports'
+    id = db.Column(db.Integer, primary_key=True)
+    format = db.Column(db.Enum('csv.gz', 'parquet', name='export_format'), nullable=False)
+    status = db.Column(db.Enum('pending', 'ready', 'expired', name='export_status'),
+                       nullable=False, default='pending')
+    filename = db.Column(db.String(128))
+    rows = db.Column(db.Integer)
+    size = db.Column(db.Integer)
+    vineyard_id = db.Column(db.Integer, db.ForeignKey('vineyards.id'))
+    job_id = db.Column(db.Integer, db.ForeignKey('jobs.id'))
+    job = db.relationship('Job')
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, index=True)
+
+    def to_json(self):
+        status = self.status
+        if status == 'pending' and self.job is not None and self.job.status == 'failed':
+            status = 'failed'
+        json_export = {
+            'id': self.id,
+            'format': self.format,
+            'status': status,
+            'rows': self.rows,
+            'size': self.size,
+            'url': url_for('api.get_export', id=self.id),
+            'download_url': url_for('api.download_export', id=self.id)
+                if status == 'ready' else None,
+            'job_url': url_for('api.get_job', id=self.job_id) if self.job_id else None,
+            'vineyard_url': url_for('api.get_vineyard', id=self.vineyard_id)
+                if self.vineyard_id else None,
+            'created_at': self.created_at,
+            'expires_at': self.expires_at
+        }
+        return json_export
+
+    def __repr__(self):
+        return '<Export %r %r>' % (self.format, self.status)
+
+
+class DailyTemperature(db.Model):
+    __tablename__ = 'daily_temperatures'
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    tmin = db.Column(db.Float, nullable=False)
+    tmax = db.Column(db.Float, nullable=False)
+    samples = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return '<DailyTemperature %r %r>' % (self.sensor_id, self.day)
+
+
+class RiskHour(db.Model):
+    __tablename__ = 'risk_hours'
+    vineyard_id = db.Column(db.Integer, db.ForeignKey('vineyards.id'), primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True)
+    temperature = db.Column(db.Float)
+    humidity = db.Column(db.Float)
+    dew_point = db.Column(db.Float)
+    wet = db.Column(db.Boolean, nullable=False)
+    mildew = db.Column(db.Float)
+    botrytis = db.Column(db.Float)
+
+    def to_json(self):
+        json_risk_hour = {
+            'hour': self.hour,
+            'temperature': self.temperature,
+            'humidity': self.humidity,
+            'dew_point': self.dew_point,
+            'wet': self.wet,
+            'mildew': self.mildew,
+            'botrytis': self.botrytis
+        }
+        return json_risk_hour
+
+    def __repr__(self):
+        return '<RiskHour %r %r>' % (self.vineyard_id, self.hour)
+
+
 class Role(db.Model):
     __tablename__ = 'roles'
     id = db.Column(db.Integer, primary_key=True)
@@ -289,6 +640,12 @@ class Role(db.Model):
         return '<Role %r>' % self.name
 
 
+@lru_cache(maxsize=4096)
+def _sign_api_token(secret_key, user_id, timestamp):
+    s = JSONWebSignatureSerializer(secret_key)
+    return s.dumps({'id': user_id, 'timestamp': timestamp}).decode('utf-8')
+
+
 class ApiToken(db.Model):
     __tablename__ = 'api_tokens'
     id = db.Column(db.Integer, primary_key=True)
@@ -299,14 +656,15 @@ class ApiToken(db.Model):
 
     @property
     def token(self):
-        s = JSONWebSignatureSerializer(current_app.config['SECRET_KEY'])
-        return s.dumps({'id': self.user_id, 'timestamp': str(self.timestamp)}).decode('utf-8')
+        return _sign_api_token(current_app.config['SECRET_KEY'], self.user_id,
+                               str(self.timestamp))
 
     def to_json(self):
         json_api_token = {
             'id': self.id,
             'description': self.description,
             'token': self.token,
+            'enabled': self.enabled,
             'timestamp': self.timestamp,
             'url': url_for('api.get_api_token', id=self.id),
         }
@@ -436,12 +794,11 @@ class User(UserMixin, db.Model):
 
     @staticmethod
     def verify_api_token(token):
-        s = JSONWebSignatureSerializer(current_app.config['SECRET_KEY'])
-        try:
-            data = s.loads(token)
-        except:
+        from .tokens import api_tokens
+        user_id, _ = api_tokens.verify(token)
+        if user_id is None:
             return None
-        return User.query.get(data['id'])
+        return User.query.get(user_id)
 
     def __repr__(self):
         return '<User %r>' % self.email
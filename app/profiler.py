@@ -0,0 +1,139 @@
+"""Sampling profiler that can be switched on in a running worker.
+
+While a session runs, a background thread reads the stack of every other
+thread each ``PROFILER_INTERVAL`` seconds and counts identical stacks, so
+the cost is a few microseconds per sample and nothing at all between
+sessions. A session samples for a number of seconds, optionally only the
+threads serving requests to one endpoint, and then writes the counts in
+collapsed format (``frame;frame;frame count`` per line, the input of
+flamegraph.pl and speedscope) to ``PROFILER_DIR``.
+
+Sessions are per process: start one in a given gunicorn worker by sending
+it ``PROFILER_SIGNAL`` or through ``POST /api/v1/profiler``, which runs in
+whichever worker serves the request.
+"""
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from flask import request
+
+
+def _frame_name(code):
+    return '%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename),
+                           code.co_firstlineno)
+
+
+class _Session:
+    def __init__(self, directory, duration, interval, endpoint):
+        self.directory = directory
+        self.duration = duration
+        self.interval = interval
+        self.endpoint = endpoint
+        self.started_at = datetime.utcnow()
+        self.deadline = time.monotonic() + duration
+        self.stacks = Counter()
+        self.samples = 0
+        self.threads = set()
+        self.stopped = threading.Event()
+        self.filename = None
+        self.thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def _sample(self):
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own or (self.endpoint is not None and ident not in self.threads):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self.stopped.wait(self.interval) and time.monotonic() < self.deadline:
+            self._sample()
+        self.write()
+
+    def write(self):
+        os.makedirs(self.directory, exist_ok=True)
+        filename = os.path.join(self.directory, '%d-%s.collapsed' % (
+            os.getpid(), self.started_at.strftime('%Y%m%dT%H%M%S')))
+        with open(filename + '.part', 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write('%s %d\n' % (stack, count))
+        os.replace(filename + '.part', filename)
+        self.filename = filename
+
+    def to_json(self):
+        return {
+            'pid': os.getpid(),
+            'started_at': self.started_at,
+            'duration': self.duration,
+            'endpoint': self.endpoint,
+            'samples': self.samples,
+            'running': not self.stopped.is_set() and self.thread.is_alive(),
+            'filename': self.filename
+        }
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self.session = None
+        self.lock = threading.Lock()
+
+    def init_app(self, app):
+        app.extensions['profiler'] = self
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+        name = app.config['PROFILER_SIGNAL']
+        if name and hasattr(signal, name) and \
+                threading.current_thread() is threading.main_thread():
+            directory, duration = app.config['PROFILER_DIR'], app.config['PROFILER_DURATION']
+            interval = app.config['PROFILER_INTERVAL']
+            signal.signal(getattr(signal, name),
+                          lambda signum, frame: self.start(directory, duration, interval))
+
+    def _before_request(self):
+        session = self.session
+        if session is not None and session.endpoint == request.endpoint:
+            session.threads.add(threading.get_ident())
+
+    def _teardown_request(self, exc):
+        session = self.session
+        if session is not None:
+            session.threads.discard(threading.get_ident())
+
+    def start(self, directory, duration, interval, endpoint=None):
+        """Start a session unless one is running; return the running session."""
+        # never blocks, the signal handler may interrupt a thread holding the lock
+        if not self.lock.acquire(blocking=False):
+            return self.session
+        try:
+            if self.session is None or not self.session.thread.is_alive():
+                self.session = _Session(directory, duration, interval, endpoint)
+                self.session.thread.start()
+            return self.session
+        finally:
+            self.lock.release()
+
+    def stop(self):
+        """End the running session now; return it once its profile is written."""
+        session = self.session
+        if session is not None:
+            session.stopped.set()
+            session.thread.join()
+        return session
+
+    def profiles(self, directory):
+        if not os.path.isdir(directory):
+            return []
+        return sorted((f for f in os.listdir(directory) if f.endswith('.collapsed')),
+                      reverse=True)
+
+
+profiler = SamplingProfiler()
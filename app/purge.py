@@ -0,0 +1,83 @@
+from flask import current_app
+from . import db
+from .models import Vineyard, Sensor, Magnitude, Metric, AlertRule, AlertRuleState, \
+    DailyTemperature, Export, MagnitudeStats, RiskHour
+
+
+def _cascade_marks():
+    # children created under an already deleted parent still have to go
+    for vineyard_id, deleted_at in db.session.query(Vineyard.id, Vineyard.deleted_at) \
+            .filter(Vineyard.deleted_at != None):
+        Sensor.query.filter(Sensor.vineyard_id == vineyard_id, Sensor.deleted_at == None) \
+            .update({'deleted_at': deleted_at}, synchronize_session=False)
+    for sensor_id, deleted_at in db.session.query(Sensor.id, Sensor.deleted_at) \
+            .filter(Sensor.deleted_at != None):
+        Magnitude.query.filter(Magnitude.sensor_id == sensor_id, Magnitude.deleted_at == None) \
+            .update({'deleted_at': deleted_at}, synchronize_session=False)
+    db.session.commit()
+
+
+def _purge_metrics(magnitude_id, chunk_size):
+    chunk = db.select([Metric.id]).where(Metric.magnitude_id == magnitude_id).limit(chunk_size)
+    while True:
+        deleted = Metric.query.filter(Metric.id.in_(chunk)).delete(synchronize_session=False)
+        db.session.commit()
+        if not deleted:
+            return
+        yield deleted
+
+
+def _purge_dependents(model):
+    deleted = db.session.query(model.id).filter(model.deleted_at != None)
+    if model is Magnitude:
+        rules = db.session.query(AlertRule.id).filter(AlertRule.magnitude_id.in_(deleted))
+        AlertRuleState.query.filter(db.or_(AlertRuleState.magnitude_id.in_(deleted),
+                                           AlertRuleState.rule_id.in_(rules))) \
+            .delete(synchronize_session=False)
+        AlertRule.query.filter(AlertRule.magnitude_id.in_(deleted)) \
+            .delete(synchronize_session=False)
+        MagnitudeStats.query.filter(MagnitudeStats.magnitude_id.in_(deleted)) \
+            .delete(synchronize_session=False)
+    elif model is Sensor:
+        DailyTemperature.query.filter(DailyTemperature.sensor_id.in_(deleted)) \
+            .delete(synchronize_session=False)
+    elif model is Vineyard:
+        RiskHour.query.filter(RiskHour.vineyard_id.in_(deleted)).delete(synchronize_session=False)
+        from .exports import remove
+        for export in Export.query.filter(Export.vineyard_id.in_(deleted)):
+            remove(export)
+            db.session.delete(export)
+
+
+def purge_deleted(chunk_size=None, progress=None):
+    """Remove soft-deleted vineyards, sensors and magnitudes with their metrics.
+
+    Metrics are deleted in chunks of ``chunk_size`` rows, committing after
+    each one so no single statement holds a lock on the whole table.
+    ``progress(stage, done, total)`` is called after every chunk.
+    """
+    chunk_size = chunk_size or current_app.config['PURGE_CHUNK_SIZE']
+    if progress is None:
+        progress = lambda stage, done, total: None
+
+    _cascade_marks()
+
+    magnitude_ids = [m for m, in db.session.query(Magnitude.id)
+                     .filter(Magnitude.deleted_at != None)]
+    total = Metric.query.filter(Metric.magnitude_id.in_(magnitude_ids)).count() \
+        if magnitude_ids else 0
+    done = 0
+    progress('metrics', done, total)
+    for magnitude_id in magnitude_ids:
+        for deleted in _purge_metrics(magnitude_id, chunk_size):
+            done += deleted
+            progress('metrics', done, total)
+
+    counts = {'metrics': done}
+    for stage, model in (('magnitudes', Magnitude), ('sensors', Sensor), ('vineyards', Vineyard)):
+        _purge_dependents(model)
+        counts[stage] = model.query.filter(model.deleted_at != None) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+        progress(stage, counts[stage], counts[stage])
+    return counts
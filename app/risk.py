@@ -0,0 +1,150 @@
+"""Hourly downy mildew and botrytis risk per vineyard.
+
+The vineyard's ``Surface`` temperature, humidity and dew point readings are
+loaded with one query and averaged into aligned hourly arrays, and both
+models are evaluated on the whole arrays at once with NumPy. Results are
+stored in ``risk_hours``. :func:`refresh` only evaluates the hours after the
+last stored one, re-reading ``RISK_LOOKBACK_HOURS`` before them so a wet
+period that was still going on is measured from its start.
+
+A wet hour has a relative humidity of at least ``LEAF_WETNESS_HUMIDITY``
+or a dew point spread of at most ``LEAF_WETNESS_DEW_SPREAD`` degrees.
+Mildew risk is the fraction of ``MILDEW_DEGREE_HOURS`` that the current
+wet period has accumulated, counting hours at 10 degrees or more. Botrytis
+risk is the Broome et al. (1995) logistic infection model of wetness
+duration and mean temperature.
+"""
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from . import db
+from .models import Magnitude, Metric, RiskHour, Sensor
+
+TYPES = ('Temperature', 'Humidity', 'Dew')
+
+# ln(p / (1 - p)) = a + b*W + c*W*T + d*W*T^3, W wet hours, T mean temperature;
+# Broome, English, Marois, Latorre and Aviles, Phytopathology 85:97-102 (1995)
+BOTRYTIS_COEFFICIENTS = (-4.268, -0.0901, 0.0294, -0.0000235)
+
+
+def _floor_hour(dt):
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def load(vineyard_id, start, end):
+    """Return ``{type: array}`` of hourly means over ``[start, end)``, NaN without data."""
+    hours = int((end - start).total_seconds() // 3600)
+    series = {type: np.full(hours, np.nan) for type in TYPES}
+    metrics, magnitudes, sensors = Metric.__table__, Magnitude.__table__, Sensor.__table__
+    rows = db.session.execute(
+        db.select([metrics.c.timestamp, magnitudes.c.type, metrics.c.value])
+        .select_from(metrics.join(magnitudes).join(sensors))
+        .where(db.and_(sensors.c.vineyard_id == vineyard_id, sensors.c.deleted_at == None,
+                       magnitudes.c.deleted_at == None, magnitudes.c.layer == 'Surface',
+                       magnitudes.c.type.in_(TYPES),
+                       metrics.c.timestamp >= start, metrics.c.timestamp < end))).fetchall()
+    if not rows or not hours:
+        return series
+    timestamps, types, values = zip(*rows)
+    offsets = (np.array(timestamps, dtype='datetime64[s]') - np.datetime64(start, 's')) \
+        .astype('timedelta64[h]').astype(np.int64)
+    types, values = np.array(types), np.array(values, dtype=float)
+    for type in TYPES:
+        mask = types == type
+        counts = np.bincount(offsets[mask], minlength=hours)
+        sums = np.bincount(offsets[mask], weights=values[mask], minlength=hours)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            series[type] = sums / counts
+    return series
+
+
+def wet_periods(wet, temperature):
+    """Return the length and the degree hours of the wet period running at each hour."""
+    index = np.arange(len(wet))
+    last_dry = np.maximum.accumulate(np.where(wet, -1, index))
+    length = np.where(wet, index - last_dry, 0)
+    warm = np.where(wet, np.nan_to_num(temperature), 0.0)
+    cumulative = np.concatenate(([0.0], np.cumsum(warm)))
+    return length, cumulative[index + 1] - cumulative[last_dry + 1]
+
+
+def evaluate(series):
+    """Evaluate both models over aligned hourly arrays."""
+    config = current_app.config
+    temperature, humidity, dew_point = (series[type] for type in TYPES)
+    with np.errstate(invalid='ignore'):
+        wet = (humidity >= config['LEAF_WETNESS_HUMIDITY']) | \
+            (temperature - dew_point <= config['LEAF_WETNESS_DEW_SPREAD'])
+        length, degree_hours = wet_periods(wet, np.where(temperature >= 10, temperature, 0.0))
+        _, total_degrees = wet_periods(wet, temperature)
+        mean = np.where(length > 0, total_degrees / np.maximum(length, 1), np.nan)
+    mildew = np.clip(degree_hours / config['MILDEW_DEGREE_HOURS'], 0.0, 1.0)
+    a, b, c, d = BOTRYTIS_COEFFICIENTS
+    odds = a + b * length + c * length * mean + d * length * mean ** 3
+    botrytis = np.where(length > 0, 1 / (1 + np.exp(-np.nan_to_num(odds))), 0.0)
+    return {'wet': wet, 'mildew': mildew, 'botrytis': botrytis}
+
+
+def _value(x):
+    return None if np.isnan(x) else round(float(x), 4)
+
+
+def refresh(vineyard_id, now=None):
+    """Store the risk of every hour since the last stored one; return the hours written."""
+    end = _floor_hour(now or datetime.utcnow()) + timedelta(hours=1)
+    last = db.session.query(db.func.max(RiskHour.hour)) \
+        .filter(RiskHour.vineyard_id == vineyard_id).scalar()
+    if last is None:
+        first = db.session.query(db.func.min(Metric.timestamp)) \
+            .join(Magnitude, Metric.magnitude_id == Magnitude.id) \
+            .join(Sensor, Magnitude.sensor_id == Sensor.id) \
+            .filter(Sensor.vineyard_id == vineyard_id, Sensor.deleted_at == None,
+                    Magnitude.deleted_at == None, Magnitude.layer == 'Surface',
+                    Magnitude.type.in_(TYPES)).scalar()
+        if first is None:
+            return 0
+        start = load_from = _floor_hour(first)
+    else:
+        start = last
+        load_from = last - timedelta(hours=current_app.config['RISK_LOOKBACK_HOURS'])
+    series = load(vineyard_id, load_from, end)
+    risk = evaluate(series)
+
+    skip = int((start - load_from).total_seconds() // 3600)
+    rows = []
+    for i in range(skip, len(risk['wet'])):
+        if all(np.isnan(series[type][i]) for type in TYPES):
+            continue
+        rows.append({
+            'vineyard_id': vineyard_id,
+            'hour': load_from + timedelta(hours=i),
+            'temperature': _value(series['Temperature'][i]),
+            'humidity': _value(series['Humidity'][i]),
+            'dew_point': _value(series['Dew'][i]),
+            'wet': bool(risk['wet'][i]),
+            'mildew': _value(risk['mildew'][i]),
+            'botrytis': _value(risk['botrytis'][i])
+        })
+    RiskHour.query.filter(RiskHour.vineyard_id == vineyard_id, RiskHour.hour >= start) \
+        .delete(synchronize_session=False)
+    try:
+        if rows:
+            db.session.execute(RiskHour.__table__.insert(), rows)
+        db.session.commit()
+    except IntegrityError:
+        # refreshed concurrently
+        db.session.rollback()
+        return 0
+    return len(rows)
+
+
+def refresh_all(progress=None):
+    vineyard_ids = [v for v, in db.session.query(Sensor.vineyard_id)
+                    .filter(Sensor.deleted_at == None).distinct()]
+    hours = 0
+    for done, vineyard_id in enumerate(vineyard_ids, 1):
+        hours += refresh(vineyard_id)
+        if progress is not None:
+            progress('vineyards', done, len(vineyard_ids))
+    return {'vineyards': len(vineyard_ids), 'hours': hours}
@@ -0,0 +1,256 @@
+"""Alert rules evaluated against ingested metric batches.
+
+Enabled ``AlertRule`` rows on live magnitudes are compiled into an
+in-memory index keyed by magnitude id, plus the account wide rules keyed
+by user, layer and type: those apply to every magnitude of that type the
+user owns, in any layer when the rule has none. Each batch is grouped per
+magnitude and every matching rule is checked against the whole group at
+once, as array operations, so the cost grows with the number of matching
+rules, not with the batch size.
+
+Rate and duration rules carry the last reading seen and the start of the
+current run from one batch to the next. That state is kept in
+``alert_rule_states`` and written in the ingest transaction, so every
+worker, and the ingest server, continue from the same point. The state
+records the rule definition it was computed for and starts over when the
+rule is edited. Readings not newer than the last one seen are skipped by
+these rules.
+"""
+import operator
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import event, inspect
+from . import db
+from .cache import TTLCache, channel, mark_stale, on_commit
+from .models import Alert, AlertRule, AlertRuleState, Magnitude, Sensor, Vineyard
+from .upsert import upsert
+
+CompiledRule = namedtuple('CompiledRule', ['id', 'kind', 'comparison', 'value', 'duration',
+                                           'priority', 'content', 'user_id', 'signature'])
+
+Owner = namedtuple('Owner', ['user_id', 'vineyard_id', 'layer', 'type'])
+
+_UNKNOWN = Owner(None, None, None, None)
+
+_COMPARE = {'above': operator.gt, 'below': operator.lt}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class _Index:
+    def __init__(self, events):
+        self.events = events
+        self.by_magnitude = None
+        self.by_user = None
+        self.owners = TTLCache(maxsize=100000, ttl=300)
+
+    def load(self):
+        by_magnitude, by_user = defaultdict(list), defaultdict(list)
+        for rule in AlertRule.query.outerjoin(Magnitude, AlertRule.magnitude_id == Magnitude.id) \
+                .filter(AlertRule.enabled == True,
+                        db.or_(db.and_(AlertRule.magnitude_id == None, AlertRule.type != None),
+                               Magnitude.deleted_at == None)):
+            compiled = CompiledRule(rule.id, rule.kind, rule.comparison, rule.value,
+                                    rule.duration, rule.priority, rule.content, rule.user_id,
+                                    signature(rule))
+            if rule.magnitude_id is not None:
+                by_magnitude[rule.magnitude_id].append(compiled)
+            else:
+                by_user[rule.user_id, rule.layer, rule.type].append(compiled)
+        self.by_magnitude, self.by_user = dict(by_magnitude), dict(by_user)
+
+    def owner_of(self, magnitude_ids):
+        """Map magnitude ids to their ``Owner``."""
+        missing = [m for m in magnitude_ids if self.owners.get(m) is None]
+        if missing:
+            for row in db.session.query(Magnitude.id, Magnitude.user_id, Sensor.vineyard_id,
+                                        Magnitude.layer, Magnitude.type) \
+                    .join(Sensor, Magnitude.sensor_id == Sensor.id) \
+                    .filter(Magnitude.id.in_(missing)):
+                self.owners.set(row[0], Owner(*row[1:]))
+        return {m: self.owners.get(m, _UNKNOWN) for m in magnitude_ids}
+
+    def account_rules(self, owner):
+        """The account wide rules that apply to a magnitude of ``owner``."""
+        return self.by_user.get((owner.user_id, owner.layer, owner.type), []) + \
+            self.by_user.get((owner.user_id, None, owner.type), [])
+
+
+def signature(rule):
+    return '%s %s %r %s' % (rule.kind, rule.comparison, float(rule.value), rule.duration)
+
+
+def _seconds(timestamp):
+    return (timestamp - _EPOCH).total_seconds()
+
+
+def _first(hits):
+    return int(hits.argmax()) if hits.any() else None
+
+
+def _threshold(rule, state, seconds, values):
+    return _first(_COMPARE[rule.comparison](values, rule.value)), None
+
+
+def _rate(rule, state, seconds, values):
+    if state is not None:
+        seconds = np.concatenate(([_seconds(state.last_timestamp)], seconds))
+        values = np.concatenate(([state.last_value], values))
+    hours = np.diff(seconds) / 3600.0
+    elapsed = hours > 0
+    rates = np.diff(values) / np.where(elapsed, hours, 1.0)
+    hit = _first(elapsed & _COMPARE[rule.comparison](rates, rule.value))
+    if hit is not None and state is None:
+        hit += 1
+    return hit, {'since': None, 'notified': False}
+
+
+def _duration(rule, state, seconds, values):
+    hits = _COMPARE[rule.comparison](values, rule.value)
+    continuing = state is not None and state.since is not None
+    # the start of the run of each reading, carried forward from the run's first reading
+    starts = hits.copy()
+    starts[1:] &= ~hits[:-1]
+    starts[0] = hits[0]
+    run_start = np.where(starts, seconds, np.nan)
+    if continuing and hits[0]:
+        run_start[0] = _seconds(state.since)
+    positions = np.maximum.accumulate(np.where(np.isnan(run_start), 0, np.arange(len(hits))))
+    run_start = run_start[positions]
+    with np.errstate(invalid='ignore'):
+        reached = hits & (seconds - run_start >= rule.duration)
+    before = np.empty_like(reached)
+    before[0] = continuing and state.notified
+    before[1:] = reached[:-1]
+    since = None
+    if hits[-1]:
+        since = _EPOCH + timedelta(seconds=float(run_start[-1]))
+        if continuing and positions[-1] == 0 and hits[0]:
+            since = state.since
+    return _first(reached & ~before), {'since': since, 'notified': bool(reached[-1])}
+
+
+_CHECKS = {'threshold': _threshold, 'rate': _rate, 'duration': _duration}
+
+
+def describe(rule, magnitude_id, timestamp, value):
+    if rule.content:
+        return rule.content
+    what = {'threshold': 'value', 'rate': 'rate of change', 'duration': 'value'}[rule.kind]
+    text = 'Magnitude %d %s %s %s (%s at %s)' % (magnitude_id, what, rule.comparison,
+                                                 rule.value, value, timestamp)
+    if rule.kind == 'duration':
+        text += ' for %ds' % rule.duration
+    return text
+
+
+class RuleEngine:
+    def init_app(self, app):
+        app.extensions['rules'] = _Index(channel(app, 'alert_rules'))
+
+    @property
+    def _index(self):
+        index = current_app.extensions['rules']
+        if index.events.changed() or index.by_magnitude is None:
+            index.load()
+        return index
+
+    def evaluate(self, rows):
+        """Check ``(magnitude_id, timestamp, value)`` rows and add the resulting alerts."""
+        index = self._index
+        if not index.by_magnitude and not index.by_user:
+            return []
+        groups = defaultdict(list)
+        for magnitude_id, timestamp, value in rows:
+            groups[magnitude_id].append((timestamp, value))
+        owners = index.owner_of(list(groups)) if index.by_user else {}
+        matched = {}
+        for magnitude_id in groups:
+            matching = index.by_magnitude.get(magnitude_id, [])
+            if index.by_user:
+                matching = matching + index.account_rules(owners[magnitude_id])
+            if matching:
+                matched[magnitude_id] = matching
+        if not matched:
+            return []
+        states = self._states(matched)
+
+        fired, written = [], []
+        for magnitude_id, matching in matched.items():
+            readings = sorted(groups[magnitude_id], key=operator.itemgetter(0))
+            timestamps = [timestamp for timestamp, _ in readings]
+            seconds = np.array([_seconds(timestamp) for timestamp in timestamps])
+            values = np.array([value for _, value in readings], dtype=float)
+            for rule in matching:
+                state, skip = None, 0
+                if rule.kind != 'threshold':
+                    state = states.get((rule.id, magnitude_id))
+                    if state is not None and state.signature != rule.signature:
+                        state = None
+                    if state is not None:
+                        skip = int(np.searchsorted(seconds, _seconds(state.last_timestamp),
+                                                   side='right'))
+                        if skip == len(seconds):
+                            continue
+                hit, carried = _CHECKS[rule.kind](rule, state, seconds[skip:], values[skip:])
+                if hit is not None:
+                    fired.append((rule, magnitude_id) + readings[skip + hit])
+                if carried is not None:
+                    written.append(dict(carried, rule_id=rule.id, magnitude_id=magnitude_id,
+                                        signature=rule.signature,
+                                        last_timestamp=timestamps[-1],
+                                        last_value=float(values[-1])))
+        upsert(AlertRuleState.__table__, ['rule_id', 'magnitude_id'], written)
+        if not fired:
+            return []
+        owners = index.owner_of(list({magnitude_id for _, magnitude_id, _, _ in fired}))
+        return [self.raise_alert(rule, magnitude_id, timestamp, value,
+                                 owners[magnitude_id].vineyard_id)
+                for rule, magnitude_id, timestamp, value in fired]
+
+    def _states(self, matched):
+        """Load the stored state of the rate and duration rules of ``matched``."""
+        rule_ids = {rule.id for matching in matched.values() for rule in matching
+                    if rule.kind != 'threshold'}
+        if not rule_ids:
+            return {}
+        return {(state.rule_id, state.magnitude_id): state
+                for state in AlertRuleState.query.filter(
+                    AlertRuleState.rule_id.in_(rule_ids),
+                    AlertRuleState.magnitude_id.in_(list(matched)))}
+
+    def raise_alert(self, rule, magnitude_id, timestamp, value, vineyard_id=None):
+        group_key = 'vineyard:%d' % vineyard_id if vineyard_id is not None else None
+        return Alert.raise_alert(describe(rule, magnitude_id, timestamp, value), rule.user_id,
+                                 rule.priority, origin='rule:%d' % rule.id, group_key=group_key)
+
+    def invalidate(self):
+        index = current_app.extensions['rules']
+        index.by_magnitude = None
+        index.events.publish()
+
+
+rules = RuleEngine()
+
+
+@event.listens_for(AlertRule, 'after_insert')
+@event.listens_for(AlertRule, 'after_update')
+@event.listens_for(AlertRule, 'after_delete')
+def _alert_rule_changed(mapper, connection, target):
+    mark_stale(target, 'alert_rules')
+
+
+@event.listens_for(Magnitude, 'after_update')
+@event.listens_for(Sensor, 'after_update')
+@event.listens_for(Vineyard, 'after_update')
+def _parent_changed(mapper, connection, target):
+    # soft-deleted magnitudes leave the index
+    if inspect(target).attrs.deleted_at.history.has_changes():
+        mark_stale(target, 'alert_rules')
+
+
+@on_commit('alert_rules')
+def _alert_rules_changed():
+    rules.invalidate()
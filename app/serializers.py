@@ -0,0 +1,130 @@
+"""Fast JSON rendering for list endpoints.
+
+The functions here produce exactly what the models' ``to_json`` methods
+produce, but from plain column tuples: URLs come from templates compiled
+once per blueprint instead of ``url_for`` calls, and nested collections
+are loaded with one query per level instead of one per parent row.
+"""
+import re
+from collections import defaultdict
+from flask import current_app, request
+from . import db
+from .models import Metric, Magnitude, Sensor, Vineyard
+
+METRIC_COLUMNS = (Metric.id, Metric.timestamp, Metric.value, Metric.anomaly,
+                  Metric.magnitude_id)
+MAGNITUDE_COLUMNS = (Magnitude.id, Magnitude.sensor_id, Magnitude.layer, Magnitude.type,
+                     Magnitude.user_id, Magnitude.created_at)
+SENSOR_COLUMNS = (Sensor.id, Sensor.description, Sensor.latitude, Sensor.longitude,
+                  Sensor.gateway, Sensor.power_perc, Sensor.vineyard_id, Sensor.user_id,
+                  Sensor.created_at)
+VINEYARD_COLUMNS = (Vineyard.id, Vineyard.name, Vineyard.user_id, Vineyard.created_at)
+
+_VARIABLE = re.compile(r'<(?:[^:<>]+:)?[^<>]+>')
+
+
+def url_templates(blueprint='api'):
+    """Return ``{endpoint: '%s' template}`` for every rule of ``blueprint``."""
+    key = (blueprint, request.script_root)
+    compiled = current_app.extensions.setdefault('url_templates', {})
+    templates = compiled.get(key)
+    if templates is None:
+        templates = {}
+        for rule in current_app.url_map.iter_rules():
+            if rule.endpoint.startswith(blueprint + '.') and rule.endpoint not in templates:
+                templates[rule.endpoint] = request.script_root + \
+                    _VARIABLE.sub('%s', rule.rule.replace('%', '%%'))
+        compiled[key] = templates
+    return templates
+
+
+def metrics(rows):
+    magnitude_url = url_templates()['api.get_magnitude']
+    return [{
+        'id': id,
+        'timestamp': timestamp,
+        'value': str(value),
+        'anomaly': anomaly,
+        'magnitude_url': magnitude_url % magnitude_id
+    } for id, timestamp, value, anomaly, magnitude_id in rows]
+
+
+def magnitudes(rows):
+    urls = url_templates()
+    url, user_url = urls['api.get_magnitude'], urls['api.get_user']
+    sensor_url, metrics_url = urls['api.get_sensor'], urls['api.get_magnitude_metrics']
+    return [{
+        'id': id,
+        'sensor_id': sensor_id,
+        'layer': layer,
+        'type': type,
+        'url': url % id,
+        'user_url': user_url % user_id,
+        'sensor_url': sensor_url % sensor_id,
+        'metrics_url': metrics_url % id,
+        'created_at': created_at
+    } for id, sensor_id, layer, type, user_id, created_at in rows]
+
+
+def _magnitudes_by_sensor(sensor_ids):
+    grouped = defaultdict(list)
+    if not sensor_ids:
+        return grouped
+    rows = db.session.query(*MAGNITUDE_COLUMNS) \
+        .filter(Magnitude.sensor_id.in_(sensor_ids), Magnitude.deleted_at == None) \
+        .order_by(Magnitude.id)
+    for magnitude in magnitudes(rows):
+        grouped[magnitude['sensor_id']].append(magnitude)
+    return grouped
+
+
+def sensors(rows):
+    rows = list(rows)
+    urls = url_templates()
+    url, user_url = urls['api.get_sensor'], urls['api.get_user']
+    vineyard_url, magnitudes_url = urls['api.get_vineyard'], urls['api.get_sensor_magnitudes']
+    nested = _magnitudes_by_sensor([row[0] for row in rows])
+    return [{
+        'id': id,
+        'description': description,
+        'latitude': str(latitude),
+        'longitude': str(longitude),
+        'gateway': str(gateway),
+        'power_perc': str(power_perc),
+        'magnitudes': nested[id],
+        'url': url % id,
+        'user_url': user_url % user_id,
+        'vineyard_url': vineyard_url % vineyard_id,
+        'magnitudes_url': magnitudes_url % id,
+        'created_at': created_at
+    } for id, description, latitude, longitude, gateway, power_perc, vineyard_id, user_id,
+        created_at in rows]
+
+
+def _sensors_by_vineyard(vineyard_ids):
+    grouped = defaultdict(list)
+    if not vineyard_ids:
+        return grouped
+    rows = db.session.query(*SENSOR_COLUMNS) \
+        .filter(Sensor.vineyard_id.in_(vineyard_ids), Sensor.deleted_at == None) \
+        .order_by(Sensor.id).all()
+    for sensor, row in zip(sensors(rows), rows):
+        grouped[row.vineyard_id].append(sensor)
+    return grouped
+
+
+def vineyards(rows):
+    rows = list(rows)
+    urls = url_templates()
+    url, user_url, sensors_url = \
+        urls['api.get_vineyard'], urls['api.get_user'], urls['api.get_vineyard_sensors']
+    nested = _sensors_by_vineyard([row[0] for row in rows])
+    return [{
+        'id': id,
+        'name': name,
+        'sensors': nested[id],
+        'url': url % id,
+        'user_url': user_url % user_id,
+        'sensors_url': sensors_url % id,
+        'created_at': created_at
+    } for id, name, user_id, created_at in rows]
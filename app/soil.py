@@ -0,0 +1,108 @@
+"""Vertical soil profile of a sensor.
+
+The readings of one ``type`` at every layer are bucketed and averaged by
+:func:`timeseries.bucket` in a single query grouped by bucket and layer.
+Buckets that have ended are kept in a per process cache, so a request only
+queries the buckets it has not seen yet, usually the current one. Readings
+arriving after their bucket was cached show up once the entry expires
+after ``SOIL_PROFILE_CACHE_TTL`` seconds.
+
+Each bucket carries the gradient of every layer against the one above it
+and, for humidity, the infiltration front: the deepest layer reached by a
+rise of at least ``SOIL_WETTING_THRESHOLD`` that runs down from the
+surface without a break.
+"""
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import func
+from . import db, timeseries
+from .cache import TTLCache
+from .exceptions import ValidationError
+from .models import Magnitude, Metric
+
+LAYERS = Magnitude.layer.type.enums
+
+
+def _cache():
+    config = current_app.config
+    return current_app.extensions.setdefault('soil_profiles', TTLCache(
+        config['SOIL_PROFILE_CACHE_SIZE'], config['SOIL_PROFILE_CACHE_TTL']))
+
+
+def _query(sensor_id, type, origin, first, last, interval):
+    """Return a ``(layers, buckets)`` array of the means of buckets ``first`` to ``last``."""
+    values = np.full((len(LAYERS), last - first + 1), np.nan)
+    start = origin + first * interval
+    index = timeseries.bucket(Metric.timestamp, start, interval)
+    rows = db.session.query(index, Magnitude.layer, func.avg(Metric.value)) \
+        .join(Magnitude, Metric.magnitude_id == Magnitude.id) \
+        .filter(Magnitude.sensor_id == sensor_id, Magnitude.type == type,
+                Magnitude.deleted_at == None,
+                Metric.timestamp >= datetime.utcfromtimestamp(start),
+                Metric.timestamp < datetime.utcfromtimestamp(origin + (last + 1) * interval)) \
+        .group_by(index, Magnitude.layer).all()
+    for i, layer, value in rows:
+        if i is not None and 0 <= i <= last - first and value is not None:
+            values[LAYERS.index(layer), int(i)] = value
+    return values
+
+
+def load(sensor_id, type, start, end, interval, now=None):
+    """Return ``(origin, values)``, ``values`` a ``(layers, buckets)`` array of means."""
+    origin, buckets = timeseries.align(start, end, interval)
+    cache = _cache()
+    closed = timeseries.epoch(now or datetime.utcnow())
+    values = np.full((len(LAYERS), buckets), np.nan)
+    missing = []
+    for i in range(buckets):
+        cached = cache.get((sensor_id, type, interval, origin + i * interval))
+        if cached is None:
+            missing.append(i)
+        else:
+            values[:, i] = cached
+    if missing:
+        first, last = missing[0], missing[-1]
+        values[:, first:last + 1] = _query(sensor_id, type, origin, first, last, interval)
+        for i in missing:
+            if origin + (i + 1) * interval <= closed:
+                cache.set((sensor_id, type, interval, origin + i * interval),
+                          tuple(values[:, i]))
+    return origin, values
+
+
+def fronts(values, threshold):
+    """Index of the deepest layer of each bucket in the front, -1 without one."""
+    rise = np.full(values.shape, np.nan)
+    rise[:, 1:] = values[:, 1:] - values[:, :-1]
+    with np.errstate(invalid='ignore'):
+        wetting = ~np.isnan(rise) & (rise >= threshold)
+    return np.cumprod(wetting, axis=0).sum(axis=0) - 1
+
+
+def profile(sensor_id, type, start, end, interval, now=None):
+    """Return ``[{timestamp, layers, gradients, front}]`` for the buckets with readings."""
+    if type not in Magnitude.type.type.enums:
+        raise ValidationError('type must be one of %s' % ', '.join(Magnitude.type.type.enums))
+    origin, values = load(sensor_id, type, start, end, interval, now)
+    gradients = np.diff(values, axis=0)
+    front = fronts(values, current_app.config['SOIL_WETTING_THRESHOLD']) \
+        if type == 'Humidity' else None
+
+    def value(x):
+        return None if np.isnan(x) else round(float(x), 4)
+
+    first = datetime.utcfromtimestamp(origin)
+    step = timedelta(seconds=interval)
+    points = []
+    for i in range(values.shape[1]):
+        if np.isnan(values[:, i]).all():
+            continue
+        points.append({
+            'timestamp': first + i * step,
+            'layers': {layer: value(values[j, i]) for j, layer in enumerate(LAYERS)},
+            'gradients': {layer: value(gradients[j - 1, i])
+                          for j, layer in enumerate(LAYERS) if j},
+            'front': LAYERS[front[i]] if front is not None and front[i] >= 0 else None
+        })
+    return points
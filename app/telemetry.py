@@ -0,0 +1,269 @@
+"""Operational metrics in the Prometheus text exposition format.
+
+Every process counts into an in-memory registry: requests, latency and
+database queries per endpoint, ingested rows and how late they arrive.
+Each process writes its registry to ``<TELEMETRY_DIR>/<pid>.json`` at most
+every ``TELEMETRY_FLUSH_INTERVAL`` seconds. Scraping ``/api/v1/telemetry``
+adds up the files of all gunicorn workers, including the counters of
+workers that have exited. Gauges, like connection pool usage, only count
+live processes. Clear the directory when the server is restarted. Without a
+directory, each process reports only itself.
+"""
+import json
+import os
+import tempfile
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime
+from threading import Lock
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+LAG_BUCKETS = (1, 10, 60, 300, 600, 1800, 3600, 21600, 86400)
+
+HELP = {
+    'vifi_http_requests_total': ('counter', 'Requests by endpoint, method and status.'),
+    'vifi_http_request_duration_seconds': ('histogram', 'Request latency by endpoint.'),
+    'vifi_db_queries_per_request': ('histogram', 'Queries run by each request.'),
+    'vifi_db_query_seconds_total': ('counter', 'Time spent in queries by endpoint.'),
+    'vifi_db_pool_checked_out': ('gauge', 'Connections in use.'),
+    'vifi_db_pool_overflow': ('gauge', 'Connections opened beyond the pool size.'),
+    'vifi_db_pool_size': ('gauge', 'Configured pool size.'),
+    'vifi_ingest_rows_total': ('counter', 'Ingested readings.'),
+    'vifi_ingest_lag_seconds': ('histogram', 'Age of readings when they are ingested.'),
+    'vifi_job_queue_lag_seconds': ('gauge', 'Age of the oldest due job still queued.'),
+    'vifi_job_queue_depth': ('gauge', 'Due jobs still queued.'),
+}
+
+
+def _key(name, labels):
+    return json.dumps([name, sorted(labels.items())])
+
+
+class Registry:
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.gauges = {}
+        self.lock = Lock()
+        self.flushed_at = 0.0
+
+    def inc(self, name, labels, value=1):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] += value
+
+    def observe(self, name, labels, values, buckets):
+        """Count ``values`` into a histogram; ``buckets`` are the upper bounds."""
+        key = _key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [list(buckets), [0] * len(buckets), 0.0, 0]
+            for value in values:
+                i = bisect_left(buckets, value)
+                if i < len(buckets):
+                    histogram[1][i] += 1
+                histogram[2] += value
+                histogram[3] += 1
+
+    def set(self, name, labels, value):
+        with self.lock:
+            self.gauges[_key(name, labels)] = value
+
+    def snapshot(self):
+        with self.lock:
+            return {'counters': dict(self.counters),
+                    'histograms': {k: [list(h[0]), list(h[1]), h[2], h[3]]
+                                   for k, h in self.histograms.items()},
+                    'gauges': dict(self.gauges)}
+
+    def flush(self, directory):
+        self.flushed_at = time.monotonic()
+        if directory is None:
+            return
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, os.path.join(directory, '%d.json' % os.getpid()))
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect(registry, directory):
+    """Merge the snapshots of every process writing to ``directory``."""
+    snapshots = []
+    if directory is not None and os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            pid, _, extension = filename.partition('.')
+            if extension != 'json' or not pid.isdigit():
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as f:
+                    snapshots.append((int(pid), json.load(f)))
+            except (OSError, ValueError):
+                continue
+    if not any(pid == os.getpid() for pid, _ in snapshots):
+        snapshots.append((os.getpid(), registry.snapshot()))
+
+    merged = {'counters': defaultdict(float), 'histograms': {}, 'gauges': defaultdict(float)}
+    for pid, snapshot in snapshots:
+        for key, value in snapshot['counters'].items():
+            merged['counters'][key] += value
+        for key, (buckets, counts, total, count) in snapshot['histograms'].items():
+            histogram = merged['histograms'].setdefault(key, [buckets, [0] * len(buckets),
+                                                              0.0, 0])
+            histogram[1] = [a + b for a, b in zip(histogram[1], counts)]
+            histogram[2] += total
+            histogram[3] += count
+        if pid == os.getpid() or _alive(pid):
+            for key, value in snapshot['gauges'].items():
+                merged['gauges'][key] += value
+    return merged
+
+
+def _labels(labels, **extra):
+    labels = list(labels) + sorted(extra.items())
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\')
+                                          .replace('"', '\\"').replace('\n', '\\n'))
+                             for name, value in labels)
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() \
+        else '%d' % value
+
+
+def render(merged):
+    """Format merged samples in the text exposition format."""
+    families = defaultdict(list)
+    for kind in ('counters', 'gauges'):
+        for key, value in sorted(merged[kind].items()):
+            name, labels = json.loads(key)
+            families[name].append('%s%s %s' % (name, _labels(labels), _number(value)))
+    for key, (buckets, counts, total, count) in sorted(merged['histograms'].items()):
+        name, labels = json.loads(key)
+        cumulative = 0
+        for bound, n in zip(buckets, counts):
+            cumulative += n
+            families[name].append('%s_bucket%s %d' % (name, _labels(labels, le=_number(bound)),
+                                                      cumulative))
+        families[name].append('%s_bucket%s %d' % (name, _labels(labels, le='+Inf'), count))
+        families[name].append('%s_sum%s %s' % (name, _labels(labels), _number(total)))
+        families[name].append('%s_count%s %d' % (name, _labels(labels), count))
+    lines = []
+    for name in sorted(families):
+        kind, description = HELP.get(name, ('untyped', ''))
+        lines.append('# HELP %s %s' % (name, description))
+        lines.append('# TYPE %s %s' % (name, kind))
+        lines.extend(families[name])
+    return '\n'.join(lines) + '\n'
+
+
+class Telemetry:
+    def __init__(self):
+        self.engines = set()
+
+    def init_app(self, app):
+        app.extensions['telemetry'] = Registry()
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _watch(self, engine):
+        if engine not in self.engines:
+            self.engines.add(engine)
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, many):
+        if has_request_context():
+            conn.info.setdefault('telemetry_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, many):
+        started = conn.info.get('telemetry_started')
+        if started and has_request_context():
+            elapsed = time.perf_counter() - started.pop()
+            timings = g.get('telemetry_queries')
+            if timings is not None:
+                timings[0] += 1
+                timings[1] += elapsed
+
+    def _before_request(self):
+        from . import db
+        self._watch(db.engine)
+        g.telemetry_started = time.perf_counter()
+        g.telemetry_queries = [0, 0.0]
+
+    def _after_request(self, response):
+        started = g.get('telemetry_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'none'
+        queries, query_time = g.telemetry_queries
+        registry = current_app.extensions['telemetry']
+        registry.inc('vifi_http_requests_total', {'endpoint': endpoint, 'method': request.method,
+                                                  'status': response.status_code})
+        registry.observe('vifi_http_request_duration_seconds', {'endpoint': endpoint},
+                         (elapsed,), LATENCY_BUCKETS)
+        registry.observe('vifi_db_queries_per_request', {'endpoint': endpoint}, (queries,),
+                         QUERY_BUCKETS)
+        registry.inc('vifi_db_query_seconds_total', {'endpoint': endpoint}, query_time)
+        if time.monotonic() - registry.flushed_at >= \
+                current_app.config['TELEMETRY_FLUSH_INTERVAL']:
+            self._pool_gauges(registry)
+            registry.flush(current_app.config['TELEMETRY_DIR'])
+        return response
+
+    def _pool_gauges(self, registry):
+        from . import db
+        pool = db.engine.pool
+        for name, attribute in (('vifi_db_pool_checked_out', 'checkedout'),
+                                ('vifi_db_pool_overflow', 'overflow'),
+                                ('vifi_db_pool_size', 'size')):
+            if hasattr(pool, attribute):
+                registry.set(name, {}, max(getattr(pool, attribute)(), 0))
+
+    def ingested(self, rows, now=None):
+        """Count freshly ingested ``(magnitude_id, timestamp, value)`` rows."""
+        now = now or datetime.utcnow()
+        registry = current_app.extensions['telemetry']
+        registry.inc('vifi_ingest_rows_total', {}, len(rows))
+        registry.observe('vifi_ingest_lag_seconds', {},
+                         [max((now - timestamp).total_seconds(), 0)
+                          for _, timestamp, _ in rows], LAG_BUCKETS)
+
+    def exposition(self):
+        """Return every process's metrics, plus the job queue read now."""
+        from . import db
+        from .models import Job
+        registry = current_app.extensions['telemetry']
+        self._pool_gauges(registry)
+        registry.flush(current_app.config['TELEMETRY_DIR'])
+        merged = collect(registry, current_app.config['TELEMETRY_DIR'])
+        now = datetime.utcnow()
+        depth, oldest = db.session.query(db.func.count(Job.id), db.func.min(Job.run_at)) \
+            .filter(Job.status == 'queued', Job.run_at <= now).one()
+        merged['gauges'][_key('vifi_job_queue_depth', {})] = depth
+        merged['gauges'][_key('vifi_job_queue_lag_seconds', {})] = \
+            (now - oldest).total_seconds() if oldest is not None else 0
+        return render(merged)
+
+
+telemetry = Telemetry()
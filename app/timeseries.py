@@ -0,0 +1,177 @@
+"""Regular time series from irregular readings.
+
+Readings are grouped into fixed ``interval`` second buckets in SQL with
+:class:`bucket`, which compiles to each database's epoch arithmetic, and
+aggregated there, so only one row per bucket leaves the database. The
+empty buckets are then filled over NumPy arrays.
+
+Vineyard aggregates nest two such groupings: a subquery averages each
+sensor per bucket and the outer query aggregates those across sensors, so
+the result is again one row per bucket however many sensors report.
+"""
+import calendar
+import re
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import Integer, func
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from . import db
+from .exceptions import ValidationError
+from .ingest import parse_timestamp
+from .models import Magnitude, Metric, Sensor
+
+AGGREGATES = {'avg': func.avg, 'min': func.min, 'max': func.max, 'sum': func.sum,
+              'count': func.count}
+
+FILLS = ('none', 'null', 'previous', 'linear')
+
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+_INTERVAL = re.compile(r'^(\d+)([smhd]?)$')
+
+
+class bucket(FunctionElement):
+    """Index of the ``interval`` second bucket after epoch ``origin`` of a timestamp."""
+    type = Integer()
+    name = 'bucket'
+
+    def __init__(self, timestamp, origin, interval):
+        self.origin, self.interval = int(origin), int(interval)
+        super().__init__(timestamp)
+
+
+@compiles(bucket)
+def _bucket(element, compiler, **kw):
+    return 'CAST(FLOOR((EXTRACT(EPOCH FROM %s) - %d) / %d) AS BIGINT)' % (
+        compiler.process(element.clauses, **kw), element.origin, element.interval)
+
+
+@compiles(bucket, 'sqlite')
+def _bucket_sqlite(element, compiler, **kw):
+    # integer division, timestamps before the origin are filtered out
+    return "((CAST(strftime('%%s', %s) AS INTEGER) - %d) / %d)" % (
+        compiler.process(element.clauses, **kw), element.origin, element.interval)
+
+
+@compiles(bucket, 'mysql')
+def _bucket_mysql(element, compiler, **kw):
+    return 'FLOOR((UNIX_TIMESTAMP(%s) - %d) / %d)' % (
+        compiler.process(element.clauses, **kw), element.origin, element.interval)
+
+
+def epoch(dt):
+    return calendar.timegm(dt.utctimetuple())
+
+
+def parse_interval(value):
+    """Read an interval as seconds, or a number followed by s, m, h or d."""
+    match = _INTERVAL.match(str(value).strip())
+    if not match or int(match.group(1)) == 0:
+        raise ValidationError('interval must be a positive number of s, m, h or d')
+    return int(match.group(1)) * _UNITS[match.group(2) or 's']
+
+
+def align(start, end, interval):
+    """Return ``(origin, buckets)``: ``start`` floored to the interval and the bucket count."""
+    origin = epoch(start) // interval * interval
+    buckets = -(-(epoch(end) - origin) // interval)
+    if buckets > current_app.config['MAX_ITEMS_PER_PAGE']:
+        raise ValidationError('too many buckets, use a longer interval or a shorter range')
+    return origin, buckets
+
+
+def fill(values, strategy):
+    """Fill the NaN gaps of ``values``: ``null`` keeps them, ``previous`` carries
+    the last value forward and ``linear`` interpolates between neighbours."""
+    present = ~np.isnan(values)
+    if strategy == 'previous':
+        index = np.where(present, np.arange(len(values)), -1)
+        index = np.maximum.accumulate(index)
+        return np.where(index >= 0, values[np.maximum(index, 0)], np.nan)
+    if strategy == 'linear' and present.any():
+        positions = np.arange(len(values))
+        filled = np.interp(positions, positions[present], values[present])
+        inside = (positions >= positions[present][0]) & (positions <= positions[present][-1])
+        return np.where(inside, filled, np.nan)
+    return values
+
+
+def resample(magnitude_id, start, end, interval, aggregate='avg', strategy='none'):
+    """Return ``[(bucket start, value)]`` of ``magnitude_id`` over ``[start, end)``."""
+    if aggregate not in AGGREGATES:
+        raise ValidationError('agg must be one of %s' % ', '.join(AGGREGATES))
+    if strategy not in FILLS:
+        raise ValidationError('fill must be one of %s' % ', '.join(FILLS))
+    origin, buckets = align(start, end, interval)
+    index = bucket(Metric.timestamp, origin, interval)
+    rows = db.session.query(index, AGGREGATES[aggregate](Metric.value)) \
+        .filter(Metric.magnitude_id == magnitude_id,
+                Metric.timestamp >= datetime.utcfromtimestamp(origin), Metric.timestamp < end) \
+        .group_by(index).all()
+    values = np.full(buckets, np.nan)
+    for i, value in rows:
+        if i is not None and 0 <= i < buckets and value is not None:
+            values[int(i)] = value
+    values = fill(values, strategy)
+    first = datetime.utcfromtimestamp(origin)
+    step = timedelta(seconds=interval)
+    return [(first + i * step, None if np.isnan(v) else float(v))
+            for i, v in enumerate(values) if strategy != 'none' or not np.isnan(v)]
+
+
+def _layer_type(layer, type):
+    if layer not in Magnitude.layer.type.enums:
+        raise ValidationError('layer must be one of %s' % ', '.join(Magnitude.layer.type.enums))
+    if type not in Magnitude.type.type.enums:
+        raise ValidationError('type must be one of %s' % ', '.join(Magnitude.type.type.enums))
+
+
+def spatial(user_id, vineyard_id, layer, type, start, end, interval, strategy='none'):
+    """Return ``[(bucket start, {avg, min, max, stddev, sensors})]`` across the
+    sensors of a vineyard for the magnitudes of one ``layer`` and ``type``."""
+    _layer_type(layer, type)
+    if strategy not in FILLS:
+        raise ValidationError('fill must be one of %s' % ', '.join(FILLS))
+    origin, buckets = align(start, end, interval)
+    index = bucket(Metric.timestamp, origin, interval).label('bucket')
+    per_sensor = db.session.query(index, func.avg(Metric.value).label('value')) \
+        .join(Magnitude, Metric.magnitude_id == Magnitude.id) \
+        .join(Sensor, Magnitude.sensor_id == Sensor.id) \
+        .filter(Magnitude.user_id == user_id, Magnitude.layer == layer, Magnitude.type == type,
+                Magnitude.deleted_at == None, Sensor.vineyard_id == vineyard_id,
+                Sensor.deleted_at == None,
+                Metric.timestamp >= datetime.utcfromtimestamp(origin), Metric.timestamp < end) \
+        .group_by(Magnitude.sensor_id, index).subquery()
+    value = per_sensor.c.value
+    rows = db.session.query(per_sensor.c.bucket, func.avg(value), func.min(value),
+                            func.max(value), func.avg(value * value), func.count(value)) \
+        .group_by(per_sensor.c.bucket).all()
+
+    columns = {name: np.full(buckets, np.nan) for name in ('avg', 'min', 'max', 'stddev')}
+    sensors = np.zeros(buckets, dtype=int)
+    for i, mean, low, high, square, count in rows:
+        if i is None or not 0 <= i < buckets:
+            continue
+        i = int(i)
+        columns['avg'][i], columns['min'][i], columns['max'][i] = mean, low, high
+        # population deviation from the mean square, clipped for rounding
+        columns['stddev'][i] = np.sqrt(max(square - mean * mean, 0.0))
+        sensors[i] = count
+    columns = {name: fill(values, strategy) for name, values in columns.items()}
+    first = datetime.utcfromtimestamp(origin)
+    step = timedelta(seconds=interval)
+    return [(first + i * step, dict({name: None if np.isnan(values[i]) else float(values[i])
+                                     for name, values in columns.items()},
+                                    sensors=int(sensors[i])))
+            for i in range(buckets) if strategy != 'none' or sensors[i]]
+
+
+def parse_args(args, default_range=timedelta(days=1)):
+    """Read ``start``, ``end``, ``interval``, ``agg`` and ``fill`` from request arguments."""
+    end = parse_timestamp(args.get('end'))
+    start = parse_timestamp(args['start']) if args.get('start') else end - default_range
+    if start >= end:
+        raise ValidationError('start must be before end')
+    return {'start': start, 'end': end, 'interval': parse_interval(args.get('interval', '1h')),
+            'aggregate': args.get('agg', 'avg'), 'strategy': args.get('fill', 'none')}
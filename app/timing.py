@@ -0,0 +1,121 @@
+"""Per request breakdown of where the time goes.
+
+A ``SERVER_TIMING_SAMPLE_RATE`` share of requests is timed with
+``perf_counter`` in phases: token verification (``auth``), the user lookup
+(``user``), SQL (``db``, the queries of the request outside those two
+phases, as the telemetry counts them), JSON encoding (``encode``) and the
+rest of the handler, which is mostly serialization (``app``). A timed
+response gets a ``Server-Timing`` header, shown by the browser developer
+tools, and the same numbers are logged as one JSON line per request.
+Requests that are not sampled only pay for one ``random()`` call and a few
+``g`` lookups.
+
+Streamed responses encode after the handler returns, so their encoding is
+not part of the breakdown.
+"""
+import json
+import random
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_request_context, request
+
+PHASES = ('auth', 'user', 'db', 'encode', 'app')
+
+DESCRIPTIONS = {
+    'auth': 'token verification',
+    'user': 'user lookup',
+    'db': 'SQL',
+    'encode': 'JSON encoding',
+    'app': 'handler and serialization',
+    'total': 'total',
+}
+
+
+def add(name, seconds):
+    """Add ``seconds`` to phase ``name`` of the current request, if it is timed."""
+    if has_request_context():
+        timings = g.get('server_timing')
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + seconds
+
+
+def _queries():
+    counters = g.get('telemetry_queries')
+    return tuple(counters) if counters is not None else (0, 0.0)
+
+
+@contextmanager
+def phase(name):
+    """Time the enclosed block as phase ``name`` of the current request.
+
+    The queries run inside the block are part of the phase, not of ``db``.
+    """
+    if g.get('server_timing') is None:
+        yield
+        return
+    started, queries = time.perf_counter(), _queries()
+    try:
+        yield
+    finally:
+        add(name, time.perf_counter() - started)
+        count, seconds = _queries()
+        inside = g.server_timing_queries
+        inside[0] += count - queries[0]
+        inside[1] += seconds - queries[1]
+
+
+def header(timings, queries=None):
+    """Format ``{phase: seconds}`` as a ``Server-Timing`` header value."""
+    metrics = []
+    for name in PHASES + ('total',):
+        if name in timings:
+            description = DESCRIPTIONS[name]
+            if name == 'db' and queries is not None:
+                description = '%d queries' % queries
+            metrics.append('%s;dur=%.3f;desc="%s"' % (name, timings[name] * 1000, description))
+    return ', '.join(metrics)
+
+
+class ServerTiming:
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self):
+        if random.random() < current_app.config['SERVER_TIMING_SAMPLE_RATE']:
+            g.server_timing = {}
+            g.server_timing_started = time.perf_counter()
+            # the queries counted in the phases
+            g.server_timing_queries = [0, 0.0]
+
+    def _after_request(self, response):
+        timings = g.pop('server_timing', None)
+        if timings is None:
+            return response
+        total = time.perf_counter() - g.server_timing_started
+        queries = None
+        # counted by the telemetry for the same request
+        counters = g.get('telemetry_queries')
+        if counters is not None:
+            inside = g.server_timing_queries
+            queries = counters[0] - inside[0]
+            timings['db'] = max(counters[1] - inside[1], 0.0)
+        timings['app'] = max(total - sum(timings.values()), 0.0)
+        timings['total'] = total
+        response.headers['Server-Timing'] = header(timings, queries)
+        user = g.get('current_user')
+        entry = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'user_id': getattr(user, 'id', None),
+            'queries': queries,
+        }
+        entry.update(('%s_ms' % name, round(seconds * 1000, 3))
+                     for name, seconds in timings.items())
+        current_app.logger.info('access %s', json.dumps(entry, sort_keys=True))
+        return response
+
+
+server_timing = ServerTiming()
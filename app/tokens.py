@@ -0,0 +1,113 @@
+import hashlib
+import time
+from flask import current_app
+from itsdangerous import JSONWebSignatureSerializer
+from sqlalchemy import event, inspect
+from . import db
+from .cache import TTLCache, channel, mark_stale, on_commit
+from .models import ApiToken
+
+_INVALID = (None, None)
+
+
+class _LiveTokens:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.ids = frozenset()
+        self.last_id = None
+        self.loaded_at = None
+
+    def stale(self):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at >= self.ttl
+
+    def reload(self):
+        self.ids = frozenset(i for i, in db.session.query(ApiToken.id)
+                             .filter(ApiToken.enabled == True))
+        # never lowered, deleting the newest token must not make it look new
+        self.last_id = max(self.last_id or 0,
+                           db.session.query(db.func.max(ApiToken.id)).scalar() or 0)
+        self.loaded_at = time.monotonic()
+
+    def __contains__(self, token_id):
+        # tokens created since the last reload are live until the next one
+        return token_id in self.ids or token_id > self.last_id
+
+
+class ApiTokenVerifier:
+    """Verifies gateway API tokens without a database round trip per call.
+
+    Signed tokens are resolved to ``(user_id, token_id)`` once and cached
+    by digest. Disabled and deleted tokens are rejected through the
+    in-memory set of enabled token ids, reloaded every
+    ``API_TOKEN_REVOCATION_TTL`` seconds, or as soon as any process on the
+    host publishes a change. Rejected tokens are remembered briefly in a
+    small cache of their own, so they never evict valid ones.
+    """
+
+    def init_app(self, app):
+        app.extensions['api_tokens'] = (
+            TTLCache(app.config['API_TOKEN_CACHE_SIZE'], app.config['API_TOKEN_CACHE_TTL']),
+            TTLCache(app.config['API_TOKEN_REJECTED_CACHE_SIZE'],
+                     app.config['API_TOKEN_REJECTED_CACHE_TTL']),
+            _LiveTokens(app.config['API_TOKEN_REVOCATION_TTL']),
+            channel(app, 'api_tokens'))
+
+    def _resolve(self, token):
+        s = JSONWebSignatureSerializer(current_app.config['SECRET_KEY'])
+        try:
+            data = s.loads(token)
+        except:
+            return _INVALID
+        user_id = data.get('id')
+        for token_id, timestamp in db.session.query(ApiToken.id, ApiToken.timestamp) \
+                .filter(ApiToken.user_id == user_id):
+            if str(timestamp) == data.get('timestamp'):
+                return user_id, token_id
+        return _INVALID
+
+    def verify(self, token):
+        """Return ``(user_id, token_id)`` for a valid token, ``(None, None)`` otherwise."""
+        verified, rejected, live, events = current_app.extensions['api_tokens']
+        if events.changed():
+            verified.clear()
+            live.reload()
+        elif live.stale():
+            live.reload()
+        digest = hashlib.sha256(token.encode('utf-8')).digest()
+        entry = verified.get(digest)
+        if entry is None:
+            if rejected.get(digest) is not None:
+                return _INVALID
+            entry = self._resolve(token)
+            if entry is _INVALID:
+                rejected.set(digest, True)
+                return _INVALID
+            verified.set(digest, entry)
+        if entry[1] not in live:
+            return _INVALID
+        return entry
+
+    def revocations_changed(self):
+        verified, _, live, events = current_app.extensions['api_tokens']
+        verified.clear()
+        live.loaded_at = None
+        events.publish()
+
+
+api_tokens = ApiTokenVerifier()
+
+
+@event.listens_for(ApiToken, 'after_update')
+def _api_token_updated(mapper, connection, target):
+    if inspect(target).attrs.enabled.history.has_changes():
+        mark_stale(target, 'api_tokens')
+
+
+@event.listens_for(ApiToken, 'after_delete')
+def _api_token_deleted(mapper, connection, target):
+    mark_stale(target, 'api_tokens')
+
+
+@on_commit('api_tokens')
+def _api_tokens_changed():
+    api_tokens.revocations_changed()
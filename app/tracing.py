@@ -0,0 +1,173 @@
+"""Query statistics by statement fingerprint, from engine events.
+
+Every query is timed, which costs two ``perf_counter`` calls, and logged
+when it takes ``SLOW_DB_QUERY_TIME`` or more. A ``QUERY_TRACE_SAMPLE_RATE``
+share of requests is traced further. Each statement of a traced request is
+reduced to a fingerprint, with literals and ``IN`` lists collapsed to
+``?``. Per fingerprint the tracer keeps a count, the total and maximum
+time, and a reservoir of durations for the 95th percentile. A fingerprint
+that runs more than ``QUERY_N_PLUS_ONE_THRESHOLD`` times in one request is
+reported as an N+1 pattern of its endpoint. Statistics are kept in memory
+per process and served on ``/api/v1/queries``.
+"""
+import random
+import re
+import time
+from collections import Counter, deque
+from datetime import datetime
+from functools import lru_cache
+from threading import Lock
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b', re.IGNORECASE)
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*\?\s*,)*\s*\?\s*\)', re.IGNORECASE)
+_PLACEHOLDER = re.compile(r'%\(\w+\)s|%s|:\w+|\$\d+')
+_SPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement):
+    """Return ``statement`` with its literals and parameters replaced by ``?``."""
+    statement = _STRING.sub('?', statement)
+    statement = _PLACEHOLDER.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    statement = _IN_LIST.sub('IN (?)', statement)
+    return _SPACE.sub(' ', statement).strip()
+
+
+class _Stats:
+    __slots__ = ('count', 'total', 'max', 'samples')
+
+    def __init__(self):
+        self.count, self.total, self.max, self.samples = 0, 0.0, 0.0, []
+
+    def add(self, duration, reservoir):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        if len(self.samples) < reservoir:
+            self.samples.append(duration)
+        else:
+            i = random.randrange(self.count)
+            if i < reservoir:
+                self.samples[i] = duration
+
+    def p95(self):
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))] if samples else 0.0
+
+
+class _Traces:
+    def __init__(self, config):
+        self.stats = {}
+        self.n_plus_one = {}
+        self.recent = deque(maxlen=100)
+        self.lock = Lock()
+        self.reservoir = config['QUERY_TRACE_RESERVOIR']
+        self.limit = config['QUERY_TRACE_MAX_FINGERPRINTS']
+
+    def add(self, key, duration):
+        with self.lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                if len(self.stats) >= self.limit:
+                    return
+                stats = self.stats[key] = _Stats()
+            stats.add(duration, self.reservoir)
+
+    def repeated(self, endpoint, key, count):
+        now = datetime.utcnow()
+        with self.lock:
+            entry = self.n_plus_one.setdefault((endpoint, key), {
+                'endpoint': endpoint, 'fingerprint': key, 'requests': 0, 'max_queries': 0})
+            entry['requests'] += 1
+            entry['max_queries'] = max(entry['max_queries'], count)
+            entry['last_seen'] = now
+            self.recent.append({'endpoint': endpoint, 'fingerprint': key, 'queries': count,
+                                'at': now})
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+            self.n_plus_one.clear()
+            self.recent.clear()
+
+
+class QueryTracer:
+    def __init__(self):
+        self.engines = set()
+
+    def init_app(self, app):
+        app.extensions['query_traces'] = _Traces(app.config)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _watch(self, engine):
+        if engine not in self.engines:
+            self.engines.add(engine)
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault('trace_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, many):
+        started = conn.info.get('trace_started')
+        if not started:
+            return
+        duration = time.perf_counter() - started.pop()
+        if not has_request_context():
+            return
+        config = current_app.config
+        if duration >= config['SLOW_DB_QUERY_TIME']:
+            current_app.logger.warning(
+                'Slow query: %s\nParameters: %s\nDuration: %fs\nEndpoint: %s\n'
+                % (statement, parameters, duration, request.endpoint))
+        counts = g.get('query_trace')
+        if counts is not None:
+            key = fingerprint(statement)
+            counts[key] += 1
+            current_app.extensions['query_traces'].add(key, duration)
+
+    def _before_request(self):
+        from . import db
+        self._watch(db.engine)
+        if random.random() < current_app.config['QUERY_TRACE_SAMPLE_RATE']:
+            g.query_trace = Counter()
+
+    def _after_request(self, response):
+        counts = g.pop('query_trace', None)
+        if counts:
+            threshold = current_app.config['QUERY_N_PLUS_ONE_THRESHOLD']
+            traces = current_app.extensions['query_traces']
+            for key, count in counts.items():
+                if count > threshold:
+                    traces.repeated(request.endpoint, key, count)
+        return response
+
+    def report(self, sort='total', limit=50):
+        """Return the busiest fingerprints and the N+1 patterns seen so far."""
+        traces = current_app.extensions['query_traces']
+        with traces.lock:
+            fingerprints = [{
+                'fingerprint': key,
+                'count': stats.count,
+                'total': round(stats.total, 6),
+                'mean': round(stats.total / stats.count, 6),
+                'p95': round(stats.p95(), 6),
+                'max': round(stats.max, 6)
+            } for key, stats in traces.stats.items()]
+            n_plus_one = sorted((dict(entry) for entry in traces.n_plus_one.values()),
+                                key=lambda e: e['last_seen'], reverse=True)
+            recent = list(traces.recent)
+        fingerprints.sort(key=lambda f: f[sort], reverse=True)
+        return {'fingerprints': fingerprints[:limit], 'n_plus_one': n_plus_one,
+                'recent_n_plus_one': recent[::-1]}
+
+    def reset(self):
+        current_app.extensions['query_traces'].reset()
+
+
+tracer = QueryTracer()
@@ -0,0 +1,34 @@
+from . import db
+
+
+def upsert(table, keys, rows):
+    """Insert ``rows`` into ``table``, replacing the rows with the same ``keys`` columns.
+
+    Uses the database's own upsert, so concurrent writers of the same key
+    never fail on the primary key.
+    """
+    if not rows:
+        return
+    columns = [c.name for c in table.columns if c.name not in keys]
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c[k] for k in keys],
+            set_={c: getattr(statement.excluded, c) for c in columns})
+    elif dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table)
+        statement = statement.on_duplicate_key_update(
+            **{c: getattr(statement.inserted, c) for c in columns})
+    elif dialect == 'sqlite':
+        statement = table.insert().prefix_with('OR REPLACE')
+    else:
+        for row in rows:
+            match = db.and_(*(table.c[k] == row[k] for k in keys))
+            if not db.session.execute(table.update().where(match).values(
+                    **{c: row[c] for c in columns})).rowcount:
+                db.session.execute(table.insert(), row)
+        return
+    db.session.execute(statement, rows)
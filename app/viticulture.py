@@ -0,0 +1,151 @@
+"""Heat accumulation from the sensors' air temperature.
+
+Daily minimum and maximum air temperatures (``Surface`` ``Temperature``
+magnitudes, UTC days) are aggregated in SQL and cached in
+``daily_temperatures``. Later requests only aggregate again the days since
+the last cached one, going back ``GDD_SETTLE_DAYS`` to take late readings
+in, so extending a season's series costs the new days only.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from . import db
+from .exceptions import ValidationError
+from .models import DailyTemperature, Magnitude, Metric
+
+# lowest Winkler index (degree days Celsius) of each region
+WINKLER_REGIONS = ((2222, 'V'), (1944, 'IV'), (1667, 'III'), (1389, 'II'), (0, 'I'))
+
+# Huglin day length coefficient by absolute latitude
+HUGLIN_COEFFICIENTS = ((48, 1.06), (46, 1.05), (44, 1.04), (42, 1.03), (40, 1.02), (0, 1.0))
+
+
+def refresh(sensor_ids):
+    """Bring the cached daily temperatures of ``sensor_ids`` up to date."""
+    if not sensor_ids:
+        return
+    cached = dict(db.session.query(DailyTemperature.sensor_id, func.max(DailyTemperature.day))
+                  .filter(DailyTemperature.sensor_id.in_(sensor_ids))
+                  .group_by(DailyTemperature.sensor_id))
+    settle = timedelta(days=current_app.config['GDD_SETTLE_DAYS'])
+    since = defaultdict(list)
+    for sensor_id in sensor_ids:
+        since[cached[sensor_id] - settle if sensor_id in cached else None].append(sensor_id)
+
+    conditions = []
+    for day, ids in since.items():
+        condition = Magnitude.sensor_id.in_(ids)
+        if day is not None:
+            condition = db.and_(condition, Metric.timestamp >= datetime.combine(day, time()))
+            DailyTemperature.query.filter(DailyTemperature.sensor_id.in_(ids),
+                                          DailyTemperature.day >= day) \
+                .delete(synchronize_session=False)
+        conditions.append(condition)
+
+    day = func.date(Metric.timestamp, type_=db.Date)
+    rows = db.session.query(Magnitude.sensor_id, day, func.min(Metric.value),
+                            func.max(Metric.value), func.count(Metric.id)) \
+        .select_from(Metric).join(Magnitude, Metric.magnitude_id == Magnitude.id) \
+        .filter(Magnitude.type == 'Temperature', Magnitude.layer == 'Surface',
+                Magnitude.deleted_at == None, db.or_(*conditions)) \
+        .group_by(Magnitude.sensor_id, day).all()
+    try:
+        if rows:
+            db.session.execute(DailyTemperature.__table__.insert(), [
+                {'sensor_id': sensor_id, 'day': day, 'tmin': tmin, 'tmax': tmax,
+                 'samples': samples}
+                for sensor_id, day, tmin, tmax, samples in rows])
+        db.session.commit()
+    except IntegrityError:
+        # a concurrent request cached the same days first
+        db.session.rollback()
+
+
+def daily(sensor_ids, start, end):
+    """Return ``[(day, tmin, tmax)]`` averaged over the sensors reporting each day."""
+    refresh(sensor_ids)
+    return db.session.query(DailyTemperature.day, func.avg(DailyTemperature.tmin),
+                            func.avg(DailyTemperature.tmax)) \
+        .filter(DailyTemperature.sensor_id.in_(sensor_ids),
+                DailyTemperature.day >= start, DailyTemperature.day <= end) \
+        .group_by(DailyTemperature.day).order_by(DailyTemperature.day).all()
+
+
+def season(day, latitude):
+    """Return the ``(start, huglin_end, end)`` dates of the growing season around ``day``.
+
+    April to October north of the equator, October to April south of it. A day
+    before the start belongs to the previous season.
+    """
+    if latitude is None or latitude >= 0:
+        year = day.year if day.month >= 4 else day.year - 1
+        return date(year, 4, 1), date(year, 9, 30), date(year, 10, 31)
+    year = day.year if day.month >= 7 else day.year - 1
+    return date(year, 10, 1), date(year + 1, 3, 31), date(year + 1, 4, 30)
+
+
+def huglin_coefficient(latitude):
+    latitude = abs(latitude or 0)
+    for lowest, coefficient in HUGLIN_COEFFICIENTS:
+        if latitude > lowest:
+            return coefficient
+    return 1.0
+
+
+def winkler_region(index):
+    for lowest, region in WINKLER_REGIONS:
+        if index >= lowest:
+            return region
+
+
+def heat_summary(sensor_ids, latitude, start=None, end=None, base=None):
+    """Daily and cumulative GDD from ``start`` to ``end`` plus the season's indices."""
+    end = end or datetime.utcnow().date()
+    season_start, huglin_end, season_end = season(end, latitude)
+    start = start or season_start
+    if start > end:
+        raise ValidationError('start must not be after end')
+    if base is None:
+        base = current_app.config['GDD_BASE_TEMPERATURE']
+    k = huglin_coefficient(latitude)
+
+    days, total, winkler, huglin = [], 0.0, 0.0, 0.0
+    for day, tmin, tmax in daily(sensor_ids, min(start, season_start), end):
+        mean = (tmin + tmax) / 2
+        if season_start <= day <= season_end:
+            winkler += max(0.0, mean - 10)
+        if season_start <= day <= huglin_end:
+            huglin += max(0.0, (mean - 10 + tmax - 10) / 2) * k
+        if day >= start:
+            gdd = max(0.0, mean - base)
+            total += gdd
+            days.append({'date': day, 'tmin': tmin, 'tmax': tmax,
+                         'gdd': round(gdd, 2), 'cumulative': round(total, 2)})
+    return {
+        'base': base,
+        'start': start,
+        'end': end,
+        'days': days,
+        'total': round(total, 2),
+        'winkler': {'index': round(winkler, 1), 'region': winkler_region(winkler)},
+        'huglin': round(huglin, 1)
+    }
+
+
+def parse_args(args):
+    """Read ``start``, ``end`` (YYYY-MM-DD) and ``base`` from request arguments."""
+    parsed = {}
+    for key in ('start', 'end'):
+        if args.get(key):
+            try:
+                parsed[key] = datetime.strptime(args[key], '%Y-%m-%d').date()
+            except ValueError:
+                raise ValidationError('%s must be a YYYY-MM-DD date' % key)
+    if args.get('base'):
+        try:
+            parsed['base'] = float(args['base'])
+        except ValueError:
+            raise ValidationError('base must be a number')
+    return parsed
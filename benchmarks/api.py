@@ -0,0 +1,223 @@
+"""Throughput, latency percentiles and queries per request of the main endpoints.
+
+Runs against a database filled by ``flask seed`` through ``flask bench``,
+in process with the Flask test client or, with ``--gunicorn``, over HTTP
+against a locally spawned gunicorn. Results can be saved as a JSON baseline
+and compared with a later run::
+
+    flask seed --days 30
+    flask bench --output baseline.json
+    flask bench --compare baseline.json
+
+Ingest requests add metrics, so reseed before comparing ingest numbers.
+"""
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import event
+from app import db
+from app.models import Magnitude, Metric, Sensor, User, Vineyard
+
+SCENARIOS = ('auth', 'ingest', 'metrics_first', 'metrics_deep', 'last_metrics',
+             'vineyard_tree', 'alerts')
+
+
+class Dataset:
+    """Ids of the benchmarked account, read once from the seeded database."""
+
+    def __init__(self, email, password):
+        user = User.query.filter_by(email=email).first()
+        if user is None:
+            raise LookupError('%s not found, run flask seed first' % email)
+        self.email, self.password = email, password
+        self.user_id = user.id
+        self.vineyard_ids = [v for v, in db.session.query(Vineyard.id).filter(
+            Vineyard.user_id == user.id, Vineyard.deleted_at == None).order_by(Vineyard.id)]
+        self.sensor_ids = [s for s, in db.session.query(Sensor.id).filter(
+            Sensor.user_id == user.id, Sensor.deleted_at == None).order_by(Sensor.id)]
+        self.magnitude_ids = [m for m, in db.session.query(Magnitude.id).filter(
+            Magnitude.user_id == user.id, Magnitude.deleted_at == None).order_by(Magnitude.id)]
+        if not self.magnitude_ids:
+            raise LookupError('%s has no magnitudes, run flask seed first' % email)
+        metrics = db.session.query(db.func.count(Metric.id)) \
+            .filter(Metric.magnitude_id == self.magnitude_ids[0]).scalar()
+        self.last_page = max(1, -(-metrics // current_app.config['ITEMS_PER_PAGE']))
+
+
+def request_for(name, dataset, i):
+    """Return the ``(method, path, body)`` of the ``i``-th request of a scenario."""
+    prefix = '/api/v1'
+    magnitude_id = dataset.magnitude_ids[i % len(dataset.magnitude_ids)]
+    if name == 'auth':
+        return 'POST', prefix + '/login', {'username': dataset.email,
+                                           'password': dataset.password}
+    if name == 'ingest':
+        now = datetime.utcnow()
+        return 'POST', prefix + '/metrics/', [
+            {'magnitude_id': m, 'value': 20 + (i + j) % 7,
+             'timestamp': (now + timedelta(microseconds=j)).isoformat() + 'Z'}
+            for j, m in enumerate(dataset.magnitude_ids[:100])]
+    if name == 'metrics_first':
+        return 'GET', prefix + '/magnitudes/%d/metrics/' % magnitude_id, None
+    if name == 'metrics_deep':
+        return 'GET', prefix + '/magnitudes/%d/metrics/?page=%d' % (
+            dataset.magnitude_ids[0], dataset.last_page), None
+    if name == 'last_metrics':
+        return 'GET', prefix + '/sensors/%d/last-metrics/' % \
+            dataset.sensor_ids[i % len(dataset.sensor_ids)], None
+    if name == 'vineyard_tree':
+        # walks the tree as the dashboard does: vineyards, their sensors, their magnitudes
+        tree = ['/vineyards/'] + ['/vineyards/%d/sensors/' % v for v in dataset.vineyard_ids] + \
+            ['/sensors/%d/magnitudes/' % s for s in dataset.sensor_ids]
+        return 'GET', prefix + tree[i % len(tree)], None
+    if name == 'alerts':
+        return 'GET', prefix + '/alerts/', None
+    raise ValueError('unknown scenario %s' % name)
+
+
+class TestClientTarget:
+    """Requests through the Flask test client, counting the queries of each."""
+    queries_counted = True
+
+    def __init__(self, app):
+        self.client = app.test_client()
+        self.engine = db.engine
+        self.queries = 0
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.queries += 1
+
+    def request(self, method, path, body, token):
+        headers = {'Accept': 'application/json'}
+        if token is not None:
+            headers['Authorization'] = 'Bearer ' + token
+        before = self.queries
+        response = self.client.open(path, method=method, headers=headers,
+                                    data=json.dumps(body) if body is not None else None,
+                                    content_type='application/json')
+        return response.status_code, response.get_data(), self.queries - before
+
+    def close(self):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+class GunicornTarget:
+    """Requests over one keep-alive connection to a gunicorn started for the run."""
+    queries_counted = False
+
+    def __init__(self, workers=2, port=None):
+        if port is None:
+            with socket.socket() as s:
+                s.bind(('127.0.0.1', 0))
+                port = s.getsockname()[1]
+        self.port = port
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'vifi:app', '-w', str(workers),
+             '-b', '127.0.0.1:%d' % port], env=os.environ.copy())
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.close()
+                    raise RuntimeError('gunicorn did not start')
+                time.sleep(0.1)
+        self.connection = http.client.HTTPConnection('127.0.0.1', port)
+
+    def request(self, method, path, body, token):
+        headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
+        if token is not None:
+            headers['Authorization'] = 'Bearer ' + token
+        self.connection.request(method, path, json.dumps(body) if body is not None else None,
+                                headers)
+        response = self.connection.getresponse()
+        return response.status, response.read(), None
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def login(target, dataset):
+    status, data, _ = target.request(*request_for('auth', dataset, 0), None)
+    if status != 200:
+        raise RuntimeError('login failed with status %d' % status)
+    return json.loads(data.decode())['jwt']
+
+
+def run_scenario(target, dataset, name, count, warmup, token):
+    latencies, queries, errors = [], [], 0
+    for i in range(-warmup, count):
+        method, path, body = request_for(name, dataset, i)
+        start = time.perf_counter()
+        status, _, executed = target.request(method, path, body,
+                                             None if name == 'auth' else token)
+        elapsed = time.perf_counter() - start
+        if i < 0:
+            continue
+        latencies.append(elapsed)
+        if executed is not None:
+            queries.append(executed)
+        if status >= 400:
+            errors += 1
+    latencies = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'requests': count,
+        'errors': errors,
+        'rps': round(count / (latencies.sum() / 1000), 1),
+        'p50': round(float(p50), 2),
+        'p95': round(float(p95), 2),
+        'p99': round(float(p99), 2),
+        'queries': round(float(np.mean(queries)), 1) if queries else None
+    }
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(target, dataset, scenarios=SCENARIOS, count=200, warmup=10):
+    token = login(target, dataset)
+    results = {name: run_scenario(target, dataset, name, count, warmup, token)
+               for name in scenarios}
+    return {
+        'commit': _commit(),
+        'created_at': datetime.utcnow().isoformat() + 'Z',
+        'target': type(target).__name__,
+        'database': db.engine.url.drivername,
+        'scenarios': results
+    }
+
+
+def report(result, baseline=None):
+    """Format ``result`` as a table, with the change against ``baseline`` if given."""
+    lines = ['%-16s %8s %8s %8s %8s %8s %7s' % ('scenario', 'req/s', 'p50 ms', 'p95 ms',
+                                                'p99 ms', 'queries', 'errors')]
+    for name, stats in result['scenarios'].items():
+        queries = '-' if stats['queries'] is None else '%.1f' % stats['queries']
+        lines.append('%-16s %8.1f %8.2f %8.2f %8.2f %8s %7d' % (
+            name, stats['rps'], stats['p50'], stats['p95'], stats['p99'], queries,
+            stats['errors']))
+        before = (baseline or {}).get('scenarios', {}).get(name)
+        if before:
+            changes = ['%s %+.0f%%' % (key, (stats[key] - before[key]) / before[key] * 100)
+                       for key in ('rps', 'p50', 'p95', 'p99') if before[key]]
+            if stats['queries'] is not None and before.get('queries') is not None:
+                changes.append('queries %+.1f' % (stats['queries'] - before['queries']))
+            lines.append('%-16s vs %s: %s' % ('', baseline.get('commit'), ', '.join(changes)))
+    return '\n'.join(lines)
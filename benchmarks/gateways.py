@@ -0,0 +1,285 @@
+"""Gateway traffic replay against a running server.
+
+Every gateway (the ``gateway`` of the seeded sensors) wakes once per
+``--period`` and posts one batch with the readings of all its magnitudes,
+authenticated with an API token in ``?token=`` as real gateways are. The
+wake times follow a burst shape:
+
+- ``sync``: every gateway wakes at the same instant, the worst case,
+- ``jitter``: each wake is delayed by up to ``--jitter`` seconds,
+- ``uniform``: wakes are spread evenly over the period,
+- ``replay``: offsets and gateways come from a recorded JSON lines file,
+  ``{"offset": seconds, "gateway": name, "readings": n}`` per line.
+
+Requests are sent by ``--concurrency`` asyncio clients over keep-alive
+connections. Latency is measured from the scheduled wake, so time spent
+queueing behind a saturated server counts. Run with::
+
+    flask seed --users 10 --sensors 20
+    gunicorn vifi:app -w 4 &
+    python -m benchmarks.gateways --url http://127.0.0.1:8000 --shape sync
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+import numpy as np
+from app import create_app, db
+from app.models import ApiToken, Magnitude, Metric, Sensor
+
+SHAPES = ('sync', 'jitter', 'uniform', 'replay')
+
+TOKEN_DESCRIPTION = 'gateway load generator'
+
+
+class Gateway:
+    def __init__(self, name, token, magnitude_ids):
+        self.name = name
+        self.token = token
+        self.magnitude_ids = magnitude_ids
+
+
+def load_gateways(limit=None):
+    """Return the gateways of the database with a token of their owner each."""
+    rows = db.session.query(Sensor.gateway, Sensor.user_id, Magnitude.id) \
+        .join(Magnitude, Magnitude.sensor_id == Sensor.id) \
+        .filter(Sensor.deleted_at == None, Magnitude.deleted_at == None) \
+        .order_by(Sensor.gateway, Magnitude.id).all()
+    grouped = defaultdict(list)
+    owners = {}
+    for gateway, user_id, magnitude_id in rows:
+        grouped[(gateway, user_id)].append(magnitude_id)
+        owners[user_id] = None
+    for user_id in owners:
+        token = ApiToken.query.filter_by(user_id=user_id, description=TOKEN_DESCRIPTION,
+                                         enabled=True).first()
+        if token is None:
+            token = ApiToken(user_id=user_id, description=TOKEN_DESCRIPTION)
+            db.session.add(token)
+            db.session.commit()
+        owners[user_id] = token.token
+    gateways = [Gateway(name, owners[user_id], ids)
+                for (name, user_id), ids in sorted(grouped.items())]
+    return gateways[:limit] if limit else gateways
+
+
+def schedule(gateways, shape, duration, period, jitter=0, seed=0, recording=None):
+    """Return the sorted ``(offset, gateway, readings)`` wakes of a run."""
+    rng = random.Random(seed)
+    wakes = []
+    if shape == 'replay':
+        by_name = {g.name: g for g in gateways}
+        for line in recording:
+            if line.strip():
+                wake = json.loads(line)
+                if wake['gateway'] in by_name and wake['offset'] < duration:
+                    wakes.append((wake['offset'], by_name[wake['gateway']],
+                                  wake.get('readings', 1)))
+        return sorted(wakes, key=lambda w: w[0])
+    for i, gateway in enumerate(gateways):
+        if shape == 'uniform':
+            phase = i * period / len(gateways)
+        elif shape == 'jitter':
+            phase = rng.uniform(0, jitter)
+        else:
+            phase = 0.0
+        offset = phase
+        while offset < duration:
+            wakes.append((offset, gateway, 1))
+            offset += period
+    return sorted(wakes, key=lambda w: w[0])
+
+
+def batch(gateway, readings, now, rng):
+    step = timedelta(seconds=1)
+    return [{'magnitude_id': m, 'value': round(rng.uniform(10, 30), 3),
+             'timestamp': (now - (readings - 1 - r) * step).isoformat() + 'Z'}
+            for r in range(readings) for m in gateway.magnitude_ids]
+
+
+class Connection:
+    """Minimal HTTP/1.1 client connection, reopened when the server closes it."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        data = json.dumps(body).encode()
+        self.writer.write(('%s %s HTTP/1.1\r\nHost: %s:%d\r\nContent-Type: application/json\r\n'
+                           'Content-Length: %d\r\n\r\n' % (method, path, self.host, self.port,
+                                                           len(data))).encode() + data)
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('connection closed by the server')
+        version, status = status_line.split()[:2]
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if 'content-length' in headers:
+            content = await self.reader.readexactly(int(headers['content-length']))
+            keep_alive = version == b'HTTP/1.1' and headers.get('connection') != 'close'
+        else:
+            content = await self.reader.read()
+            keep_alive = False
+        if not keep_alive:
+            self.close()
+        return int(status), content
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def _client(connection, queue, started, results, rng):
+    while True:
+        wake = await queue.get()
+        if wake is None:
+            queue.task_done()
+            return
+        offset, gateway, readings = wake
+        body = batch(gateway, readings, datetime.utcnow(), rng)
+        sent = time.perf_counter()
+        try:
+            status, content = await connection.request(
+                'POST', '/api/v1/metrics/?token=%s' % gateway.token, body)
+            rows = json.loads(content.decode()).get('count', 0) if status == 201 else 0
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+            connection.close()
+            status, rows = 'connection error', 0
+        done = time.perf_counter()
+        results.append({'offset': offset, 'status': status, 'rows': rows,
+                        'latency': done - (started + offset), 'service': done - sent,
+                        'done': done - started})
+        queue.task_done()
+
+
+async def replay(url, wakes, concurrency, speed=1.0, seed=0):
+    """Send ``wakes`` on time, ``speed`` times faster than scheduled, and return the results."""
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    queue = asyncio.Queue()
+    results = []
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    clients = [asyncio.ensure_future(_client(Connection(host, port), queue, started, results,
+                                             rng))
+               for _ in range(concurrency)]
+    for offset, gateway, readings in wakes:
+        offset /= speed
+        delay = started + offset - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        queue.put_nowait((offset, gateway, readings))
+    for _ in clients:
+        queue.put_nowait(None)
+    await asyncio.gather(*clients)
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed):
+    """Latency percentiles, errors and accepted rows per second of a run."""
+    if not results:
+        return {'requests': 0}
+    latency = np.array([r['latency'] for r in results]) * 1000
+    service = np.array([r['service'] for r in results]) * 1000
+    statuses = Counter(str(r['status']) for r in results)
+    errors = sum(count for status, count in statuses.items() if status != '201')
+    rows = sum(r['rows'] for r in results)
+    # accepted rows per second of wall clock, busiest second first
+    per_second = Counter()
+    for r in results:
+        per_second[int(r['done'])] += r['rows']
+    busy = sorted(per_second.values(), reverse=True)
+    return {
+        'requests': len(results),
+        'errors': errors,
+        'error_rate': round(errors / len(results), 4),
+        'statuses': dict(statuses),
+        'latency': dict(zip(('p50', 'p95', 'p99', 'max'), (
+            round(float(x), 2) for x in np.percentile(latency, [50, 95, 99, 100])))),
+        'service': dict(zip(('p50', 'p95', 'p99', 'max'), (
+            round(float(x), 2) for x in np.percentile(service, [50, 95, 99, 100])))),
+        'rows': rows,
+        'rows_per_second': round(rows / elapsed, 1) if elapsed else None,
+        'peak_rows_per_second': busy[0] if busy else 0,
+        'elapsed': round(elapsed, 3)
+    }
+
+
+def report(summary):
+    if not summary['requests']:
+        return 'no requests sent'
+    lines = ['requests: %(requests)d, errors: %(errors)d (%(error_rate).2f%%)' % dict(
+        summary, error_rate=summary['error_rate'] * 100),
+        'statuses: %s' % ', '.join('%s x%d' % s for s in sorted(summary['statuses'].items())),
+        'latency ms from wake: p50 %(p50).1f, p95 %(p95).1f, p99 %(p99).1f, max %(max).1f'
+        % summary['latency'],
+        'service ms: p50 %(p50).1f, p95 %(p95).1f, p99 %(p99).1f, max %(max).1f'
+        % summary['service'],
+        'rows written: %d in %.1fs, %.0f rows/s, peak %d rows/s' % (
+            summary['rows'], summary['elapsed'], summary['rows_per_second'] or 0,
+            summary['peak_rows_per_second'])]
+    if 'db_rows' in summary:
+        lines.append('metrics table grew by %d rows' % summary['db_rows'])
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--shape', choices=SHAPES, default='sync')
+    parser.add_argument('--recording', type=argparse.FileType('r'),
+                        help='JSON lines of wakes for --shape replay')
+    parser.add_argument('--gateways', type=int, default=None,
+                        help='Replay the first N gateways only.')
+    parser.add_argument('--period', type=float, default=600,
+                        help='Seconds between the wakes of a gateway.')
+    parser.add_argument('--duration', type=float, default=600,
+                        help='Scheduled seconds to replay.')
+    parser.add_argument('--jitter', type=float, default=30)
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Replay this many times faster than scheduled.')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Save the summary as JSON.')
+    args = parser.parse_args()
+    if args.shape == 'replay' and args.recording is None:
+        parser.error('--shape replay needs --recording')
+
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+    with app.app_context():
+        gateways = load_gateways(args.gateways)
+        if not gateways:
+            parser.error('no gateways found, run flask seed first')
+        wakes = schedule(gateways, args.shape, args.duration, args.period, args.jitter,
+                         args.seed, args.recording)
+        before = db.session.query(db.func.count(Metric.id)).scalar()
+        db.session.commit()
+        loop = asyncio.get_event_loop()
+        results, elapsed = loop.run_until_complete(
+            replay(args.url, wakes, args.concurrency, args.speed, args.seed))
+        summary = summarize(results, elapsed)
+        summary['db_rows'] = db.session.query(db.func.count(Metric.id)).scalar() - before
+    print('%d gateways, %d wakes, shape %s' % (len(gateways), len(wakes), args.shape))
+    print(report(summary))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(dict(summary, shape=args.shape, gateways=len(gateways)), f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
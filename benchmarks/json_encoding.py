@@ -0,0 +1,77 @@
+"""Encoding cost of the metric list and vineyard tree payloads per JSON backend.
+
+Run with ``python -m benchmarks.json_encoding [--metrics N] [--sensors N]``.
+"""
+import argparse
+import timeit
+from datetime import datetime, timedelta
+from app.encoders import get_encoder, orjson
+from flask.json import JSONEncoder as FlaskJSONEncoder
+
+
+def metric_list(count):
+    start = datetime(2018, 6, 1)
+    return {'prev': None, 'next': '/api/v1/metrics/?page=2', 'count': count, 'metrics': [{
+        'id': i,
+        'timestamp': start + timedelta(minutes=10 * i),
+        'value': str(20 + i % 7 * 0.25),
+        'magnitude_url': '/api/v1/magnitudes/%d' % (i % 3 + 1),
+    } for i in range(count)]}
+
+
+def vineyard_tree(sensors):
+    created_at = datetime(2018, 6, 1)
+    magnitude_id = 0
+    tree = []
+    for v in range(max(1, sensors // 50)):
+        vineyard = {'id': v, 'name': 'vineyard %d' % v, 'url': '/api/v1/vineyards/%d' % v,
+                    'user_url': '/api/v1/users/1', 'sensors_url': '/api/v1/vineyards/%d/sensors/' % v,
+                    'created_at': created_at, 'sensors': []}
+        for s in range(50):
+            magnitudes = []
+            for layer in ('Surface', 'Depth 1', 'Depth 2'):
+                magnitude_id += 1
+                magnitudes.append({
+                    'id': magnitude_id, 'sensor_id': s, 'layer': layer, 'type': 'Humidity',
+                    'url': '/api/v1/magnitudes/%d' % magnitude_id, 'user_url': '/api/v1/users/1',
+                    'sensor_url': '/api/v1/sensors/%d' % s,
+                    'metrics_url': '/api/v1/magnitudes/%d/metrics/' % magnitude_id,
+                    'created_at': created_at})
+            vineyard['sensors'].append({
+                'id': s, 'description': 'sensor %d' % s, 'latitude': '41.6', 'longitude': '1.8',
+                'gateway': 'gw', 'power_perc': '90.0', 'magnitudes': magnitudes,
+                'url': '/api/v1/sensors/%d' % s, 'user_url': '/api/v1/users/1',
+                'vineyard_url': '/api/v1/vineyards/%d' % v,
+                'magnitudes_url': '/api/v1/sensors/%d/magnitudes/' % s,
+                'created_at': created_at})
+        tree.append(vineyard)
+    return {'vineyards': tree, 'prev': None, 'next': None, 'count': len(tree)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--metrics', type=int, default=10000)
+    parser.add_argument('--sensors', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    encoders = [('flask default', FlaskJSONEncoder)]
+    backends = ['stdlib'] + (['orjson'] if orjson is not None else [])
+    for backend in backends:
+        for fmt in ('iso', 'epoch'):
+            encoders.append(('%s/%s' % (backend, fmt),
+                             get_encoder({'JSON_BACKEND': backend, 'JSON_DATETIME_FORMAT': fmt})))
+
+    payloads = [('metric list (%d)' % args.metrics, metric_list(args.metrics)),
+                ('vineyard tree (%d sensors)' % args.sensors, vineyard_tree(args.sensors))]
+    for name, payload in payloads:
+        print(name)
+        for encoder_name, encoder in encoders:
+            instance = encoder(sort_keys=True, separators=(',', ':'))
+            best = min(timeit.repeat(lambda: instance.encode(payload), number=1,
+                                     repeat=args.repeat))
+            print('  %-16s %8.2f ms' % (encoder_name, best * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Time spent evaluating alert rules per ingested batch.
+
+Run with ``python -m benchmarks.rules [--batch N] [--magnitudes N] [--rules N]``.
+"""
+import argparse
+import random
+import timeit
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.models import User, Vineyard, Sensor, Magnitude, AlertRule
+from app.rules import rules
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch', type=int, default=60)
+    parser.add_argument('--magnitudes', type=int, default=10)
+    parser.add_argument('--rules', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=1000)
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        u = User(email='bench@example.com', password='bench')
+        db.session.add(u)
+        db.session.commit()
+        v = Vineyard(name='bench', user_id=u.id)
+        db.session.add(v)
+        db.session.commit()
+        s = Sensor(description='bench', latitude=0, longitude=0, gateway='gw', power_perc=100,
+                   vineyard_id=v.id, user_id=u.id)
+        db.session.add(s)
+        db.session.commit()
+        magnitude_ids = []
+        for i in range(args.magnitudes):
+            m = Magnitude(layer='Surface', type='Temperature', sensor_id=s.id, user_id=u.id)
+            db.session.add(m)
+            db.session.commit()
+            magnitude_ids.append(m.id)
+            for kind in ('threshold', 'rate', 'duration')[:args.rules]:
+                db.session.add(AlertRule(kind=kind, comparison='above', value=1000, duration=600,
+                                         priority='Warning', user_id=u.id, magnitude_id=m.id))
+        db.session.add(AlertRule(kind='threshold', comparison='below', value=-1000,
+                                 priority='Warning', user_id=u.id, type='Temperature'))
+        db.session.commit()
+
+        rng = random.Random(0)
+        start = datetime(2018, 6, 1)
+        per_magnitude = max(1, args.batch // args.magnitudes)
+        batch = [(m, start + timedelta(minutes=10 * i), rng.uniform(0, 40))
+                 for m in magnitude_ids for i in range(per_magnitude)]
+        rules.evaluate(batch)
+        best = min(timeit.repeat(lambda: rules.evaluate(batch), number=args.repeat, repeat=5))
+        print('%d readings, %d magnitudes, %d rules each + 1 account rule: %.1f us/batch'
+              % (len(batch), args.magnitudes, args.rules, best / args.repeat * 1e6))
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
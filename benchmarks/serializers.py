@@ -0,0 +1,61 @@
+"""Per-item cost of the list serializers against the models' to_json.
+
+Run with ``python -m benchmarks.serializers [--items N] [--repeat N]``.
+"""
+import argparse
+import timeit
+from app import create_app, db, serializers
+from app.models import User, Vineyard, Sensor, Magnitude, Metric
+
+
+def populate(items):
+    u = User(email='bench@example.com', password='bench')
+    db.session.add(u)
+    db.session.commit()
+    v = Vineyard(name='bench', user_id=u.id)
+    db.session.add(v)
+    db.session.commit()
+    for i in range(items):
+        s = Sensor(description='sensor %d' % i, latitude=41.6, longitude=1.8, gateway='gw',
+                   power_perc=90, vineyard_id=v.id, user_id=u.id)
+        db.session.add(s)
+        db.session.flush()
+        for layer in ('Surface', 'Depth 1', 'Depth 2'):
+            m = Magnitude(layer=layer, type='Humidity', sensor_id=s.id, user_id=u.id)
+            db.session.add(m)
+            db.session.flush()
+            db.session.add(Metric(value=i, magnitude_id=m.id))
+    db.session.commit()
+
+
+def report(name, items, repeat, fn):
+    best = min(timeit.repeat(fn, number=1, repeat=repeat))
+    print('%-22s %8.1f us/item' % (name, best / items * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    with app.app_context(), app.test_request_context('/'):
+        db.create_all()
+        populate(args.items)
+        cases = [
+            ('sensors', Sensor, serializers.SENSOR_COLUMNS, serializers.sensors),
+            ('magnitudes', Magnitude, serializers.MAGNITUDE_COLUMNS, serializers.magnitudes),
+            ('metrics', Metric, serializers.METRIC_COLUMNS, serializers.metrics),
+        ]
+        for name, model, columns, serializer in cases:
+            items = model.query.count()
+            report(name + ' to_json', items, args.repeat,
+                   lambda: [o.to_json() for o in model.query.all()])
+            report(name + ' serializer', items, args.repeat,
+                   lambda: serializer(db.session.query(*columns).all()))
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
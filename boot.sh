@@ -1,13 +1,31 @@
 #!/bin/sh
+# ./boot.sh [web|worker|ingest]: the process this container runs, web by default
 source venv/bin/activate
 
-while true; do
-    flask deploy
-    if [[ "$?" == "0" ]]; then
-        break
-    fi
-    echo Deploy command failed, retrying in 5 secs...
-    sleep 5
-done
+case "${1:-web}" in
+    web)
+        while true; do
+            flask deploy
+            if [[ "$?" == "0" ]]; then
+                break
+            fi
+            echo Deploy command failed, retrying in 5 secs...
+            sleep 5
+        done
 
-exec gunicorn -b :5000 --access-logfile - --error-logfile - vifi:app
+        # telemetry files of the previous workers
+        rm -rf "${TELEMETRY_DIR:-tmp/telemetry}"
+
+        exec gunicorn -b :5000 --access-logfile - --error-logfile - vifi:app
+        ;;
+    worker)
+        exec flask worker
+        ;;
+    ingest)
+        exec python vifi_ingest.py
+        ;;
+    *)
+        echo "Unknown process type $1, expected web, worker or ingest"
+        exit 1
+        ;;
+esac
@@ -15,11 +15,83 @@ class Config:
     MAIL_SENDER = 'Vi-Fi Admin <vifi@example.com>'
     ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL')
     ITEMS_PER_PAGE = 100
+    MAX_ITEMS_PER_PAGE = 10000
+    # 'auto' uses orjson when it is installed, 'stdlib' forces the json module
+    JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+    # 'http' (RFC 1123 date, what the frontend parses), 'iso' (ISO-8601, UTC)
+    # or 'epoch' (Unix seconds)
+    JSON_DATETIME_FORMAT = os.environ.get('JSON_DATETIME_FORMAT', 'http')
     SSL_REDIRECT = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_RECORD_QUERIES = True
+    SQLALCHEMY_RECORD_QUERIES = False
     SLOW_DB_QUERY_TIME = 0.5
+    # share of requests whose queries are fingerprinted
+    QUERY_TRACE_SAMPLE_RATE = float(os.environ.get('QUERY_TRACE_SAMPLE_RATE', '0.1'))
+    QUERY_N_PLUS_ONE_THRESHOLD = 10
+    QUERY_TRACE_RESERVOIR = 256
+    QUERY_TRACE_MAX_FINGERPRINTS = 1000
+    # share of requests answered with a Server-Timing header and an access log line
+    SERVER_TIMING_SAMPLE_RATE = float(os.environ.get('SERVER_TIMING_SAMPLE_RATE', '0.05'))
+    ALERT_COALESCE_WINDOW = int(os.environ.get('ALERT_COALESCE_WINDOW', '3600'))
+    SENSOR_EXPECTED_INTERVAL = 600
+    SENSOR_STALE_FACTOR = 3
+    LOW_BATTERY_THRESHOLD = 20
+    PURGE_CHUNK_SIZE = int(os.environ.get('PURGE_CHUNK_SIZE', '10000'))
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+    # per job type limit, overriding the one the handler registers with
+    JOB_CONCURRENCY = {}
+    JOB_LEASE = 300
+    JOB_RETRY_DELAY = 30
+    JOB_POLL_INTERVAL = 1
+    # job type -> seconds between runs
+    JOB_SCHEDULE = {'fleet_scan': 900, 'purge': 86400, 'export_expiry': 3600,
+                    'risk_update': 3600}
+    EXPORT_DIR = os.environ.get('EXPORT_DIR') or os.path.join(basedir, 'tmp', 'exports')
+    EXPORT_TTL = int(os.environ.get('EXPORT_TTL', '86400'))
+    EXPORT_CHUNK_SIZE = 10000
+    GDD_BASE_TEMPERATURE = 10
+    # cached days that are aggregated again to take late readings in
+    GDD_SETTLE_DAYS = 2
+    LEAF_WETNESS_HUMIDITY = 90
+    LEAF_WETNESS_DEW_SPREAD = 2
+    MILDEW_DEGREE_HOURS = 50
+    RISK_LOOKBACK_HOURS = 48
+    ANOMALY_WINDOW = 100
+    ANOMALY_MIN_SAMPLES = 10
+    ANOMALY_MIN_STD = 0.1
+    ANOMALY_SPIKE_SIGMA = 4
+    ANOMALY_OFFSET_COUNT = 3
+    ANOMALY_FLATLINE_COUNT = 12
+    ANOMALY_PERSIST_INTERVAL = 60
+    SOIL_WETTING_THRESHOLD = 2
+    SOIL_PROFILE_CACHE_SIZE = 100000
+    SOIL_PROFILE_CACHE_TTL = 3600
+    PROFILER_DIR = os.environ.get('PROFILER_DIR') or os.path.join(basedir, 'tmp', 'profiles')
+    # signal sent to a worker to profile it for PROFILER_DURATION seconds
+    PROFILER_SIGNAL = os.environ.get('PROFILER_SIGNAL', 'SIGUSR2')
+    PROFILER_DURATION = 30
+    PROFILER_MAX_DURATION = 600
+    PROFILER_INTERVAL = 0.005
+    # per process telemetry files, summed on scrape; cleared on restart
+    TELEMETRY_DIR = os.environ.get('TELEMETRY_DIR') or os.path.join(basedir, 'tmp', 'telemetry')
+    TELEMETRY_FLUSH_INTERVAL = 1
+    # vifi_ingest.py: committer threads, rows per commit and queued rows before a 503
+    INGEST_POOL_SIZE = int(os.environ.get('INGEST_POOL_SIZE', '4'))
+    INGEST_MAX_BATCH = 5000
+    INGEST_MAX_PENDING = 100000
+    INGEST_MAX_BODY = 1024 * 1024
+    INGEST_COMMIT_DELAY = 0.002
+    INGEST_KEEPALIVE_TIMEOUT = 75
     CORS_HEADERS = 'Content-Type'
+    CACHE_CHANNEL_DIR = os.environ.get('CACHE_CHANNEL_DIR') or \
+        os.path.join(basedir, 'tmp', 'channels')
+    IDENTITY_CACHE_SIZE = 4096
+    IDENTITY_CACHE_TTL = 60
+    API_TOKEN_CACHE_SIZE = 10000
+    API_TOKEN_CACHE_TTL = 3600
+    API_TOKEN_REVOCATION_TTL = 30
+    API_TOKEN_REJECTED_CACHE_SIZE = 1024
+    API_TOKEN_REJECTED_CACHE_TTL = 10
 
     @staticmethod
     def init_app(app):
@@ -28,6 +100,8 @@ class Config:
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    QUERY_TRACE_SAMPLE_RATE = 1.0
+    SERVER_TIMING_SAMPLE_RATE = 1.0
     SQLALCHEMY_DATABASE_URI = os.environ.get('DEV_DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'data-dev.sqlite')
 
@@ -37,6 +111,11 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or \
         'sqlite://'
     WTF_CSRF_ENABLED = False
+    CACHE_CHANNEL_DIR = None
+    PROFILER_SIGNAL = None
+    TELEMETRY_DIR = None
+    QUERY_TRACE_SAMPLE_RATE = 1.0
+    SERVER_TIMING_SAMPLE_RATE = 1.0
 
 
 class ProductionConfig(Config):
@@ -84,6 +163,7 @@ class HerokuConfig(ProductionConfig):
         file_handler = StreamHandler()
         file_handler.setLevel(logging.INFO)
         app.logger.addHandler(file_handler)
+        app.logger.setLevel(logging.INFO)
 
 
 class DockerConfig(ProductionConfig):
@@ -97,6 +177,7 @@ class DockerConfig(ProductionConfig):
         file_handler = StreamHandler()
         file_handler.setLevel(logging.INFO)
         app.logger.addHandler(file_handler)
+        app.logger.setLevel(logging.INFO)
 
 
 config = {
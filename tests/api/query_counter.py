@@ -0,0 +1,29 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+
+
+class QueryCounter:
+    """Statements run against an engine while the counter is active."""
+
+    def __init__(self):
+        self.statements = []
+
+    def __len__(self):
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __str__(self):
+        return '\n'.join('%d. %s' % (i, ' '.join(s.split()))
+                         for i, s in enumerate(self.statements, 1))
+
+
+@contextmanager
+def count_queries(engine):
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter._record)
@@ -0,0 +1,91 @@
+import json
+from app.models import Alert
+from .test_base_api import BaseAPITestCase
+
+
+class AlertRulesAPITestCase(BaseAPITestCase):
+    def new_alert_rule(self, headers, **fields):
+        return self.client.post(
+            '/api/v1/alert-rules/',
+            headers=headers,
+            data=json.dumps(fields))
+
+    def test_reader_cant_create_alert_rule(self):
+        response = self.new_alert_rule(self.get_reader_headers(), kind='threshold',
+                                       comparison='above', value=30)
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_alert_rule(self):
+        response = self.new_alert_rule(self.get_writer_headers(), kind='sometimes',
+                                       comparison='above', value=30)
+        self.assertEqual(response.status_code, 400)
+
+    def test_account_wide_rule_needs_a_type(self):
+        response = self.new_alert_rule(self.get_writer_headers(), kind='threshold',
+                                       comparison='above', value=30)
+        self.assertEqual(response.status_code, 400)
+        response = self.new_alert_rule(self.get_writer_headers(), kind='threshold',
+                                       comparison='above', value=30, type='Temperature',
+                                       layer='Roof')
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_edit(self):
+        response = self.new_alert_rule(self.get_writer_headers(), kind='threshold',
+                                       comparison='above', value=30, type='Temperature')
+        rule = json.loads(response.get_data(as_text=True))
+        for fields in ({'value': None}, {'priority': 'Panic'}, {'enabled': 'no'}):
+            response = self.client.put('/api/v1/alert-rules/%d' % rule['id'],
+                                       headers=self.get_writer_headers(),
+                                       data=json.dumps(fields))
+            self.assertEqual(response.status_code, 400)
+        response = self.client.put('/api/v1/alert-rules/%d' % rule['id'],
+                                   headers=self.get_writer_headers(),
+                                   data=json.dumps({'value': 35, 'enabled': False}))
+        self.assertEqual(response.status_code, 200)
+        rule = json.loads(response.get_data(as_text=True))
+        self.assertEqual(rule['value'], 35)
+        self.assertFalse(rule['enabled'])
+
+    def test_cant_create_rule_on_others_magnitude(self):
+        response = self.new_alert_rule(self.get_admin_headers(), kind='threshold',
+                                       comparison='above', value=30,
+                                       magnitude_id=self.magnitude.id)
+        self.assertEqual(response.status_code, 403)
+
+    def test_batch_ingest_raises_alerts(self):
+        response = self.new_alert_rule(self.get_writer_headers(), kind='threshold',
+                                       comparison='above', value=30, priority='Danger',
+                                       magnitude_id=self.magnitude.id)
+        self.assertEqual(response.status_code, 201)
+        rule = json.loads(response.get_data(as_text=True))
+
+        response = self.client.post(
+            '/api/v1/metrics/',
+            headers=self.get_writer_headers(),
+            data=json.dumps([
+                {'magnitude_id': self.magnitude.id, 'value': 25,
+                 'timestamp': '2018-06-01T10:00:00Z'},
+                {'magnitude_id': self.magnitude.id, 'value': 32.5,
+                 'timestamp': '2018-06-01T10:10:00Z'}]))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(response.get_data(as_text=True))['count'], 2)
+
+        response = self.client.get('/api/v1/alerts/', headers=self.get_writer_headers())
+        alerts = json.loads(response.get_data(as_text=True))['alerts']
+        self.assertEqual(len(alerts), 1)
+        self.assertEqual(alerts[0]['origin'], 'rule:%d' % rule['id'])
+        self.assertEqual(alerts[0]['priority'], 'Danger')
+
+    def test_delete_alert_rule(self):
+        response = self.new_alert_rule(self.get_writer_headers(), kind='threshold',
+                                       comparison='above', value=30, type='Temperature')
+        rule = json.loads(response.get_data(as_text=True))
+        response = self.client.delete('/api/v1/alert-rules/%d' % rule['id'],
+                                      headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(
+            '/api/v1/metrics/',
+            headers=self.get_writer_headers(),
+            data=json.dumps({'magnitude_id': self.magnitude.id, 'value': 40}))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Alert.query.count(), 0)
@@ -0,0 +1,27 @@
+import json
+from .test_base_api import BaseAPITestCase
+
+
+class AlertsAPITestCase(BaseAPITestCase):
+    def new_alert(self, **fields):
+        return self.client.post(
+            '/api/v1/alerts/',
+            headers=self.get_writer_headers(),
+            data=json.dumps(fields))
+
+    def test_new_alert(self):
+        response = self.new_alert(content='Low battery', priority='Warning', origin='gateway')
+        self.assertEqual(response.status_code, 201)
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual(json_response['occurrences'], 1)
+
+    def test_alerts_are_coalesced(self):
+        for i in range(3):
+            response = self.new_alert(content='Frost', priority='Danger', origin='gateway',
+                                      group='vineyard:%d' % self.vineyard.id)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get('/api/v1/alerts/', headers=self.get_writer_headers())
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual(json_response['count'], 1)
+        self.assertEqual(json_response['alerts'][0]['occurrences'], 3)
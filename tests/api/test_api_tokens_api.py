@@ -0,0 +1,83 @@
+import json
+from app import db
+from app.models import ApiToken
+from .test_base_api import BaseAPITestCase
+
+
+class ApiTokensAPITestCase(BaseAPITestCase):
+    def new_api_token(self):
+        response = self.client.post(
+            '/api/v1/api-tokens/',
+            headers=self.get_admin_headers(),
+            data=json.dumps({'description': 'gateway'}))
+        self.assertEqual(response.status_code, 201)
+        return json.loads(response.get_data(as_text=True))
+
+    def test_new_api_token(self):
+        json_response = self.new_api_token()
+        self.assertEqual(json_response['description'], 'gateway')
+        self.assertTrue(json_response['enabled'])
+        api_token = ApiToken.query.get(json_response['id'])
+        self.assertEqual(api_token.token, json_response['token'])
+
+    def test_authenticate_with_api_token(self):
+        token = self.new_api_token()['token']
+        response = self.client.get('/api/v1/users?token=' + token)
+        self.assertEqual(response.status_code, 200)
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual(json_response['id'], self.admin_user.id)
+
+    def test_bad_api_token(self):
+        token = self.new_api_token()['token']
+        response = self.client.get('/api/v1/users?token=' + token[:-2])
+        self.assertEqual(response.status_code, 401)
+
+    def test_disabled_api_token_is_revoked(self):
+        json_token = self.new_api_token()
+        response = self.client.get('/api/v1/users?token=' + json_token['token'])
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.put(
+            '/api/v1/api-tokens/%d' % json_token['id'],
+            headers=self.get_admin_headers(),
+            data=json.dumps({'enabled': False}))
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get('/api/v1/users?token=' + json_token['token'])
+        self.assertEqual(response.status_code, 401)
+
+    def test_deleted_api_token_is_revoked(self):
+        json_token = self.new_api_token()
+        response = self.client.get('/api/v1/users?token=' + json_token['token'])
+        self.assertEqual(response.status_code, 200)
+
+        db.session.delete(ApiToken.query.get(json_token['id']))
+        db.session.commit()
+
+        response = self.client.get('/api/v1/users?token=' + json_token['token'])
+        self.assertEqual(response.status_code, 401)
+
+    def test_token_deleted_on_another_host_is_revoked(self):
+        json_token = self.new_api_token()
+        response = self.client.get('/api/v1/users?token=' + json_token['token'])
+        self.assertEqual(response.status_code, 200)
+
+        # no commit hook runs here, as on another host
+        db.session.execute(ApiToken.__table__.delete()
+                           .where(ApiToken.__table__.c.id == json_token['id']))
+        db.session.commit()
+        self.app.extensions['api_tokens'][2].loaded_at = None
+
+        response = self.client.get('/api/v1/users?token=' + json_token['token'])
+        self.assertEqual(response.status_code, 401)
+
+    def test_rejected_tokens_are_cached_apart(self):
+        token = self.new_api_token()['token']
+        response = self.client.get('/api/v1/users?token=' + token)
+        self.assertEqual(response.status_code, 200)
+        verified, rejected, _, _ = self.app.extensions['api_tokens']
+        for i in range(3):
+            response = self.client.get('/api/v1/users?token=bad%d' % i)
+            self.assertEqual(response.status_code, 401)
+        self.assertEqual(len(verified), 1)
+        self.assertEqual(len(rejected), 3)
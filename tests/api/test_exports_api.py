@@ -0,0 +1,79 @@
+import json
+import shutil
+import tempfile
+from datetime import datetime
+from app import db, jobs
+from app.models import Metric, Export
+from .test_base_api import BaseAPITestCase
+
+
+class ExportsAPITestCase(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config['EXPORT_DIR'] = tempfile.mkdtemp()
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.app.config['EXPORT_DIR'])
+
+    def test_export(self):
+        for i in range(100):
+            db.session.add(Metric(magnitude_id=self.magnitude.id, value=i,
+                                  timestamp=datetime(2018, 6, 1, 0, i // 60, i % 60)))
+        db.session.commit()
+
+        response = self.client.post(
+            '/api/v1/exports/',
+            headers=self.get_writer_headers(),
+            data=json.dumps({'vineyard_id': self.vineyard.id}))
+        self.assertEqual(response.status_code, 202)
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual(json_response['status'], 'pending')
+        self.assertIsNone(json_response['download_url'])
+        url = response.headers['Location']
+
+        export = Export.query.get(json_response['id'])
+        self.assertTrue(jobs.execute(export.job_id))
+
+        response = self.client.get(url, headers=self.get_writer_headers())
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual(json_response['status'], 'ready')
+        self.assertEqual(json_response['rows'], 100)
+
+        response = self.client.get(json_response['download_url'],
+                                   headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        body = response.get_data()
+        response.close()
+        self.assertEqual(len(body), json_response['size'])
+
+        headers = self.get_writer_headers()
+        headers['Range'] = 'bytes=10-19'
+        response = self.client.get(json_response['download_url'], headers=headers)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.get_data(), body[10:20])
+        response.close()
+
+        response = self.client.get(json_response['download_url'],
+                                   headers=self.get_reader_headers())
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.delete(url, headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(json_response['download_url'],
+                                   headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 410)
+
+    def test_bad_export(self):
+        response = self.client.post(
+            '/api/v1/exports/',
+            headers=self.get_writer_headers(),
+            data=json.dumps({'format': 'xlsx'}))
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(
+            '/api/v1/exports/',
+            headers=self.get_reader_headers(),
+            data=json.dumps({'vineyard_id': self.vineyard.id}))
+        self.assertEqual(response.status_code, 403)
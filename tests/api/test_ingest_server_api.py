@@ -0,0 +1,87 @@
+import asyncio
+import json
+from datetime import datetime
+from app import db
+from app.ingest_server import IngestServer
+from app.models import ApiToken, Metric, Sensor
+from benchmarks.gateways import Connection
+from .test_base_api import BaseAPITestCase
+
+
+class IngestServerTestCase(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        # the in-memory test database has a single connection
+        self.app.config['INGEST_POOL_SIZE'] = 1
+        self.token = ApiToken(user_id=self.writer_user.id, description='gateway')
+        self.reader_token = ApiToken(user_id=self.reader_user.id, description='gateway')
+        db.session.add_all([self.token, self.reader_token])
+        db.session.commit()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server = IngestServer(self.app)
+        server = self.loop.run_until_complete(self.server.start('127.0.0.1', 0))
+        self.port = server.sockets[0].getsockname()[1]
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.server.close())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        super().tearDown()
+
+    def post(self, connection, body, token=None, method='POST', path='/api/v1/metrics/'):
+        if token is not None:
+            path += '?token=' + token
+        status, content = self.loop.run_until_complete(connection.request(method, path, body))
+        return status, json.loads(content.decode())
+
+    def batch(self, *values):
+        return [{'magnitude_id': self.magnitude.id, 'value': value,
+                 'timestamp': '2018-06-01T10:%02d:00Z' % i} for i, value in enumerate(values)]
+
+    def test_ingest(self):
+        connection = Connection('127.0.0.1', self.port)
+        status, body = self.post(connection, self.batch(1, 2), self.token.token)
+        self.assertEqual(status, 201)
+        self.assertEqual(body, {'count': 2})
+        # keep-alive: the same connection serves the next batch
+        writer = connection.writer
+        status, body = self.post(connection, self.batch(3), self.token.token)
+        self.assertEqual(status, 201)
+        self.assertIs(connection.writer, writer)
+        connection.close()
+
+        self.assertEqual(Metric.query.filter_by(magnitude_id=self.magnitude.id).count(), 3)
+        db.session.expire_all()
+        self.assertEqual(Sensor.query.get(self.sensor.id).last_seen_at,
+                         datetime(2018, 6, 1, 10, 1))
+
+    def test_errors(self):
+        connection = Connection('127.0.0.1', self.port)
+        status, body = self.post(connection, self.batch(1))
+        self.assertEqual(status, 401)
+        status, body = self.post(connection, self.batch(1), 'not-a-token')
+        self.assertEqual(status, 401)
+        status, body = self.post(connection, self.batch(1), self.reader_token.token)
+        self.assertEqual(status, 403)
+        status, body = self.post(connection, [{'magnitude_id': self.magnitude.id}],
+                                 self.token.token)
+        self.assertEqual(status, 400)
+        self.assertEqual(body['message'], 'metric does not have a value')
+        status, body = self.post(connection, None, self.token.token, method='GET')
+        self.assertEqual(status, 405)
+        status, body = self.post(connection, None, self.token.token, path='/api/v1/sensors/')
+        self.assertEqual(status, 404)
+        connection.close()
+        self.assertEqual(Metric.query.count(), 0)
+
+    def test_group_commit(self):
+        connections = [Connection('127.0.0.1', self.port) for _ in range(10)]
+        requests = [c.request('POST', '/api/v1/metrics/?token=' + self.token.token,
+                              self.batch(i)) for i, c in enumerate(connections)]
+        results = self.loop.run_until_complete(asyncio.gather(*requests))
+        for connection in connections:
+            connection.close()
+        self.assertEqual([status for status, _ in results], [201] * 10)
+        self.assertEqual(Metric.query.count(), 10)
+        self.assertLess(self.server.groups, 10)
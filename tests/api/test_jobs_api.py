@@ -0,0 +1,63 @@
+import json
+from app import db, jobs
+from app.models import Job
+from .test_base_api import BaseAPITestCase
+
+
+class JobsAPITestCase(BaseAPITestCase):
+    def test_delete_enqueues_purge(self):
+        response = self.client.delete(
+            '/api/v1/sensors/%d' % self.sensor.id,
+            headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 200)
+        response = self.client.delete(
+            '/api/v1/vineyards/%d' % self.vineyard.id,
+            headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Job.query.filter_by(type='purge', status='queued').count(), 1)
+
+    def test_get_job(self):
+        job = jobs.enqueue('purge', user_id=self.writer_user.id)
+        db.session.commit()
+
+        response = self.client.get(
+            '/api/v1/jobs/%d' % job.id,
+            headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 200)
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual(json_response['status'], 'queued')
+        self.assertEqual(json_response['progress'],
+                         {'stage': None, 'done': None, 'total': None})
+
+        response = self.client.get(
+            '/api/v1/jobs/%d' % job.id,
+            headers=self.get_reader_headers())
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.get(
+            '/api/v1/jobs/',
+            headers=self.get_writer_headers())
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual(json_response['count'], 1)
+
+    def test_new_job(self):
+        response = self.client.post(
+            '/api/v1/jobs/',
+            headers=self.get_admin_headers(),
+            data=json.dumps({'type': 'fleet_scan', 'priority': 5}))
+        self.assertEqual(response.status_code, 202)
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual(json_response['priority'], 5)
+        self.assertTrue(response.headers['Location'].endswith(json_response['url']))
+
+        response = self.client.post(
+            '/api/v1/jobs/',
+            headers=self.get_admin_headers(),
+            data=json.dumps({'type': 'nope'}))
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(
+            '/api/v1/jobs/',
+            headers=self.get_writer_headers(),
+            data=json.dumps({'type': 'fleet_scan'}))
+        self.assertEqual(response.status_code, 403)
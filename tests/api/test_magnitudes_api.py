@@ -1,6 +1,7 @@
 import unittest
 import json
 import re
+from datetime import datetime, timedelta
 from base64 import b64encode
 from app import create_app, db
 from app.models import User, Role, Vineyard, Sensor, Magnitude, Metric
@@ -174,3 +175,24 @@ class MagnitudesAPITestCase(BaseAPITestCase):
         json_response = json.loads(response.get_data(as_text=True))
         self.assertEqual(json_response['count'], 1)
         self.assertEqual(json_response['metrics'][0]['id'], me.id)
+
+    def test_magnitude_series(self):
+        start = datetime(2018, 6, 1)
+        for minutes, value in ((10, 10), (190, 40)):
+            db.session.add(Metric(value=value, magnitude_id=self.magnitude.id,
+                                  timestamp=start + timedelta(minutes=minutes)))
+        db.session.commit()
+
+        response = self.client.get(
+            '/api/v1/magnitudes/%d/metrics/?interval=1h&fill=linear'
+            '&start=2018-06-01T00:00:00Z&end=2018-06-01T04:00:00Z' % self.magnitude.id,
+            headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 200)
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual(json_response['interval'], 3600)
+        self.assertEqual([p['value'] for p in json_response['points']], [10, 20, 30, 40])
+
+        response = self.client.get(
+            '/api/v1/magnitudes/%d/metrics/?interval=1h&agg=median' % self.magnitude.id,
+            headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,55 @@
+import json
+import shutil
+import tempfile
+from app.profiler import profiler
+from .test_base_api import BaseAPITestCase
+
+
+class ProfilerAPITestCase(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config['PROFILER_DIR'] = tempfile.mkdtemp()
+
+    def tearDown(self):
+        profiler.stop()
+        shutil.rmtree(self.app.config['PROFILER_DIR'])
+        super().tearDown()
+
+    def test_profiler(self):
+        response = self.client.post(
+            '/api/v1/profiler', headers=self.get_admin_headers(),
+            data=json.dumps({'duration': 60, 'endpoint': 'api.get_users'}))
+        self.assertEqual(response.status_code, 202)
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertTrue(json_response['running'])
+        self.assertEqual(json_response['endpoint'], 'api.get_users')
+
+        response = self.client.get('/api/v1/users', headers=self.get_admin_headers())
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.delete('/api/v1/profiler', headers=self.get_admin_headers())
+        self.assertEqual(response.status_code, 200)
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertFalse(json_response['running'])
+
+        response = self.client.get('/api/v1/profiler', headers=self.get_admin_headers())
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual(len(json_response['profiles']), 1)
+
+        response = self.client.get('/api/v1/profiler/%s' % json_response['profiles'][0],
+                                   headers=self.get_admin_headers())
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+        response = self.client.get('/api/v1/profiler/passwd', headers=self.get_admin_headers())
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid(self):
+        for fields in ({'duration': 0}, {'duration': 'long'}, {'endpoint': 'api.nothing'}):
+            response = self.client.post('/api/v1/profiler', headers=self.get_admin_headers(),
+                                        data=json.dumps(fields))
+            self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/v1/profiler', headers=self.get_writer_headers(),
+                                    data=json.dumps({}))
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,50 @@
+import json
+from app import db
+from app.models import Sensor
+from .test_base_api import BaseAPITestCase
+
+
+class QueriesAPITestCase(BaseAPITestCase):
+    def test_n_plus_one(self):
+        self.app.config['QUERY_N_PLUS_ONE_THRESHOLD'] = 3
+        for i in range(5):
+            db.session.add(Sensor(description='s', latitude=0, longitude=0, gateway='gw',
+                                  power_perc=100, vineyard_id=self.vineyard.id,
+                                  user_id=self.writer_user.id))
+        db.session.commit()
+
+        # the vineyard's json loads the magnitudes of each sensor in turn
+        response = self.client.put('/api/v1/vineyards/%d' % self.vineyard.id,
+                                   headers=self.get_writer_headers(),
+                                   data=json.dumps({'name': 'renamed'}))
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get('/api/v1/queries?sort=count',
+                                   headers=self.get_admin_headers())
+        self.assertEqual(response.status_code, 200)
+        json_response = json.loads(response.get_data(as_text=True))
+        top = json_response['fingerprints'][0]
+        self.assertEqual(top['count'], 6)
+        self.assertIn('FROM magnitudes', top['fingerprint'])
+        self.assertLessEqual(top['p95'], top['max'])
+        pattern, = json_response['n_plus_one']
+        self.assertEqual(pattern['endpoint'], 'api.edit_vineyard')
+        self.assertEqual(pattern['max_queries'], 6)
+        self.assertEqual(pattern['fingerprint'], top['fingerprint'])
+
+        response = self.client.delete('/api/v1/queries', headers=self.get_admin_headers())
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual(json_response['n_plus_one'], [])
+
+    def test_sampling(self):
+        self.app.config['QUERY_TRACE_SAMPLE_RATE'] = 0
+        response = self.client.get('/api/v1/vineyards/', headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/v1/queries', headers=self.get_admin_headers())
+        self.assertEqual(json.loads(response.get_data(as_text=True))['fingerprints'], [])
+
+    def test_permissions(self):
+        response = self.client.get('/api/v1/queries', headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get('/api/v1/queries?sort=name', headers=self.get_admin_headers())
+        self.assertEqual(response.status_code, 400)
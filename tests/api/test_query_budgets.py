@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models import Alert, Magnitude, Metric, Sensor, Vineyard
+from .query_counter import count_queries
+from .test_base_api import BaseAPITestCase
+
+# the fleet is grown to each size in turn, budgets must hold at all of them
+FLEET_SIZES = (1, 5, 20)
+
+# endpoint -> most queries a call may run, authentication included
+BUDGETS = {
+    'GET /vineyards/': 4,
+    'GET /users/{user}/vineyards': 5,
+    'GET /vineyards/{vineyard}': 3,
+    'GET /vineyards/{vineyard}/sensors/': 4,
+    'GET /sensors/': 3,
+    'GET /sensors/{sensor}': 2,
+    'GET /sensors/{sensor}/magnitudes/': 3,
+    'GET /sensors/{sensor}/last-metrics/': 2,
+    'GET /magnitudes/': 2,
+    'GET /magnitudes/{magnitude}': 1,
+    'GET /magnitudes/{magnitude}/metrics/': 3,
+    'GET /metrics/': 2,
+    'GET /alerts/': 2,
+}
+
+
+class QueryBudgetTestCase(BaseAPITestCase):
+    def grow(self, size):
+        """Give the writer ``size`` vineyards, sensors per vineyard, magnitudes on the
+        first sensor and metrics per magnitude."""
+        user_id = self.writer_user.id
+        start = datetime(2018, 6, 1)
+        while Vineyard.query.filter_by(user_id=user_id).count() < size:
+            db.session.add(Vineyard(name='v', user_id=user_id))
+            db.session.commit()
+        for vineyard in Vineyard.query.filter_by(user_id=user_id):
+            while vineyard.sensors.count() < size:
+                sensor = Sensor(description='s', latitude=0, longitude=0, gateway='gw',
+                                power_perc=100, vineyard_id=vineyard.id, user_id=user_id)
+                db.session.add(sensor)
+                db.session.commit()
+                for layer in ('Surface', 'Depth 1', 'Depth 2'):
+                    db.session.add(Magnitude(layer=layer, type='Humidity', sensor_id=sensor.id,
+                                             user_id=user_id))
+                db.session.commit()
+        while self.sensor.magnitudes.count() < size:
+            db.session.add(Magnitude(layer='Surface', type='Temperature', sensor_id=self.sensor.id,
+                                     user_id=user_id))
+            db.session.commit()
+        for magnitude in Magnitude.query.filter_by(user_id=user_id):
+            for i in range(magnitude.metrics.count(), size):
+                db.session.add(Metric(value=i, magnitude_id=magnitude.id,
+                                      timestamp=start + timedelta(minutes=10 * i)))
+        while Alert.query.filter_by(user_id=user_id).count() < size:
+            db.session.add(Alert(content='a', acknowledged=False, user_id=user_id,
+                                 priority='Warning'))
+        db.session.commit()
+
+    def test_budgets(self):
+        headers = self.get_writer_headers()
+        ids = {'user': self.writer_user.id, 'vineyard': self.vineyard.id,
+               'sensor': self.sensor.id, 'magnitude': self.magnitude.id}
+        # the first call of a test also loads the identity cache
+        self.client.get('/api/v1/users', headers=headers)
+        for size in FLEET_SIZES:
+            self.grow(size)
+            for endpoint, budget in BUDGETS.items():
+                method, path = endpoint.split()
+                with self.subTest(endpoint=endpoint, fleet=size), \
+                        count_queries(db.engine) as queries:
+                    response = self.client.open('/api/v1' + path.format(**ids), method=method,
+                                                headers=headers)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertLessEqual(len(queries), budget, '\n' + str(queries))
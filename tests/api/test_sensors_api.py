@@ -1,9 +1,10 @@
 import unittest
 import json
 import re
+from datetime import datetime, timedelta
 from base64 import b64encode
 from app import create_app, db
-from app.models import User, Role, Vineyard, Sensor, Magnitude
+from app.models import User, Role, Vineyard, Sensor, Magnitude, Metric
 from .test_base_api import BaseAPITestCase
 
 
@@ -183,3 +184,96 @@ class SensorsAPITestCase(BaseAPITestCase):
         json_response = json.loads(response.get_data(as_text=True))
         self.assertEqual(json_response['count'], 1)
         self.assertEqual(json_response['magnitudes'][0]['id'], m.id)
+
+    def test_get_sensors_by_status(self):
+        now = datetime.utcnow()
+        s1 = Sensor(description='foo', latitude=0, longitude=0, gateway='asd',
+                    power_perc=5, vineyard_id=self.vineyard.id, user_id=self.admin_user.id,
+                    last_seen_at=now, stale_at=now + timedelta(hours=1))
+        s2 = Sensor(description='bar', latitude=0, longitude=0, gateway='asd',
+                    power_perc=90, vineyard_id=self.vineyard.id, user_id=self.admin_user.id,
+                    last_seen_at=now - timedelta(hours=2), stale_at=now - timedelta(hours=1))
+        db.session.add(s1)
+        db.session.add(s2)
+        db.session.commit()
+
+        response = self.client.get(
+            '/api/v1/sensors/?status=stale',
+            headers=self.get_admin_headers())
+        self.assertEqual(response.status_code, 200)
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual([s['id'] for s in json_response['sensors']], [s2.id])
+
+        response = self.client.get(
+            '/api/v1/sensors/?status=low-battery',
+            headers=self.get_admin_headers())
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual([s['id'] for s in json_response['sensors']], [s1.id])
+
+        response = self.client.get(
+            '/api/v1/sensors/?status=broken',
+            headers=self.get_admin_headers())
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_sensor_gdd(self):
+        for day, value in ((1, 5), (1, 25), (2, 10), (2, 30)):
+            db.session.add(Metric(magnitude_id=self.magnitude.id, value=value,
+                                  timestamp=datetime(2018, 4, day, 12)))
+        db.session.commit()
+
+        response = self.client.get(
+            '/api/v1/sensors/%d/gdd?end=2018-04-02&base=10' % self.sensor.id,
+            headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 200)
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual([d['cumulative'] for d in json_response['days']], [5, 15])
+        self.assertEqual(json_response['days'][0]['date'], '2018-04-01')
+
+        response = self.client.get(
+            '/api/v1/vineyards/%d/gdd?end=2018-04-02' % self.vineyard.id,
+            headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 200)
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual(json_response['total'], 15)
+
+        response = self.client.get(
+            '/api/v1/sensors/%d/gdd?end=April' % self.sensor.id,
+            headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(
+            '/api/v1/sensors/%d/gdd' % self.sensor.id,
+            headers=self.get_reader_headers())
+        self.assertEqual(response.status_code, 403)
+
+    def test_get_sensor_soil_profile(self):
+        for layer, value in (('Surface', 30), ('Depth 1', 20)):
+            m = Magnitude(layer=layer, type='Humidity', sensor_id=self.sensor.id,
+                          user_id=self.writer_user.id)
+            db.session.add(m)
+            db.session.commit()
+            db.session.add(Metric(magnitude_id=m.id, value=value,
+                                  timestamp=datetime(2018, 6, 1, 0, 30)))
+        db.session.commit()
+
+        response = self.client.get(
+            '/api/v1/sensors/%d/soil-profile?interval=1h'
+            '&start=2018-06-01T00:00:00Z&end=2018-06-01T02:00:00Z' % self.sensor.id,
+            headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 200)
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual(len(json_response['points']), 1)
+        self.assertEqual(json_response['points'][0]['layers'],
+                         {'Surface': 30, 'Depth 1': 20, 'Depth 2': None})
+        self.assertEqual(json_response['points'][0]['gradients'],
+                         {'Depth 1': -10, 'Depth 2': None})
+
+        response = self.client.get(
+            '/api/v1/sensors/%d/soil-profile?type=Wind' % self.sensor.id,
+            headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(
+            '/api/v1/sensors/%d/soil-profile' % self.sensor.id,
+            headers=self.get_reader_headers())
+        self.assertEqual(response.status_code, 403)
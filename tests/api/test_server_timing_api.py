@@ -0,0 +1,60 @@
+import json
+import re
+import time
+from flask import Response, g
+from app.timing import header, phase, server_timing
+from .test_base_api import BaseAPITestCase
+
+
+class ServerTimingAPITestCase(BaseAPITestCase):
+    def test_server_timing(self):
+        headers = self.get_writer_headers()
+        with self.assertLogs(self.app.logger, 'INFO') as logs:
+            response = self.client.get('/api/v1/vineyards/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        metrics = dict(re.match(r'(\w+);dur=([\d.]+);desc="([^"]*)"', m).group(1, 2)
+                       for m in response.headers['Server-Timing'].split(', '))
+        self.assertEqual(set(metrics), {'auth', 'user', 'db', 'encode', 'app', 'total'})
+        parts = sum(float(metrics[name]) for name in ('auth', 'user', 'db', 'encode', 'app'))
+        self.assertAlmostEqual(parts, float(metrics['total']), delta=0.01)
+        self.assertIn('queries"', response.headers['Server-Timing'])
+
+        entry = json.loads(logs.output[-1].split('access ', 1)[1])
+        self.assertEqual(entry['endpoint'], 'api.get_vineyards')
+        self.assertEqual(entry['status'], 200)
+        self.assertEqual(entry['user_id'], self.writer_user.id)
+        self.assertGreater(entry['queries'], 0)
+        self.assertGreaterEqual(entry['total_ms'], entry['db_ms'])
+
+    def test_phase_queries_are_not_counted_twice(self):
+        with self.app.test_request_context('/'):
+            g.telemetry_queries = [0, 0.0]
+            server_timing._before_request()
+            with phase('user'):
+                # a 50 ms lookup query
+                g.telemetry_queries[0] += 1
+                g.telemetry_queries[1] += 0.05
+                time.sleep(0.06)
+            g.telemetry_queries[0] += 2
+            g.telemetry_queries[1] += 0.01
+            time.sleep(0.02)
+            response = server_timing._after_request(Response())
+        metrics = dict(re.match(r'(\w+);dur=([\d.]+);desc="([^"]*)"', m).group(1, 3)
+                       for m in response.headers['Server-Timing'].split(', '))
+        self.assertEqual(metrics['db'], '2 queries')
+        durations = dict(re.match(r'(\w+);dur=([\d.]+)', m).groups()
+                         for m in response.headers['Server-Timing'].split(', '))
+        self.assertAlmostEqual(float(durations['db']), 10, places=3)
+        self.assertGreaterEqual(float(durations['user']), 60)
+        parts = sum(float(durations[name]) for name in ('user', 'db', 'app'))
+        self.assertAlmostEqual(parts, float(durations['total']), delta=0.01)
+
+    def test_sampling(self):
+        self.app.config['SERVER_TIMING_SAMPLE_RATE'] = 0
+        response = self.client.get('/api/v1/vineyards/', headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response.headers)
+
+    def test_header(self):
+        self.assertEqual(header({'db': 0.0125, 'total': 0.02}, queries=3),
+                         'db;dur=12.500;desc="3 queries", total;dur=20.000;desc="total"')
@@ -0,0 +1,29 @@
+import json
+from datetime import datetime, timedelta
+from .test_base_api import BaseAPITestCase
+
+
+class TelemetryAPITestCase(BaseAPITestCase):
+    def test_telemetry(self):
+        response = self.client.get('/api/v1/users', headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(
+            '/api/v1/metrics/', headers=self.get_writer_headers(),
+            data=json.dumps([{'magnitude_id': self.magnitude.id, 'value': 1,
+                              'timestamp': (datetime.utcnow() - timedelta(minutes=5))
+                              .isoformat() + 'Z'}]))
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get('/api/v1/telemetry', headers=self.get_admin_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        self.assertIn('vifi_http_requests_total{endpoint="api.get_users",method="GET",'
+                      'status="200"} 1\n', text)
+        self.assertIn('vifi_db_queries_per_request_count{endpoint="api.new_metric"} 1\n', text)
+        self.assertIn('vifi_ingest_rows_total 1\n', text)
+        self.assertIn('vifi_ingest_lag_seconds_bucket{le="600"} 1\n', text)
+        self.assertIn('vifi_job_queue_depth 0\n', text)
+
+        response = self.client.get('/api/v1/telemetry', headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 403)
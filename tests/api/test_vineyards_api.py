@@ -1,6 +1,7 @@
 import json
+from datetime import datetime, timedelta
 from app import db
-from app.models import User, Role, Vineyard, Sensor
+from app.models import User, Role, Vineyard, Sensor, Magnitude, Metric
 from .test_base_api import BaseAPITestCase
 
 
@@ -127,6 +128,23 @@ class VineyardsAPITestCase(BaseAPITestCase):
             headers=self.get_writer_headers())
         self.assertEqual(response.status_code, 404)
 
+    def test_delete_vineyard_hides_sensors(self):
+        response = self.client.delete(
+            '/api/v1/vineyards/%d' % self.vineyard.id,
+            headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(
+            '/api/v1/sensors/%d' % self.sensor.id,
+            headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get(
+            '/api/v1/magnitudes/',
+            headers=self.get_writer_headers())
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual(json_response['count'], 0)
+
     def test_cant_delete_vineyard_from_other_users(self):
         r = Role.query.filter_by(name='Writer').first()
         u = User(email='jack@example.com', password='cat', confirmed=True,
@@ -166,3 +184,67 @@ class VineyardsAPITestCase(BaseAPITestCase):
         json_response = json.loads(response.get_data(as_text=True))
         self.assertEqual(json_response['count'], 1)
         self.assertEqual(json_response['sensors'][0]['id'], s.id)
+
+    def test_get_vineyard_risk(self):
+        now = datetime.utcnow()
+        for type, value in (('Temperature', 20), ('Humidity', 95)):
+            m = Magnitude(layer='Surface', type=type, sensor_id=self.sensor.id,
+                          user_id=self.writer_user.id)
+            db.session.add(m)
+            db.session.commit()
+            db.session.add(Metric(magnitude_id=m.id, value=value,
+                                  timestamp=now - timedelta(hours=1)))
+        db.session.commit()
+
+        response = self.client.get(
+            '/api/v1/vineyards/%d/risk' % self.vineyard.id,
+            headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 200)
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual(len(json_response['hours']), 1)
+        self.assertTrue(json_response['hours'][0]['wet'])
+        self.assertEqual(json_response['hours'][0]['mildew'], 0.4)
+
+        response = self.client.get(
+            '/api/v1/vineyards/%d/risk' % self.vineyard.id,
+            headers=self.get_reader_headers())
+        self.assertEqual(response.status_code, 403)
+
+    def test_get_vineyard_aggregate(self):
+        start = datetime(2018, 6, 1)
+        other = Sensor(description='other', latitude=0, longitude=0, gateway='bar',
+                       power_perc=100, vineyard_id=self.vineyard.id,
+                       user_id=self.writer_user.id)
+        db.session.add(other)
+        db.session.commit()
+        for sensor, values in ((self.sensor, (10, 20)), (other, (30,))):
+            m = Magnitude(layer='Depth 1', type='Humidity', sensor_id=sensor.id,
+                          user_id=self.writer_user.id)
+            db.session.add(m)
+            db.session.commit()
+            for minutes, value in enumerate(values):
+                db.session.add(Metric(magnitude_id=m.id, value=value,
+                                      timestamp=start + timedelta(minutes=minutes)))
+        db.session.commit()
+
+        response = self.client.get(
+            '/api/v1/vineyards/%d/aggregate?layer=Depth 1&type=Humidity&interval=1h'
+            '&start=2018-06-01T00:00:00Z&end=2018-06-01T02:00:00Z&fill=null' % self.vineyard.id,
+            headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 200)
+        json_response = json.loads(response.get_data(as_text=True))
+        first, second = json_response['buckets']
+        self.assertEqual(first['sensors'], 2)
+        self.assertEqual((first['avg'], first['min'], first['max']), (22.5, 15, 30))
+        self.assertAlmostEqual(first['stddev'], 7.5)
+        self.assertEqual((second['sensors'], second['avg']), (0, None))
+
+        response = self.client.get(
+            '/api/v1/vineyards/%d/aggregate?layer=Depth 3&type=Humidity' % self.vineyard.id,
+            headers=self.get_writer_headers())
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(
+            '/api/v1/vineyards/%d/aggregate?type=Humidity' % self.vineyard.id,
+            headers=self.get_reader_headers())
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,57 @@
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.models import User, Alert
+
+
+class AlertModelTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        u = User(email='john@example.com', password='cat')
+        db.session.add(u)
+        db.session.commit()
+        self.user = u
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def raise_alert(self, content='Frost', priority='Danger', group_key='vineyard:1', **kwargs):
+        alert = Alert.raise_alert(content, self.user.id, priority, origin='rule:1',
+                                  group_key=group_key, **kwargs)
+        db.session.commit()
+        return alert
+
+    def test_coalesce(self):
+        first = self.raise_alert()
+        second = self.raise_alert(content='Frost again')
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(second.occurrences, 2)
+        self.assertEqual(second.content, 'Frost')
+        self.assertEqual(Alert.query.count(), 1)
+
+    def test_distinct_keys(self):
+        self.raise_alert()
+        self.raise_alert(priority='Warning')
+        self.raise_alert(group_key='vineyard:2')
+        self.raise_alert(group_key=None)
+        self.assertEqual(Alert.query.count(), 4)
+        self.assertEqual(self.raise_alert(group_key=None).occurrences, 2)
+
+    def test_acknowledged_alert_is_closed(self):
+        alert = self.raise_alert()
+        alert.acknowledged = True
+        db.session.commit()
+        self.assertNotEqual(self.raise_alert().id, alert.id)
+
+    def test_window(self):
+        alert = self.raise_alert()
+        alert.updated_at = datetime.utcnow() - timedelta(hours=2)
+        db.session.commit()
+        self.assertNotEqual(self.raise_alert().id, alert.id)
+        self.assertEqual(self.raise_alert(window=0).occurrences, 1)
+        self.assertEqual(Alert.query.count(), 3)
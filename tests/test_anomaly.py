@@ -0,0 +1,123 @@
+import statistics
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.anomaly import anomalies, check
+from app.ingest import ingest
+from app.models import User, Vineyard, Sensor, Magnitude, Metric, MagnitudeStats, Alert
+
+
+class AnomalyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        u = User(email='john@example.com', password='cat')
+        db.session.add(u)
+        db.session.commit()
+        v = Vineyard(name='foo', user_id=u.id)
+        db.session.add(v)
+        db.session.commit()
+        s = Sensor(description='foo', latitude=0, longitude=0, gateway='bar', power_perc=100,
+                   vineyard_id=v.id, user_id=u.id)
+        db.session.add(s)
+        db.session.commit()
+        m = Magnitude(layer='Surface', type='Temperature', sensor_id=s.id, user_id=u.id)
+        db.session.add(m)
+        db.session.commit()
+        self.user, self.magnitude = u, m
+        self.start = datetime(2018, 6, 1)
+        self.config = self.app.config
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def feed(self, values, state=None):
+        state = state or [0, 0.0, 0.0, None, None, 0, 0]
+        flags = [check(state, self.start + timedelta(minutes=i), v, self.config)
+                 for i, v in enumerate(values)]
+        return state, flags
+
+    def baseline(self, n=20):
+        return [20 + (i % 5) * 0.5 for i in range(n)]
+
+    def test_welford(self):
+        values = self.baseline()
+        state, flags = self.feed(values)
+        self.assertEqual(flags, [None] * 20)
+        self.assertEqual(state[0], 20)
+        self.assertAlmostEqual(state[1], statistics.mean(values))
+        self.assertAlmostEqual(state[2], statistics.pvariance(values))
+
+    def test_spike_and_offset(self):
+        state, flags = self.feed(self.baseline() + [35, 21])
+        self.assertEqual(flags[-2:], ['spike', None])
+        self.assertAlmostEqual(state[1], statistics.mean(self.baseline() + [21]))
+
+        state, flags = self.feed(self.baseline() + [35, 35.5, 35.2, 35.1])
+        self.assertEqual(flags[-4:], ['spike', 'spike', 'offset', None])
+        self.assertEqual(state[0], 2)
+
+    def test_flatline(self):
+        state, flags = self.feed([20] * 13)
+        self.assertEqual(flags[:11], [None] * 11)
+        self.assertEqual(flags[11:], ['flatline', 'flatline'])
+
+    def test_late_readings_are_skipped(self):
+        state, flags = self.feed(self.baseline())
+        self.assertIsNone(check(state, self.start, 100, self.config))
+        self.assertEqual(state[0], 20)
+        # a repeated timestamp is not a new reading either
+        self.assertIsNone(check(state, self.start + timedelta(minutes=19), 100, self.config))
+        self.assertEqual(state[0], 20)
+
+    def test_ingest(self):
+        self.app.config['ANOMALY_PERSIST_INTERVAL'] = 0
+        rows = [(self.magnitude.id, self.start + timedelta(minutes=i), v)
+                for i, v in enumerate(self.baseline() + [50])]
+        ingest(list(reversed(rows)))
+        db.session.commit()
+        flagged = Metric.query.filter(Metric.anomaly != None).all()
+        self.assertEqual([(m.value, m.anomaly) for m in flagged], [(50, 'spike')])
+        alert = Alert.query.one()
+        self.assertEqual(alert.origin, 'anomaly:spike')
+        self.assertEqual(alert.user_id, self.user.id)
+
+        stats = MagnitudeStats.query.get(self.magnitude.id)
+        self.assertEqual((stats.count, stats.outliers, stats.last_value), (20, 1, 50))
+
+        # a fresh process picks the state up from the table
+        anomalies.init_app(self.app)
+        ingest([(self.magnitude.id, self.start + timedelta(hours=1), 50)])
+        db.session.commit()
+        self.assertEqual(Metric.query.filter(Metric.anomaly != None).count(), 2)
+
+    def test_rollback(self):
+        self.app.config['ANOMALY_PERSIST_INTERVAL'] = 0
+        rows = [(self.magnitude.id, self.start + timedelta(minutes=i), v)
+                for i, v in enumerate(self.baseline())]
+        ingest(rows[:10])
+        db.session.commit()
+        # the batch is rolled back and then retried, as the ingest server does
+        ingest(rows[10:])
+        db.session.rollback()
+        ingest(rows[10:])
+        db.session.commit()
+        stats = MagnitudeStats.query.get(self.magnitude.id)
+        self.assertEqual((stats.count, stats.last_timestamp), (20, rows[-1][1]))
+        self.assertEqual(self.app.extensions['anomaly'].states[self.magnitude.id][0], 20)
+
+    def test_alerts_skip_magnitudes_without_owner(self):
+        orphan = Magnitude(layer='Surface', type='Humidity', sensor_id=self.magnitude.sensor_id)
+        db.session.add(orphan)
+        db.session.commit()
+        rows = [(self.magnitude.id, self.start, 50), (orphan.id, self.start, 50),
+                (12345, self.start, 50)]
+        alerts = anomalies.raise_alerts(rows, ['spike'] * 3)
+        db.session.commit()
+        self.assertEqual(len(alerts), 1)
+        self.assertEqual(Alert.query.one().user_id, self.user.id)
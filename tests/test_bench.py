@@ -0,0 +1,39 @@
+import unittest
+from datetime import datetime
+from app import create_app, db, fake
+from app.models import Role
+from benchmarks import api as api_bench
+
+
+class BenchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        fake.seed(users=1, vineyards=1, sensors=2, days=1, interval=3600,
+                  end=datetime(2018, 6, 2))
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_run(self):
+        dataset = api_bench.Dataset('seed0-0@example.com', 'password')
+        target = api_bench.TestClientTarget(self.app)
+        try:
+            result = api_bench.run(target, dataset, count=3, warmup=1)
+        finally:
+            target.close()
+        self.assertEqual(set(result['scenarios']), set(api_bench.SCENARIOS))
+        for name, stats in result['scenarios'].items():
+            self.assertEqual(stats['errors'], 0, name)
+            self.assertGreaterEqual(stats['queries'], 1, name)
+            self.assertLessEqual(stats['p50'], stats['p99'])
+        self.assertIn('metrics_deep', api_bench.report(result, result))
+
+    def test_missing_account(self):
+        with self.assertRaises(LookupError):
+            api_bench.Dataset('nobody@example.com', 'password')
@@ -0,0 +1,51 @@
+import json
+import unittest
+from datetime import datetime
+from app import create_app
+from app.encoders import JSONEncoder, OrjsonEncoder, get_encoder, stream_json, orjson
+
+
+class EncodersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def encode(self, backend, fmt, obj):
+        encoder = get_encoder({'JSON_BACKEND': backend, 'JSON_DATETIME_FORMAT': fmt})
+        return json.loads(encoder(sort_keys=True).encode(obj))
+
+    def test_datetime_formats(self):
+        dt = datetime(2018, 6, 2, 10, 37, 22, 161341)
+        self.assertEqual(self.encode('stdlib', 'iso', dt), '2018-06-02T10:37:22.161341+00:00')
+        self.assertEqual(self.encode('stdlib', 'epoch', dt), 1527935842.161341)
+        self.assertEqual(self.encode('stdlib', 'http', dt), 'Sat, 02 Jun 2018 10:37:22 GMT')
+
+    @unittest.skipIf(orjson is None, 'orjson is not installed')
+    def test_backends_agree(self):
+        obj = {'b': [datetime(2018, 6, 2, 10, 37, 22), datetime(2018, 6, 2, 10, 37, 22, 5)],
+               'a': 1.5, 'c': None}
+        for fmt in ('iso', 'epoch', 'http'):
+            self.assertEqual(self.encode('orjson', fmt, obj), self.encode('stdlib', fmt, obj))
+
+    def test_auto_backend(self):
+        encoder = get_encoder({'JSON_BACKEND': 'auto', 'JSON_DATETIME_FORMAT': 'iso'})
+        expected = OrjsonEncoder if orjson is not None else JSONEncoder
+        self.assertTrue(issubclass(encoder, expected))
+
+    def test_stream_json(self):
+        items = [{'id': i, 'timestamp': datetime(2018, 6, 2)} for i in range(25)]
+        fields = {'count': 25, 'next': None, 'prev': None}
+        with self.app.test_request_context('/'):
+            response = stream_json(self.app, fields, 'metrics', items, chunk_size=10)
+            streamed = response.get_data(as_text=True)
+            expected = self.app.json_encoder(separators=(',', ':'), sort_keys=True) \
+                .encode(dict(fields, metrics=items)) + '\n'
+        # same text, keys in the same order, as a single encode
+        self.assertEqual(streamed, expected)
+        with self.app.test_request_context('/'):
+            response = stream_json(self.app, {}, 'metrics', [])
+            self.assertEqual(json.loads(response.get_data(as_text=True)), {'metrics': []})
@@ -0,0 +1,91 @@
+import csv
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db, exports
+from app.models import User, Vineyard, Sensor, Magnitude, Metric, Export
+
+
+class ExportsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['EXPORT_DIR'] = tempfile.mkdtemp()
+        self.app.config['EXPORT_CHUNK_SIZE'] = 3
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        u = User(email='john@example.com', password='cat')
+        db.session.add(u)
+        db.session.commit()
+        self.user = u
+        self.vineyards = []
+        start = datetime(2018, 6, 1)
+        for name in ('foo', 'bar'):
+            v = Vineyard(name=name, user_id=u.id)
+            db.session.add(v)
+            db.session.commit()
+            s = Sensor(description='foo', latitude=0, longitude=0, gateway='bar', power_perc=100,
+                       vineyard_id=v.id, user_id=u.id)
+            db.session.add(s)
+            db.session.commit()
+            m = Magnitude(layer='Surface', type='Temperature', sensor_id=s.id, user_id=u.id)
+            db.session.add(m)
+            db.session.commit()
+            for i in range(5):
+                db.session.add(Metric(magnitude_id=m.id, value=i,
+                                      timestamp=start + timedelta(minutes=i)))
+            db.session.commit()
+            self.vineyards.append(v)
+        self.progress = []
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.app.config['EXPORT_DIR'])
+
+    def build(self, vineyard_id=None):
+        export = exports.request_export(self.user.id, vineyard_id)
+        db.session.commit()
+        exports.build(export.id, lambda *args: self.progress.append(args))
+        return Export.query.get(export.id)
+
+    def read(self, export):
+        with gzip.open(exports.path(export), 'rt') as f:
+            return list(csv.reader(f))
+
+    def test_account_export(self):
+        export = self.build()
+        self.assertEqual(export.status, 'ready')
+        self.assertEqual(export.rows, 10)
+        self.assertEqual(export.size, os.path.getsize(exports.path(export)))
+        self.assertEqual(export.job.type, 'export')
+        rows = self.read(export)
+        self.assertEqual(tuple(rows[0]), exports.COLUMNS)
+        self.assertEqual(len(rows), 11)
+        self.assertEqual(rows[1][:2], ['2018-06-01T00:00:00+00:00', '0.0'])
+        self.assertEqual(self.progress[-1], ('rows', 10, 10))
+        self.assertEqual(len(self.progress), 5)
+        self.assertEqual(os.listdir(self.app.config['EXPORT_DIR']), [export.filename])
+
+    def test_vineyard_export(self):
+        self.vineyards[1].sensors.first().soft_delete()
+        db.session.commit()
+        export = self.build(self.vineyards[0].id)
+        self.assertEqual(export.rows, 5)
+        self.assertEqual({row[6] for row in self.read(export)[1:]},
+                         {str(self.vineyards[0].id)})
+        self.assertEqual(self.build(self.vineyards[1].id).rows, 0)
+
+    def test_expire(self):
+        export = self.build()
+        filename = exports.path(export)
+        self.assertEqual(exports.expire(), {'expired': 0})
+        self.assertEqual(exports.expire(export.expires_at), {'expired': 1})
+        self.assertEqual(export.status, 'expired')
+        self.assertFalse(os.path.exists(filename))
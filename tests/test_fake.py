@@ -0,0 +1,59 @@
+import unittest
+from datetime import datetime
+from app import create_app, db, fake
+from app.models import User, Sensor, Magnitude, Metric, Permission, Role
+
+
+class FakeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def seed(self, seed=0):
+        counts = fake.seed(users=1, vineyards=1, sensors=2, days=2, interval=3600,
+                           end=datetime(2018, 6, 3), seed=seed, chunk_size=10)
+        values = db.session.query(Metric.timestamp, Metric.value) \
+            .order_by(Metric.magnitude_id, Metric.timestamp).all()
+        return counts, values
+
+    def test_seed(self):
+        counts, values = self.seed()
+        self.assertEqual(counts, {'users': 1, 'sensors': 2, 'metrics': 2 * 8 * 48})
+        self.assertEqual(Metric.query.count(), 2 * 8 * 48)
+        self.assertEqual(Magnitude.query.count(), 16)
+        self.assertEqual(values[0][0].date(), datetime(2018, 6, 1).date())
+        self.assertTrue(User.query.first().verify_password('password'))
+        self.assertTrue(User.query.first().can(Permission.WRITE))
+        self.assertEqual(Sensor.query.first().last_seen_at, datetime(2018, 6, 2, 23))
+
+        db.drop_all()
+        db.create_all()
+        Role.insert_roles()
+        self.assertEqual(self.seed()[1], values)
+        self.assertNotEqual(self.seed(seed=1)[1][len(values):], values)
+
+    def test_seed_again(self):
+        self.seed()
+        counts = fake.seed(users=2, vineyards=1, sensors=2, days=2, interval=3600,
+                           end=datetime(2018, 6, 3), chunk_size=10)
+        self.assertEqual(counts, {'users': 1, 'sensors': 2, 'metrics': 2 * 8 * 48})
+        self.assertEqual(User.query.count(), 2)
+        second = db.session.query(Metric.value).join(Magnitude).join(User) \
+            .filter(User.email == 'seed0-1@example.com').order_by(Metric.id).all()
+
+        db.drop_all()
+        db.create_all()
+        Role.insert_roles()
+        fake.seed(users=2, vineyards=1, sensors=2, days=2, interval=3600,
+                  end=datetime(2018, 6, 3), chunk_size=10)
+        self.assertEqual(db.session.query(Metric.value).join(Magnitude).join(User)
+                         .filter(User.email == 'seed0-1@example.com')
+                         .order_by(Metric.id).all(), second)
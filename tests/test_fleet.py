@@ -0,0 +1,88 @@
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db, fleet
+from app.ingest import ingest
+from app.models import User, Vineyard, Sensor, Magnitude, Alert
+
+
+class FleetTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        u = User(email='john@example.com', password='cat')
+        db.session.add(u)
+        db.session.commit()
+        v = Vineyard(name='foo', user_id=u.id)
+        db.session.add(v)
+        db.session.commit()
+        self.user, self.vineyard = u, v
+        self.start = datetime(2018, 6, 1)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_sensor(self, power_perc=100, expected_interval=None):
+        s = Sensor(description='foo', latitude=0, longitude=0, gateway='bar',
+                   power_perc=power_perc, expected_interval=expected_interval,
+                   vineyard_id=self.vineyard.id, user_id=self.user.id)
+        db.session.add(s)
+        db.session.commit()
+        m = Magnitude(layer='Surface', type='Temperature', sensor_id=s.id, user_id=self.user.id)
+        db.session.add(m)
+        db.session.commit()
+        return s, m
+
+    def test_ingest_touches_sensor(self):
+        s, m = self.add_sensor(expected_interval=60)
+        ingest([(m.id, self.start, 1), (m.id, self.start + timedelta(minutes=5), 2)])
+        db.session.commit()
+        db.session.refresh(s)
+        self.assertEqual(s.last_seen_at, self.start + timedelta(minutes=5))
+        self.assertEqual(s.stale_at, self.start + timedelta(minutes=8))
+
+        # late readings never move the marks backwards
+        ingest([(m.id, self.start, 3)])
+        db.session.commit()
+        db.session.refresh(s)
+        self.assertEqual(s.last_seen_at, self.start + timedelta(minutes=5))
+
+    def test_scan(self):
+        s1, m1 = self.add_sensor()
+        s2, m2 = self.add_sensor(power_perc=5)
+        ingest([(m1.id, self.start, 1), (m2.id, self.start + timedelta(hours=2), 1)])
+        db.session.commit()
+
+        counts = fleet.scan(self.start + timedelta(hours=1))
+        self.assertEqual(counts, {'stale': 1, 'low-battery': 1})
+        alerts = {a.origin: a for a in Alert.query}
+        self.assertEqual(set(alerts), {'fleet:stale', 'fleet:low-battery'})
+        self.assertEqual(alerts['fleet:stale'].group_key, 'vineyard:%d' % self.vineyard.id)
+
+        # a second scan inside the window updates the same alerts
+        fleet.scan(self.start + timedelta(hours=1))
+        self.assertEqual(Alert.query.count(), 2)
+        self.assertEqual(alerts['fleet:stale'].occurrences, 2)
+
+    def test_never_reported_sensors_go_stale(self):
+        s, m = self.add_sensor(expected_interval=60)
+        self.assertEqual(s.stale_at, s.created_at + timedelta(minutes=3))
+        self.assertEqual(fleet.scan(s.created_at + timedelta(minutes=2))['stale'], 0)
+        self.assertEqual(fleet.scan(s.created_at + timedelta(minutes=4))['stale'], 1)
+
+    def test_unmarked_sensors_are_marked(self):
+        s, m = self.add_sensor()
+        s.stale_at = None
+        db.session.commit()
+        self.assertEqual(fleet.scan(s.created_at + timedelta(hours=1))['stale'], 1)
+        self.assertEqual(s.stale_at, s.created_at + timedelta(minutes=30))
+
+    def test_deleted_sensors_are_ignored(self):
+        s, m = self.add_sensor(power_perc=5)
+        s.soft_delete()
+        db.session.commit()
+        self.assertEqual(fleet.scan(), {'stale': 0, 'low-battery': 0})
@@ -0,0 +1,70 @@
+import asyncio
+import io
+import json
+import unittest
+from benchmarks import gateways
+
+
+class GatewaysTestCase(unittest.TestCase):
+    def setUp(self):
+        self.gateways = [gateways.Gateway('gw-%d' % i, 'token%d' % i, [i * 10 + 1, i * 10 + 2])
+                         for i in range(4)]
+
+    def test_schedule(self):
+        wakes = gateways.schedule(self.gateways, 'sync', 1200, 600)
+        self.assertEqual([offset for offset, _, _ in wakes], [0] * 4 + [600] * 4)
+        wakes = gateways.schedule(self.gateways, 'uniform', 600, 600)
+        self.assertEqual([offset for offset, _, _ in wakes], [0, 150, 300, 450])
+        wakes = gateways.schedule(self.gateways, 'jitter', 600, 600, jitter=30)
+        self.assertTrue(all(0 <= offset < 30 for offset, _, _ in wakes))
+        self.assertEqual(wakes, gateways.schedule(self.gateways, 'jitter', 600, 600, jitter=30))
+        recording = io.StringIO('{"offset": 5, "gateway": "gw-1", "readings": 3}\n'
+                                '{"offset": 1, "gateway": "gw-9"}\n'
+                                '{"offset": 2, "gateway": "gw-0"}\n')
+        wakes = gateways.schedule(self.gateways, 'replay', 600, 600, recording=recording)
+        self.assertEqual([(o, g.name, r) for o, g, r in wakes], [(2, 'gw-0', 1), (5, 'gw-1', 3)])
+
+    def test_replay(self):
+        received = []
+
+        async def handle(reader, writer):
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header == b'\r\n':
+                        break
+                    name, _, value = header.decode().partition(':')
+                    headers[name.lower()] = value.strip()
+                body = json.loads((await reader.readexactly(int(headers['content-length']))))
+                received.append((line.split()[1].decode(), body))
+                status = b'201 CREATED' if len(received) % 4 else b'500 INTERNAL SERVER ERROR'
+                content = json.dumps({'count': len(body)}).encode()
+                writer.write(b'HTTP/1.1 ' + status + b'\r\nContent-Length: %d\r\n\r\n'
+                             % len(content) + content)
+                await writer.drain()
+            writer.close()
+
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(asyncio.start_server(handle, '127.0.0.1', 0))
+        port = server.sockets[0].getsockname()[1]
+        wakes = gateways.schedule(self.gateways, 'sync', 1200, 600)
+        try:
+            results, elapsed = loop.run_until_complete(gateways.replay(
+                'http://127.0.0.1:%d' % port, wakes, concurrency=2, speed=1000))
+        finally:
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+            loop.close()
+
+        self.assertEqual(len(received), 8)
+        self.assertTrue(received[0][0].startswith('/api/v1/metrics/?token=token'))
+        self.assertEqual(len(received[0][1]), 2)
+        summary = gateways.summarize(results, elapsed)
+        self.assertEqual(summary['requests'], 8)
+        self.assertEqual(summary['errors'], 2)
+        self.assertEqual(summary['rows'], 12)
+        self.assertIn('rows written: 12', gateways.report(summary))
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from app import create_app, db
+from app.cache import TTLCache, Channel
+from app.identity import identities
+from app.models import User, Role, Permission
+
+
+class TTLCacheTestCase(unittest.TestCase):
+    def test_expiry(self):
+        now = [0]
+        cache = TTLCache(maxsize=10, ttl=5, timer=lambda: now[0])
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        now[0] = 5
+        self.assertIsNone(cache.get('a'))
+
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+
+    def test_channel(self):
+        path = os.path.join(tempfile.mkdtemp(), 'identity')
+        publisher, subscriber = Channel(path), Channel(path)
+        self.assertFalse(subscriber.changed())
+        publisher.publish()
+        self.assertTrue(subscriber.changed())
+        self.assertFalse(subscriber.changed())
+        self.assertFalse(publisher.changed())
+
+
+class IdentityCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        r = Role.query.filter_by(name='Writer').first()
+        u = User(email='john@example.com', password='cat', confirmed=True, role=r)
+        db.session.add(u)
+        db.session.commit()
+        self.user = u
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_identity_permissions(self):
+        identity = identities.by_email('john@example.com')
+        self.assertEqual(identity.id, self.user.id)
+        self.assertTrue(identity.can(Permission.WRITE))
+        self.assertFalse(identity.is_administrator())
+        self.assertEqual(identity.name, self.user.name)
+        self.assertIsNone(identities.by_email('nobody@example.com'))
+
+    def test_cached_by_email_and_id(self):
+        identities.by_email('john@example.com')
+        db.session.query(User).filter_by(id=self.user.id).update({'email': 'stale@example.com'})
+        self.assertEqual(identities.by_id(self.user.id).email, 'john@example.com')
+
+    def test_role_change_invalidates(self):
+        self.assertFalse(identities.by_email('john@example.com').is_administrator())
+        self.user.role = Role.query.filter_by(name='Administrator').first()
+        db.session.commit()
+        self.assertTrue(identities.by_email('john@example.com').is_administrator())
+
+    def test_permissions_change_invalidates(self):
+        self.assertFalse(identities.by_id(self.user.id).is_administrator())
+        self.user.role.add_permission(Permission.ADMIN)
+        db.session.commit()
+        self.assertTrue(identities.by_id(self.user.id).is_administrator())
+
+    def test_email_change_invalidates(self):
+        identities.by_email('john@example.com')
+        self.user.email = 'jack@example.com'
+        db.session.commit()
+        self.assertIsNone(identities.by_email('john@example.com'))
+        self.assertEqual(identities.by_id(self.user.id).email, 'jack@example.com')
@@ -0,0 +1,172 @@
+import json
+import unittest
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from app import create_app, db, jobs
+from app.models import User, Vineyard, Sensor, Magnitude, Job
+
+
+class InlineExecutor:
+    def submit(self, fn, job_id):
+        future = Future()
+        future.set_result(jobs.execute(job_id))
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class PendingExecutor(InlineExecutor):
+    def submit(self, fn, job_id):
+        return Future()
+
+
+class JobsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['JOB_SCHEDULE'] = {}
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.calls = []
+
+        @jobs.job('flaky', concurrency=1, max_attempts=2)
+        def flaky(progress, fail=True):
+            self.calls.append(fail)
+            progress('work', 1, 1)
+            if fail and len(self.calls) == 1:
+                raise RuntimeError('boom')
+            return {'calls': len(self.calls)}
+
+    def tearDown(self):
+        jobs.handlers.pop('flaky')
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def worker(self, executor=None, workers=2):
+        return jobs.Worker('testing', workers, executor or InlineExecutor())
+
+    def test_enqueue(self):
+        job = jobs.enqueue('flaky', {'fail': False})
+        db.session.commit()
+        self.assertEqual(job.status, 'queued')
+        self.assertEqual(job.max_attempts, 2)
+        self.assertIs(jobs.enqueue('flaky', {'fail': False}, unique=True), job)
+        self.assertIsNot(jobs.enqueue('flaky', {'fail': True}, unique=True), job)
+        with self.assertRaises(ValueError):
+            jobs.enqueue('unknown')
+
+    def test_run(self):
+        job = jobs.enqueue('flaky', {'fail': False})
+        db.session.commit()
+        self.assertEqual(self.worker().run_once(), [job.id])
+        job = Job.query.get(job.id)
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual((job.stage, job.done, job.total), ('work', 1, 1))
+        self.assertEqual(json.loads(job.result), {'calls': 1})
+
+    def test_retry(self):
+        job = jobs.enqueue('flaky')
+        db.session.commit()
+        worker = self.worker()
+        worker.run_once()
+        job = Job.query.get(job.id)
+        self.assertEqual(job.status, 'queued')
+        self.assertIn('boom', job.error)
+        self.assertGreater(job.run_at, datetime.utcnow())
+
+        # not due yet
+        self.assertEqual(worker.run_once(), [])
+        job.run_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        worker.run_once()
+        job = Job.query.get(job.id)
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.attempts, 2)
+
+    def test_give_up(self):
+        job = jobs.enqueue('flaky')
+        job.max_attempts = 1
+        db.session.commit()
+        self.worker().run_once()
+        job = Job.query.get(job.id)
+        self.assertEqual(job.status, 'failed')
+        self.assertIsNotNone(job.finished_at)
+
+    def test_priority_and_concurrency(self):
+        low = jobs.enqueue('flaky', {'fail': False})
+        high = jobs.enqueue('flaky', {'fail': False}, priority=10)
+        other = jobs.enqueue('fleet_scan')
+        db.session.commit()
+        worker = self.worker(PendingExecutor(), workers=4)
+        self.assertEqual(worker.run_once(), [high.id, other.id])
+        self.assertEqual(worker.run_once(), [])
+        self.assertEqual(Job.query.get(low.id).status, 'queued')
+
+        self.app.config['JOB_CONCURRENCY'] = {'flaky': 2}
+        self.assertEqual(worker.run_once(), [low.id])
+
+    def test_concurrency_across_workers(self):
+        first = jobs.enqueue('flaky', {'fail': False})
+        jobs.enqueue('flaky', {'fail': False}, priority=-1)
+        db.session.commit()
+        self.assertEqual(self.worker(PendingExecutor()).run_once(), [first.id])
+        # a worker that counted before the other one claimed
+        worker = self.worker(PendingExecutor())
+        worker._busy = lambda now: {}
+        self.assertEqual(worker.run_once(), [])
+
+    def test_expired_lease(self):
+        job = jobs.enqueue('flaky', {'fail': False})
+        db.session.commit()
+        self.worker(PendingExecutor()).run_once()
+        job = Job.query.get(job.id)
+        self.assertEqual(job.status, 'running')
+
+        # the worker holding it died
+        job.locked_until = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        self.worker().run_once()
+        job = Job.query.get(job.id)
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.attempts, 2)
+
+    def test_expired_lease_on_last_attempt(self):
+        job = jobs.enqueue('flaky', {'fail': False})
+        job.max_attempts = 1
+        db.session.commit()
+        self.worker(PendingExecutor()).run_once()
+        job = Job.query.get(job.id)
+        job.locked_until = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        self.assertEqual(self.worker().run_once(), [])
+        job = Job.query.get(job.id)
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(self.calls, [])
+
+    def test_schedule(self):
+        self.app.config['JOB_SCHEDULE'] = {'fleet_scan': 60}
+        worker = self.worker(PendingExecutor())
+        worker.run_once()
+        worker.run_once()
+        self.assertEqual(Job.query.filter_by(type='fleet_scan').count(), 1)
+
+    def test_purge(self):
+        u = User(email='john@example.com', password='cat')
+        db.session.add(u)
+        db.session.commit()
+        v = Vineyard(name='foo', user_id=u.id)
+        db.session.add(v)
+        db.session.commit()
+        v.soft_delete()
+        job = jobs.enqueue('purge')
+        db.session.commit()
+        self.worker().run_once()
+        job = Job.query.get(job.id)
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(json.loads(job.result)['vineyards'], 1)
+        self.assertEqual(Vineyard.query.count(), 0)
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from app import create_app
+from app.profiler import SamplingProfiler
+
+
+def busy(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class ProfilerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.profiler = SamplingProfiler()
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=busy, args=(self.stop,))
+        self.thread.start()
+
+    def tearDown(self):
+        self.stop.set()
+        self.thread.join()
+        self.profiler.stop()
+        shutil.rmtree(self.directory)
+
+    def read(self, session):
+        with open(session.filename) as f:
+            return [line.rsplit(' ', 1) for line in f.read().splitlines()]
+
+    def test_session(self):
+        session = self.profiler.start(self.directory, 0.2, 0.001)
+        self.assertIs(self.profiler.start(self.directory, 10, 0.001), session)
+        session.thread.join()
+        self.assertFalse(session.to_json()['running'])
+        self.assertEqual(self.profiler.profiles(self.directory),
+                         [os.path.basename(session.filename)])
+        stacks = self.read(session)
+        self.assertTrue(any(stack.endswith('busy (test_profiler.py:11)')
+                            for stack, _ in stacks))
+        self.assertEqual(sorted((int(count) for _, count in stacks), reverse=True),
+                         [int(count) for _, count in stacks])
+
+    def test_stop(self):
+        session = self.profiler.start(self.directory, 60, 0.001)
+        time.sleep(0.05)
+        self.assertIs(self.profiler.stop(), session)
+        self.assertTrue(os.path.exists(session.filename))
+        self.assertIsNot(self.profiler.start(self.directory, 60, 0.001), session)
+
+    def test_endpoint(self):
+        app = create_app('testing')
+        self.profiler.init_app(app)
+        session = self.profiler.start(self.directory, 60, 0.001, endpoint='main.index')
+        time.sleep(0.05)
+        self.profiler.stop()
+        # only threads serving the endpoint are sampled
+        self.assertEqual(self.read(session), [])
+        self.assertGreater(session.samples, 0)
@@ -0,0 +1,95 @@
+import unittest
+from datetime import date
+from app import create_app, db
+from app.models import User, Vineyard, Sensor, Magnitude, Metric, AlertRule, DailyTemperature, \
+    Export
+from app.purge import purge_deleted
+
+
+class PurgeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        u = User(email='john@example.com', password='cat')
+        db.session.add(u)
+        db.session.commit()
+        self.user = u
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def create_tree(self, metrics=5):
+        v = Vineyard(name='foo', user_id=self.user.id)
+        db.session.add(v)
+        db.session.commit()
+        s = Sensor(description='foo', latitude=0, longitude=0, gateway='bar', power_perc=100,
+                   vineyard_id=v.id, user_id=self.user.id)
+        db.session.add(s)
+        db.session.commit()
+        m = Magnitude(layer='Surface', type='Temperature', sensor_id=s.id, user_id=self.user.id)
+        db.session.add(m)
+        db.session.commit()
+        for i in range(metrics):
+            db.session.add(Metric(value=i, magnitude_id=m.id))
+        db.session.commit()
+        return v, s, m
+
+    def test_soft_delete_cascades_marks(self):
+        v, s, m = self.create_tree()
+        v.soft_delete()
+        db.session.commit()
+        self.assertEqual(Vineyard.alive().count(), 0)
+        self.assertEqual(Sensor.alive().count(), 0)
+        self.assertEqual(Magnitude.alive().count(), 0)
+        self.assertEqual(Metric.query.count(), 5)
+
+    def test_purge_in_chunks(self):
+        v, s, m = self.create_tree(metrics=7)
+        kept_v, kept_s, kept_m = self.create_tree(metrics=3)
+        v.soft_delete()
+        db.session.commit()
+
+        calls = []
+        counts = purge_deleted(chunk_size=3,
+                               progress=lambda *args: calls.append(args))
+        self.assertEqual(counts, {'metrics': 7, 'magnitudes': 1, 'sensors': 1, 'vineyards': 1})
+        self.assertEqual([c for c in calls if c[0] == 'metrics'],
+                         [('metrics', 0, 7), ('metrics', 3, 7), ('metrics', 6, 7),
+                          ('metrics', 7, 7)])
+        self.assertEqual(Vineyard.query.count(), 1)
+        self.assertEqual(Sensor.query.count(), 1)
+        self.assertEqual(Magnitude.query.count(), 1)
+        self.assertEqual(Metric.query.count(), 3)
+
+    def test_purge_catches_late_children(self):
+        v, s, m = self.create_tree(metrics=2)
+        s.soft_delete()
+        db.session.commit()
+        late = Magnitude(layer='Depth 1', type='Humidity', sensor_id=s.id, user_id=self.user.id)
+        db.session.add(late)
+        db.session.commit()
+
+        counts = purge_deleted(chunk_size=10)
+        self.assertEqual(counts['magnitudes'], 2)
+        self.assertEqual(counts['sensors'], 1)
+        self.assertEqual(Vineyard.query.count(), 1)
+
+    def test_purge_dependents(self):
+        v, s, m = self.create_tree(metrics=0)
+        db.session.add(AlertRule(kind='threshold', comparison='above', value=1,
+                                 priority='Info', magnitude_id=m.id, user_id=self.user.id))
+        db.session.add(DailyTemperature(sensor_id=s.id, day=date(2018, 6, 1), tmin=10, tmax=20,
+                                        samples=1))
+        db.session.add(Export(format='csv.gz', vineyard_id=v.id, user_id=self.user.id))
+        v.soft_delete()
+        db.session.commit()
+
+        purge_deleted()
+        self.assertEqual(AlertRule.query.count(), 0)
+        self.assertEqual(DailyTemperature.query.count(), 0)
+        self.assertEqual(Export.query.count(), 0)
@@ -0,0 +1,94 @@
+import unittest
+from datetime import datetime, timedelta
+import numpy as np
+from app import create_app, db, risk
+from app.models import User, Vineyard, Sensor, Magnitude, Metric, RiskHour
+
+
+class RiskTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        u = User(email='john@example.com', password='cat')
+        db.session.add(u)
+        db.session.commit()
+        v = Vineyard(name='foo', user_id=u.id)
+        db.session.add(v)
+        db.session.commit()
+        s = Sensor(description='foo', latitude=0, longitude=0, gateway='bar', power_perc=100,
+                   vineyard_id=v.id, user_id=u.id)
+        db.session.add(s)
+        db.session.commit()
+        self.magnitudes = {}
+        for type in ('Temperature', 'Humidity', 'Dew'):
+            m = Magnitude(layer='Surface', type=type, sensor_id=s.id, user_id=u.id)
+            db.session.add(m)
+            db.session.commit()
+            self.magnitudes[type] = m.id
+        self.vineyard = v
+        self.start = datetime(2018, 6, 1)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_hours(self, offset, hours, temperature, humidity, dew_point):
+        for hour in range(offset, offset + hours):
+            for minute in (10, 40):
+                timestamp = self.start + timedelta(hours=hour, minutes=minute)
+                for type, value in (('Temperature', temperature), ('Humidity', humidity),
+                                    ('Dew', dew_point)):
+                    db.session.add(Metric(magnitude_id=self.magnitudes[type], value=value,
+                                          timestamp=timestamp))
+        db.session.commit()
+
+    def test_wet_periods(self):
+        wet = np.array([False, True, True, False, True])
+        length, degree_hours = risk.wet_periods(wet, np.array([10., 12, 14, 16, 18]))
+        self.assertEqual(length.tolist(), [0, 1, 2, 0, 1])
+        self.assertEqual(degree_hours.tolist(), [0, 12, 26, 0, 18])
+
+    def test_botrytis_model(self):
+        # reference values of the Broome et al. equation
+        hours = [(12, 20, 0.3661), (24, 20, 0.9597), (6, 15, 0.0667), (8, 25, 0.1144)]
+        series = {type: np.full(24, np.nan) for type in risk.TYPES}
+        for length, temperature, expected in hours:
+            series['Temperature'][:] = temperature
+            series['Humidity'][:] = np.where(np.arange(24) < length, 95, 50)
+            botrytis = risk.evaluate(series)['botrytis']
+            self.assertAlmostEqual(botrytis[length - 1], expected, places=4)
+
+    def test_load_aligns_hours(self):
+        self.add_hours(1, 2, 15, 80, 5)
+        series = risk.load(self.vineyard.id, self.start, self.start + timedelta(hours=4))
+        self.assertTrue(np.isnan(series['Temperature'][0]))
+        self.assertEqual(series['Humidity'][1:3].tolist(), [80, 80])
+        self.assertTrue(np.isnan(series['Dew'][3]))
+
+    def test_refresh(self):
+        self.add_hours(0, 2, 25, 50, 5)
+        self.add_hours(2, 4, 15, 95, 14)
+        now = self.start + timedelta(hours=5, minutes=50)
+        self.assertEqual(risk.refresh(self.vineyard.id, now), 6)
+        hours = RiskHour.query.order_by(RiskHour.hour).all()
+        self.assertEqual([h.wet for h in hours], [False, False, True, True, True, True])
+        self.assertEqual([h.mildew for h in hours], [0, 0, 0.3, 0.6, 0.9, 1])
+        self.assertEqual(hours[0].botrytis, 0)
+        self.assertGreater(hours[5].botrytis, hours[2].botrytis)
+
+        # the wet period goes on across refreshes
+        self.add_hours(6, 1, 15, 95, 14)
+        self.assertEqual(risk.refresh(self.vineyard.id, now + timedelta(hours=1)), 2)
+        self.assertEqual(RiskHour.query.count(), 7)
+        last = RiskHour.query.order_by(RiskHour.hour.desc()).first()
+        self.assertEqual(last.hour, self.start + timedelta(hours=6))
+        self.assertEqual(last.mildew, 1)
+        self.assertGreater(last.botrytis, hours[5].botrytis)
+
+    def test_refresh_all(self):
+        self.add_hours(0, 3, 20, 95, 19)
+        self.assertEqual(risk.refresh_all(), {'vineyards': 1, 'hours': 3})
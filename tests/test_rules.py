@@ -0,0 +1,153 @@
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.ingest import ingest
+from app.models import User, Vineyard, Sensor, Magnitude, Metric, Alert, AlertRule, AlertRuleState
+from app.rules import rules
+
+
+class RulesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        u = User(email='john@example.com', password='cat')
+        db.session.add(u)
+        db.session.commit()
+        v = Vineyard(name='foo', user_id=u.id)
+        db.session.add(v)
+        db.session.commit()
+        s = Sensor(description='foo', latitude=0, longitude=0, gateway='bar', power_perc=100,
+                   vineyard_id=v.id, user_id=u.id)
+        db.session.add(s)
+        db.session.commit()
+        m = Magnitude(layer='Surface', type='Temperature', sensor_id=s.id, user_id=u.id)
+        db.session.add(m)
+        db.session.commit()
+        self.user, self.magnitude = u, m
+        self.start = datetime(2018, 6, 1)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_rule(self, **kwargs):
+        fields = {'comparison': 'above', 'priority': 'Warning', 'user_id': self.user.id,
+                  'magnitude_id': self.magnitude.id}
+        fields.update(kwargs)
+        rule = AlertRule.from_json(fields)
+        db.session.add(rule)
+        db.session.commit()
+        return rule
+
+    def ingest(self, *values, minutes=10, offset=0):
+        rows = [(self.magnitude.id, self.start + timedelta(minutes=minutes * (offset + i)), v)
+                for i, v in enumerate(values)]
+        ingest(rows)
+        db.session.commit()
+        return Alert.query.count()
+
+    def test_threshold(self):
+        rule = self.add_rule(kind='threshold', value=30)
+        self.assertEqual(self.ingest(20, 25, 29.9), 0)
+        self.assertEqual(self.ingest(28, 31, 35), 1)
+        alert = Alert.query.first()
+        self.assertEqual(alert.origin, 'rule:%d' % rule.id)
+        self.assertEqual(alert.user_id, self.user.id)
+        self.assertIn('31', alert.content)
+        self.assertEqual(Metric.query.count(), 6)
+
+    def test_threshold_below(self):
+        self.add_rule(kind='threshold', comparison='below', value=0, content='Frost')
+        self.assertEqual(self.ingest(3, 1, -0.5), 1)
+        self.assertEqual(Alert.query.first().content, 'Frost')
+
+    def test_rate_across_batches(self):
+        self.add_rule(kind='rate', value=6)
+        self.assertEqual(self.ingest(10, 10.5, minutes=30), 0)
+        self.assertEqual(self.ingest(14, minutes=30, offset=2), 1)
+
+    def test_duration(self):
+        self.add_rule(kind='duration', value=30, duration=3600)
+        self.assertEqual(self.ingest(31, 32, 33), 0)
+        self.assertEqual(self.ingest(31, 32, 33, 34, offset=3), 1)
+        self.assertEqual(self.ingest(35, offset=7), 1)
+        self.assertEqual(self.ingest(20, offset=8), 1)
+
+    def test_user_wide_rule(self):
+        self.add_rule(kind='threshold', value=30, magnitude_id=None, type='Temperature')
+        self.assertEqual(self.ingest(31), 1)
+
+    def test_user_wide_rule_scope(self):
+        self.add_rule(kind='threshold', value=30, magnitude_id=None, type='Temperature',
+                      layer='Depth 1')
+        self.add_rule(kind='threshold', value=30, magnitude_id=None, type='Humidity')
+        self.assertEqual(self.ingest(31), 0)
+        humidity = Magnitude(layer='Surface', type='Humidity',
+                             sensor_id=self.magnitude.sensor_id, user_id=self.user.id)
+        db.session.add(humidity)
+        db.session.commit()
+        ingest([(humidity.id, self.start, 80)])
+        db.session.commit()
+        self.assertEqual(Alert.query.count(), 1)
+
+    def test_vineyard_storm_is_coalesced(self):
+        self.add_rule(kind='threshold', comparison='below', value=0, magnitude_id=None,
+                      type='Temperature')
+        others = []
+        for i in range(3):
+            m = Magnitude(layer='Surface', type='Temperature', sensor_id=self.magnitude.sensor_id,
+                          user_id=self.user.id)
+            db.session.add(m)
+            db.session.commit()
+            others.append(m.id)
+        ingest([(m, self.start, -2) for m in [self.magnitude.id] + others])
+        db.session.commit()
+        self.assertEqual(Alert.query.count(), 1)
+        self.assertEqual(Alert.query.first().occurrences, 4)
+
+    def test_disabled_rule_is_reloaded(self):
+        rule = self.add_rule(kind='threshold', value=30)
+        self.assertEqual(self.ingest(31), 1)
+        rule.enabled = False
+        db.session.commit()
+        self.assertEqual(self.ingest(31), 1)
+
+    def test_state_is_shared_by_processes(self):
+        self.add_rule(kind='duration', value=30, duration=3600)
+        self.assertEqual(self.ingest(31, 32, 33), 0)
+        # a new process continues from the stored state
+        rules.init_app(self.app)
+        self.assertEqual(self.ingest(31, 32, 33, 34, offset=3), 1)
+        state = AlertRuleState.query.one()
+        self.assertEqual(state.since, self.start)
+        self.assertTrue(state.notified)
+
+    def test_state_is_kept_when_rules_change(self):
+        self.add_rule(kind='rate', value=6)
+        self.assertEqual(self.ingest(10, 10.5, minutes=30), 0)
+        self.add_rule(kind='threshold', value=50)
+        self.assertEqual(self.ingest(14, minutes=30, offset=2), 1)
+
+    def test_edited_rule_starts_over(self):
+        rule = self.add_rule(kind='duration', value=30, duration=3600)
+        self.assertEqual(self.ingest(31, 32, 33), 0)
+        rule.value = 25
+        db.session.commit()
+        self.assertEqual(self.ingest(31, 32, 33, offset=3), 0)
+        self.assertEqual(AlertRuleState.query.one().since,
+                         self.start + timedelta(minutes=30))
+
+    def test_old_readings_are_skipped(self):
+        self.add_rule(kind='rate', value=6)
+        self.assertEqual(self.ingest(10, minutes=30, offset=2), 0)
+        self.assertEqual(self.ingest(0, 14, minutes=30), 0)
+
+    def test_deleted_magnitude_is_skipped(self):
+        self.add_rule(kind='threshold', value=30)
+        self.magnitude.soft_delete()
+        db.session.commit()
+        self.assertEqual(self.ingest(31), 0)
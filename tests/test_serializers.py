@@ -0,0 +1,71 @@
+import unittest
+from flask import json
+from app import create_app, db, serializers
+from app.models import User, Vineyard, Sensor, Magnitude, Metric
+
+
+class SerializersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        u = User(email='john@example.com', password='cat')
+        db.session.add(u)
+        db.session.commit()
+        for i in range(2):
+            v = Vineyard(name='vineyard %d' % i, user_id=u.id)
+            db.session.add(v)
+            db.session.commit()
+            for j in range(3):
+                s = Sensor(description='sensor %d' % j, latitude=41.5 + j, longitude=1.25,
+                           gateway='gw', power_perc=87.5, vineyard_id=v.id, user_id=u.id)
+                db.session.add(s)
+                db.session.commit()
+                for layer in ('Surface', 'Depth 1'):
+                    m = Magnitude(layer=layer, type='Humidity', sensor_id=s.id, user_id=u.id)
+                    db.session.add(m)
+                    db.session.commit()
+                    db.session.add(Metric(value=12.5, magnitude_id=m.id))
+        db.session.commit()
+        deleted = Sensor.query.first()
+        deleted.soft_delete()
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def assertSameJSON(self, rendered, objects):
+        self.assertEqual(json.dumps(rendered), json.dumps([o.to_json() for o in objects]))
+
+    def test_vineyards(self):
+        with self.app.test_request_context('/'):
+            rows = db.session.query(*serializers.VINEYARD_COLUMNS).order_by(Vineyard.id)
+            self.assertSameJSON(serializers.vineyards(rows),
+                                Vineyard.query.order_by(Vineyard.id))
+
+    def test_sensors(self):
+        with self.app.test_request_context('/'):
+            rows = Sensor.alive().with_entities(*serializers.SENSOR_COLUMNS).order_by(Sensor.id)
+            self.assertSameJSON(serializers.sensors(rows), Sensor.alive().order_by(Sensor.id))
+
+    def test_magnitudes(self):
+        with self.app.test_request_context('/'):
+            rows = db.session.query(*serializers.MAGNITUDE_COLUMNS).order_by(Magnitude.id)
+            self.assertSameJSON(serializers.magnitudes(rows),
+                                Magnitude.query.order_by(Magnitude.id))
+
+    def test_metrics(self):
+        with self.app.test_request_context('/'):
+            rows = db.session.query(*serializers.METRIC_COLUMNS).order_by(Metric.id)
+            self.assertSameJSON(serializers.metrics(rows), Metric.query.order_by(Metric.id))
+
+    def test_script_root(self):
+        with self.app.test_request_context('/', base_url='http://localhost/vifi'):
+            rows = db.session.query(*serializers.METRIC_COLUMNS).order_by(Metric.id)
+            self.assertTrue(serializers.metrics(rows)[0]['magnitude_url'].startswith(
+                '/vifi/api/v1/magnitudes/'))
+            self.assertSameJSON(serializers.metrics(rows), Metric.query.order_by(Metric.id))
@@ -0,0 +1,74 @@
+import unittest
+from datetime import datetime, timedelta
+import numpy as np
+from app import create_app, db, soil
+from app.models import User, Vineyard, Sensor, Magnitude, Metric
+
+
+class SoilTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        u = User(email='john@example.com', password='cat')
+        db.session.add(u)
+        db.session.commit()
+        v = Vineyard(name='foo', user_id=u.id)
+        db.session.add(v)
+        db.session.commit()
+        s = Sensor(description='foo', latitude=0, longitude=0, gateway='bar', power_perc=100,
+                   vineyard_id=v.id, user_id=u.id)
+        db.session.add(s)
+        db.session.commit()
+        self.magnitudes = {}
+        for layer in soil.LAYERS:
+            m = Magnitude(layer=layer, type='Humidity', sensor_id=s.id, user_id=u.id)
+            db.session.add(m)
+            db.session.commit()
+            self.magnitudes[layer] = m.id
+        self.sensor = s
+        self.start = datetime(2018, 6, 1)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add(self, hour, values):
+        for layer, value in zip(soil.LAYERS, values):
+            db.session.add(Metric(magnitude_id=self.magnitudes[layer], value=value,
+                                  timestamp=self.start + timedelta(hours=hour, minutes=30)))
+        db.session.commit()
+
+    def profile(self, hours=3, now=None):
+        return soil.profile(self.sensor.id, 'Humidity', self.start,
+                            self.start + timedelta(hours=hours), 3600,
+                            now=now or self.start + timedelta(days=1))
+
+    def test_profile(self):
+        self.add(0, (20, 25, 30))
+        self.add(1, (35, 28, 30))
+        self.add(2, (40, 35, 33))
+        points = self.profile()
+        self.assertEqual(points[0]['layers'], {'Surface': 20, 'Depth 1': 25, 'Depth 2': 30})
+        self.assertEqual(points[0]['gradients'], {'Depth 1': 5, 'Depth 2': 5})
+        self.assertEqual([p['front'] for p in points], [None, 'Depth 1', 'Depth 2'])
+
+    def test_fronts(self):
+        values = np.array([[10, 15, 15], [10, 10, 20], [10, 20, 20]], dtype=float)
+        # a rise below a layer that did not rise is not part of the front
+        self.assertEqual(soil.fronts(values, 2).tolist(), [-1, 0, -1])
+
+    def test_cache(self):
+        self.add(0, (20, 25, 30))
+        self.add(1, (30, 25, 30))
+        now = self.start + timedelta(hours=1, minutes=45)
+        self.assertEqual(len(self.profile(now=now)), 2)
+        # the ended first bucket is cached, the running one is read again
+        self.add(0, (40, 45, 50))
+        self.add(1, (40, 45, 50))
+        points = self.profile(now=now)
+        self.assertEqual(points[0]['layers']['Surface'], 20)
+        self.assertEqual(points[1]['layers']['Surface'], 35)
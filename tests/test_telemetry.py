@@ -0,0 +1,48 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from app.telemetry import Registry, collect, render
+
+
+class TelemetryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def registry(self):
+        registry = Registry()
+        registry.inc('requests_total', {'endpoint': 'api.get_users', 'status': 200})
+        registry.observe('latency_seconds', {'endpoint': 'api.get_users'}, (0.02, 0.3, 7),
+                         (0.1, 1))
+        registry.set('pool_checked_out', {}, 2)
+        return registry
+
+    def test_render(self):
+        text = render(collect(self.registry(), None))
+        self.assertIn('requests_total{endpoint="api.get_users",status="200"} 1\n', text)
+        self.assertIn('latency_seconds_bucket{endpoint="api.get_users",le="0.1"} 1\n'
+                      'latency_seconds_bucket{endpoint="api.get_users",le="1"} 2\n'
+                      'latency_seconds_bucket{endpoint="api.get_users",le="+Inf"} 3\n'
+                      'latency_seconds_sum{endpoint="api.get_users"} 7.32\n'
+                      'latency_seconds_count{endpoint="api.get_users"} 3\n', text)
+        self.assertIn('# TYPE pool_checked_out untyped\npool_checked_out 2\n', text)
+
+    def test_multiprocess(self):
+        registry = self.registry()
+        registry.flush(self.directory)
+        # an exited worker: its counters still count, its gauges do not
+        with open(os.path.join(self.directory, '%d.json' % os.getpid())) as f:
+            snapshot = json.load(f)
+        with open(os.path.join(self.directory, '999999999.json'), 'w') as f:
+            json.dump(snapshot, f)
+        registry.inc('requests_total', {'endpoint': 'api.get_users', 'status': 200})
+        registry.flush(self.directory)
+
+        text = render(collect(registry, self.directory))
+        self.assertIn('requests_total{endpoint="api.get_users",status="200"} 3\n', text)
+        self.assertIn('latency_seconds_count{endpoint="api.get_users"} 6\n', text)
+        self.assertIn('pool_checked_out 2\n', text)
@@ -0,0 +1,85 @@
+import unittest
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy.dialects import mysql, postgresql
+from app import create_app, db, timeseries
+from app.exceptions import ValidationError
+from app.models import User, Vineyard, Sensor, Magnitude, Metric
+
+
+class TimeseriesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        u = User(email='john@example.com', password='cat')
+        db.session.add(u)
+        db.session.commit()
+        v = Vineyard(name='foo', user_id=u.id)
+        db.session.add(v)
+        db.session.commit()
+        s = Sensor(description='foo', latitude=0, longitude=0, gateway='bar', power_perc=100,
+                   vineyard_id=v.id, user_id=u.id)
+        db.session.add(s)
+        db.session.commit()
+        m = Magnitude(layer='Surface', type='Temperature', sensor_id=s.id, user_id=u.id)
+        db.session.add(m)
+        db.session.commit()
+        self.magnitude = m
+        self.start = datetime(2018, 6, 1)
+        # hours 0 and 1 have readings, 2 and 3 do not, 4 has one
+        for minutes, value in ((5, 10), (35, 20), (65, 30), (250, 60)):
+            db.session.add(Metric(magnitude_id=m.id, value=value,
+                                  timestamp=self.start + timedelta(minutes=minutes)))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def resample(self, **kwargs):
+        args = {'start': self.start, 'end': self.start + timedelta(hours=6), 'interval': 3600}
+        args.update(kwargs)
+        return timeseries.resample(self.magnitude.id, **args)
+
+    def test_compile(self):
+        expression = timeseries.bucket(Metric.timestamp, 3600, 900)
+        self.assertEqual(str(expression.compile(dialect=postgresql.dialect())),
+                         'CAST(FLOOR((EXTRACT(EPOCH FROM metrics.timestamp) - 3600) / 900) '
+                         'AS BIGINT)')
+        self.assertEqual(str(expression.compile(dialect=mysql.dialect())),
+                         'FLOOR((UNIX_TIMESTAMP(metrics.timestamp) - 3600) / 900)')
+
+    def test_aggregates(self):
+        self.assertEqual(self.resample(), [(self.start, 15), (self.start + timedelta(hours=1), 30),
+                                           (self.start + timedelta(hours=4), 60)])
+        self.assertEqual([v for _, v in self.resample(aggregate='max')], [20, 30, 60])
+        self.assertEqual([v for _, v in self.resample(aggregate='count')], [2, 1, 1])
+        self.assertEqual(self.resample(interval=86400), [(self.start, 30)])
+
+    def test_fills(self):
+        self.assertEqual([v for _, v in self.resample(strategy='null')],
+                         [15, 30, None, None, 60, None])
+        self.assertEqual([v for _, v in self.resample(strategy='previous')],
+                         [15, 30, 30, 30, 60, 60])
+        self.assertEqual([v for _, v in self.resample(strategy='linear')],
+                         [15, 30, 40, 50, 60, None])
+
+    def test_alignment(self):
+        points = self.resample(start=self.start + timedelta(minutes=20), interval=1800)
+        self.assertEqual(points[0], (self.start, 10))
+
+    def test_validation(self):
+        with self.assertRaises(ValidationError):
+            self.resample(aggregate='median')
+        with self.assertRaises(ValidationError):
+            self.resample(strategy='spline')
+        with self.assertRaises(ValidationError):
+            self.resample(interval=1, end=self.start + timedelta(days=1))
+        self.assertEqual(timeseries.parse_interval('15m'), 900)
+        self.assertEqual(timeseries.parse_interval('2d'), 172800)
+        with self.assertRaises(ValidationError):
+            timeseries.parse_interval('0h')
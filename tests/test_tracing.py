@@ -0,0 +1,29 @@
+import unittest
+from app.tracing import fingerprint, _Stats
+
+
+class TracingTestCase(unittest.TestCase):
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint("SELECT metrics.id FROM metrics\n  WHERE metrics.magnitude_id = 42 "
+                        "AND metrics.value > -1.5e3 AND anomaly = 'it''s'  LIMIT 10"),
+            'SELECT metrics.id FROM metrics WHERE metrics.magnitude_id = ? '
+            'AND metrics.value > ? AND anomaly = ? LIMIT ?')
+        self.assertEqual(fingerprint('SELECT * FROM magnitudes_1 WHERE id IN (?, ?, ?)'),
+                         fingerprint('SELECT * FROM magnitudes_1 WHERE id IN (%(id_1)s)'))
+        self.assertEqual(fingerprint('SELECT * FROM magnitudes_1 WHERE id IN (?, ?, ?)'),
+                         'SELECT * FROM magnitudes_1 WHERE id IN (?)')
+        self.assertEqual(fingerprint('SELECT * FROM t WHERE a = $1 AND b = :b'),
+                         'SELECT * FROM t WHERE a = ? AND b = ?')
+
+    def test_stats(self):
+        stats = _Stats()
+        for i in range(1, 1001):
+            stats.add(i / 1000, reservoir=2000)
+        self.assertEqual(stats.count, 1000)
+        self.assertEqual(stats.max, 1)
+        self.assertAlmostEqual(stats.p95(), 0.951)
+        stats = _Stats()
+        for i in range(1000):
+            stats.add(0.1, reservoir=10)
+        self.assertEqual(len(stats.samples), 10)
@@ -0,0 +1,102 @@
+import unittest
+from datetime import date, datetime, timedelta
+from app import create_app, db, viticulture
+from app.models import User, Vineyard, Sensor, Magnitude, Metric, DailyTemperature
+
+
+class ViticultureTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        u = User(email='john@example.com', password='cat')
+        db.session.add(u)
+        db.session.commit()
+        v = Vineyard(name='foo', user_id=u.id)
+        db.session.add(v)
+        db.session.commit()
+        self.user, self.vineyard = u, v
+        self.sensor, self.magnitude = self.add_sensor()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_sensor(self, latitude=45):
+        s = Sensor(description='foo', latitude=latitude, longitude=0, gateway='bar',
+                   power_perc=100, vineyard_id=self.vineyard.id, user_id=self.user.id)
+        db.session.add(s)
+        db.session.commit()
+        m = Magnitude(layer='Surface', type='Temperature', sensor_id=s.id, user_id=self.user.id)
+        db.session.add(m)
+        db.session.commit()
+        return s, m
+
+    def add_day(self, day, tmin, tmax, magnitude=None):
+        start = datetime.combine(day, datetime.min.time())
+        for hour, value in ((4, tmin), (15, tmax), (20, (tmin + tmax) / 2)):
+            db.session.add(Metric(magnitude_id=(magnitude or self.magnitude).id, value=value,
+                                  timestamp=start + timedelta(hours=hour)))
+        db.session.commit()
+
+    def test_daily_gdd(self):
+        self.add_day(date(2018, 4, 1), 8, 20)
+        self.add_day(date(2018, 4, 2), 2, 12)
+        self.add_day(date(2018, 4, 3), 12, 24)
+        summary = viticulture.heat_summary([self.sensor.id], 45, end=date(2018, 4, 3))
+        self.assertEqual(summary['start'], date(2018, 4, 1))
+        self.assertEqual([d['gdd'] for d in summary['days']], [4, 0, 8])
+        self.assertEqual([d['cumulative'] for d in summary['days']], [4, 4, 12])
+        self.assertEqual(summary['winkler'], {'index': 12, 'region': 'I'})
+        # ((4 + 10) / 2 + 0 + (8 + 14) / 2) * 1.04
+        self.assertEqual(summary['huglin'], 18.7)
+
+        summary = viticulture.heat_summary([self.sensor.id], 45, start=date(2018, 4, 2),
+                                           end=date(2018, 4, 3), base=5)
+        self.assertEqual([d['cumulative'] for d in summary['days']], [2, 15])
+        self.assertEqual(summary['winkler']['index'], 12)
+
+    def test_default_range_before_season(self):
+        self.add_day(date(2018, 10, 31), 12, 24)
+        summary = viticulture.heat_summary([self.sensor.id], 45, end=date(2019, 2, 10))
+        self.assertEqual(summary['start'], date(2018, 4, 1))
+        self.assertEqual(summary['total'], 8)
+
+    def test_incremental_cache(self):
+        self.add_day(date(2018, 4, 1), 8, 20)
+        self.add_day(date(2018, 4, 2), 8, 20)
+        viticulture.refresh([self.sensor.id])
+        self.assertEqual(DailyTemperature.query.count(), 2)
+
+        # settled days are served from the cache
+        db.session.query(DailyTemperature).filter_by(day=date(2018, 4, 1)).update({'tmax': 30})
+        db.session.commit()
+        self.add_day(date(2018, 4, 2), 0, 40)
+        self.add_day(date(2018, 4, 10), 10, 20)
+        self.app.config['GDD_SETTLE_DAYS'] = 0
+        viticulture.refresh([self.sensor.id])
+        days = {d.day: d for d in DailyTemperature.query}
+        self.assertEqual(set(days), {date(2018, 4, 1), date(2018, 4, 2), date(2018, 4, 10)})
+        self.assertEqual(days[date(2018, 4, 1)].tmax, 30)
+        self.assertEqual((days[date(2018, 4, 2)].tmin, days[date(2018, 4, 2)].tmax), (0, 40))
+        self.assertEqual(days[date(2018, 4, 2)].samples, 6)
+
+    def test_vineyard_average(self):
+        sensor, magnitude = self.add_sensor()
+        self.add_day(date(2018, 5, 1), 10, 20)
+        self.add_day(date(2018, 5, 1), 20, 30, magnitude)
+        summary = viticulture.heat_summary([self.sensor.id, sensor.id], 45,
+                                           end=date(2018, 5, 1))
+        self.assertEqual(summary['days'][0]['tmin'], 15)
+        self.assertEqual(summary['total'], 10)
+
+    def test_season(self):
+        self.assertEqual(viticulture.season(date(2018, 6, 1), 45)[0], date(2018, 4, 1))
+        self.assertEqual(viticulture.season(date(2019, 2, 1), 45)[0], date(2018, 4, 1))
+        self.assertEqual(viticulture.season(date(2019, 2, 1), -34),
+                         (date(2018, 10, 1), date(2019, 3, 31), date(2019, 4, 30)))
+        self.assertEqual(viticulture.huglin_coefficient(-47), 1.05)
+        self.assertEqual(viticulture.winkler_region(1700), 'III')
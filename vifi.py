@@ -78,6 +78,101 @@ def deploy(fake):
         fake_data.setup('albertmp@eml.cc', 100)
         fake_data.setup('admin@example.com', 100)
 
+@app.cli.command()
+@click.option('--scenario', '-s', 'scenarios', multiple=True,
+              help='Scenario to run, all by default.')
+@click.option('--count', default=200, help='Measured requests per scenario.')
+@click.option('--warmup', default=10, help='Unmeasured requests before each scenario.')
+@click.option('--email', default='seed0-0@example.com', help='Seeded account to use.')
+@click.option('--password', default='password')
+@click.option('--gunicorn/--test-client', default=False,
+              help='Benchmark a local gunicorn instead of the test client.')
+@click.option('--workers', default=2, help='Gunicorn worker processes.')
+@click.option('--output', default=None, type=click.Path(),
+              help='Save the results as a JSON baseline.')
+@click.option('--compare', default=None, type=click.Path(exists=True),
+              help='JSON baseline to compare the results with.')
+def bench(scenarios, count, warmup, email, password, gunicorn, workers, output, compare):
+    """Measure throughput and latency of the API on seeded data."""
+    import json
+    from benchmarks import api as api_bench
+
+    unknown = set(scenarios) - set(api_bench.SCENARIOS)
+    if unknown:
+        raise click.BadParameter('unknown scenario %s' % ', '.join(sorted(unknown)))
+    try:
+        dataset = api_bench.Dataset(email, password)
+    except LookupError as e:
+        raise click.ClickException(str(e))
+    target = api_bench.GunicornTarget(workers) if gunicorn else api_bench.TestClientTarget(app)
+    try:
+        result = api_bench.run(target, dataset, scenarios or api_bench.SCENARIOS, count, warmup)
+    finally:
+        target.close()
+    baseline = None
+    if compare:
+        with open(compare) as f:
+            baseline = json.load(f)
+    click.echo(api_bench.report(result, baseline))
+    if output:
+        with open(output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+
+
+@app.cli.command()
+@click.option('--users', default=1, help='Number of users.')
+@click.option('--vineyards', default=2, help='Vineyards per user.')
+@click.option('--sensors', default=5, help='Sensors per vineyard.')
+@click.option('--days', default=90, help='Days of readings before the end date.')
+@click.option('--interval', default=600, help='Seconds between readings.')
+@click.option('--end', default=None, help='Last day (YYYY-MM-DD), today by default.')
+@click.option('--seed', 'seed_', default=0, help='Random seed.')
+@click.option('--chunk-size', default=50000, help='Number of metrics per insert.')
+def seed(users, vineyards, sensors, days, interval, end, seed_, chunk_size):
+    """Add synthetic users, sensors and readings, skipping users seeded before."""
+    from datetime import datetime
+    from app.fake import seed as seed_data
+
+    def progress(stage, done, total):
+        click.echo('%s: %d/%d' % (stage, done, total))
+
+    if end is not None:
+        end = datetime.strptime(end, '%Y-%m-%d')
+    counts = seed_data(users, vineyards, sensors, days, interval, end, seed_, chunk_size,
+                       progress)
+    click.echo('users: %(users)d, sensors: %(sensors)d, metrics: %(metrics)d' % counts)
+
+
+@app.cli.command()
+@click.option('--chunk-size', default=None, type=int,
+              help='Number of metrics removed per transaction.')
+def purge(chunk_size):
+    """Remove soft-deleted vineyards, sensors and magnitudes."""
+    from app.purge import purge_deleted
+
+    def progress(stage, done, total):
+        click.echo('%s: %d/%d' % (stage, done, total))
+
+    purge_deleted(chunk_size, progress)
+
+
+@app.cli.command('fleet-scan')
+def fleet_scan():
+    """Alert on stale and low battery sensors."""
+    from app.fleet import scan
+    counts = scan()
+    click.echo('stale: %(stale)d, low battery: %(low-battery)d' % counts)
+
+
+@app.cli.command()
+@click.option('--workers', default=None, type=int,
+              help='Number of worker processes.')
+def worker(workers):
+    """Run queued background jobs."""
+    from app.jobs import Worker
+    Worker(os.getenv('FLASK_CONFIG') or 'default', workers).run()
+
+
 @app.cli.command()
 def run():
     app.run()
@@ -0,0 +1,26 @@
+"""Gateway ingest server, scaled apart from the web API (see app/ingest_server.py)."""
+import argparse
+import os
+from dotenv import load_dotenv
+
+dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path)
+
+from app import create_app
+from app.ingest_server import IngestServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve POST /api/v1/metrics/ for gateways.')
+    parser.add_argument('--host', default=os.environ.get('INGEST_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', '5001')))
+    parser.add_argument('--reuse-port', action='store_true',
+                        help='Share the port with other ingest processes.')
+    args = parser.parse_args()
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+    IngestServer(app).run(args.host, args.port, args.reuse_port)
+
+
+if __name__ == '__main__':
+    main()